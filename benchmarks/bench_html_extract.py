@@ -0,0 +1,61 @@
+"""
+Micro-benchmark of ojuzmanager.HtmlExtract against the full html.parser parse it replaces.
+Run from the project root:
+
+    python -m benchmarks.bench_html_extract [saved_page.html ...]
+
+Saved oj.uz pages (submit/login pages with a csrf token, submission pages with
+#submission_details) can be given as arguments, otherwise synthetic pages are used.
+"""
+import sys
+import timeit
+from ojuzmanager import HtmlExtract
+from benchmarks import sample_pages
+
+
+def bench(label, func, repeat=5, number=20):
+    best = min(timeit.repeat(func, repeat=repeat, number=number)) / number
+    print(f"  {label:<28} {best * 1000:9.3f} ms")
+    return best
+
+
+def load_pages(paths):
+    csrf_pages, details_pages = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        if 'name="csrf_token"' in html:
+            csrf_pages.append((path, html))
+        if 'id="submission_details"' in html:
+            details_pages.append((path, html))
+    return csrf_pages, details_pages
+
+
+def main(paths):
+    if paths:
+        csrf_pages, details_pages = load_pages(paths)
+    else:
+        csrf_pages = [("synthetic submit page", sample_pages.submit_page()),
+                      ("synthetic login page", sample_pages.login_page())]
+        details_pages = [("synthetic submission page", sample_pages.submission_page())]
+
+    for name, html in csrf_pages:
+        print(f"csrf token, {name} ({len(html)} bytes)")
+        assert HtmlExtract.extract_input_value(html, "csrf_token") == \
+            HtmlExtract.extract_input_value_soup(html, "csrf_token")
+        slow = bench("html.parser soup", lambda: HtmlExtract.extract_input_value_soup(html, "csrf_token"))
+        fast = bench("regex fast path", lambda: HtmlExtract.extract_input_value(html, "csrf_token"))
+        print(f"  speedup x{slow / fast:.1f}")
+
+    for name, html in details_pages:
+        print(f"submission_details, {name} ({len(html)} bytes)")
+        slow = bench("soup", lambda: HtmlExtract.extract_element_by_id(html, "submission_details", "soup"))
+        for backend in HtmlExtract.available_backends():
+            if backend == "soup":
+                continue
+            fast = bench(backend, lambda: HtmlExtract.extract_element_by_id(html, "submission_details", backend))
+            print(f"  speedup x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,246 @@
+"""
+A local stand-in for oj.uz, just enough of it for OjuzSession: login with csrf tokens,
+problem submit pages, submission pages and the submission summary endpoint.
+Latency, block rate, session expiry and judging time are configurable.
+
+Run it standalone from the project root:
+
+    python -m benchmarks.fake_ojuz --port 8090 --latency 0.05 --block-rate 0.02
+
+and point `base_url` in ojuzmanager/manager_config.py to http://localhost:8090
+(not 127.0.0.1, aiohttp's cookie jar drops the cookies of bare IPs and logins would fail).
+"""
+import argparse
+import asyncio
+import random
+import secrets
+import time
+from collections import Counter
+from aiohttp import web
+from benchmarks import sample_pages
+
+SESSION_COOKIE = 'session'
+
+
+class FakeOjuz:
+    """State and handlers of the fake oj.uz"""
+
+    def __init__(self, latency=0.05, latency_jitter=0.02, block_rate=0.0, session_expiry=3600,
+                 judge_time=3.0, subtasks=4, tests_per_subtask=10, problems=None) -> None:
+        """
+        latency (float): seconds every request takes
+        latency_jitter (float): uniform random extra seconds added to latency
+        block_rate (float): probability that a submit is blocked
+        session_expiry (float): seconds after login when a session gets logged out
+        judge_time (float): seconds from submit to the final verdict
+        problems (set): problem ids that exist, None for any id
+        """
+
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.block_rate = block_rate
+        self.session_expiry = session_expiry
+        self.judge_time = judge_time
+        self.subtasks = subtasks
+        self.tests_per_subtask = tests_per_subtask
+        self.problems = problems
+        self.started = time.time() # problem pages never change, they were last modified at startup
+
+        self.sessions: dict[str, dict] = {}
+        self.submissions: dict[str, dict] = {}
+        self.next_submission_id = 1000000
+        self.requests: Counter = Counter()
+        self.submits_by_user: Counter = Counter()
+        self.blocks: int = 0
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        router = app.router
+        router.add_get("/login", self.login_get)
+        router.add_post("/login", self.login_post)
+        router.add_get("/problem/submit/{problem_id}", self.submit_get)
+        router.add_post("/problem/submit/{problem_id}", self.submit_post)
+        router.add_get("/problem/view/{problem_id}", self.problem_view)
+        router.add_post("/submission/summary/1", self.summary_post)
+        router.add_get("/submission/{submission_id}", self.submission_get)
+        router.add_get("/_stats", self.stats_get)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        if route != "/_stats":
+            self.requests[f"{request.method} {route}"] += 1
+            await asyncio.sleep(self.latency + random.uniform(0, self.latency_jitter))
+        return await handler(request)
+
+    def _session(self, request):
+        """return (dict): session of the request, a new one is created if needed"""
+
+        session_id = request.cookies.get(SESSION_COOKIE)
+        session = self.sessions.get(session_id)
+        if session is None:
+            session_id = secrets.token_hex(16)
+            session = self.sessions[session_id] = {'user': None, 'csrf': secrets.token_hex(20), 'logged_at': 0.0}
+            session['id'] = session_id
+        if session['user'] is not None and time.monotonic() - session['logged_at'] > self.session_expiry:
+            session['user'] = None
+        return session
+
+    @staticmethod
+    def _html(request, session, text):
+        response = web.Response(text=text, content_type='text/html')
+        if request.cookies.get(SESSION_COOKIE) != session['id']:
+            response.set_cookie(SESSION_COOKIE, session['id'], httponly=True)
+        return response
+
+    @staticmethod
+    def _redirect(request, session, location):
+        response = web.Response(status=302, headers={'Location': location})
+        if request.cookies.get(SESSION_COOKIE) != session['id']:
+            response.set_cookie(SESSION_COOKIE, session['id'], httponly=True)
+        return response
+
+    async def login_get(self, request):
+        session = self._session(request)
+        return self._html(request, session, sample_pages.login_page(session['csrf']))
+
+    async def login_post(self, request):
+        session = self._session(request)
+        form = await request.post()
+        if form.get('csrf_token') != session['csrf'] or not form.get('email') or not form.get('password'):
+            return self._html(request, session, sample_pages.login_page(session['csrf']))
+        # a login gets a new session, like Flask's session protection does
+        self.sessions.pop(session['id'], None)
+        session = {'id': secrets.token_hex(16), 'user': form['email'], 'csrf': secrets.token_hex(20),
+                   'logged_at': time.monotonic()}
+        self.sessions[session['id']] = session
+        response = web.Response(text=sample_pages.login_page(session['csrf'], logged_in=True), content_type='text/html')
+        response.set_cookie(SESSION_COOKIE, session['id'], httponly=True)
+        return response
+
+    async def submit_get(self, request):
+        session = self._session(request)
+        if session['user'] is None:
+            return self._redirect(request, session, f"/login?next={request.path}")
+        return self._html(request, session, sample_pages.submit_page(request.match_info['problem_id'], session['csrf']))
+
+    async def submit_post(self, request):
+        session = self._session(request)
+        if session['user'] is None:
+            return self._redirect(request, session, f"/login?next={request.path}")
+        form = await request.post()
+        if form.get('csrf_token') != session['csrf'] or random.random() < self.block_rate:
+            self.blocks += 1
+            return self._redirect(request, session, request.path)
+
+        submission_id = str(self.next_submission_id)
+        self.next_submission_id += 1
+        self.submissions[submission_id] = {
+            'problem_id': request.match_info['problem_id'],
+            'user': session['user'],
+            'created': time.monotonic(),
+        }
+        self.submits_by_user[session['user']] += 1
+        return self._redirect(request, session, f"/submission/{submission_id}")
+
+    async def problem_view(self, request):
+        problem_id = request.match_info['problem_id']
+        if self.problems is not None and problem_id not in self.problems:
+            raise web.HTTPNotFound()
+        session = self._session(request)
+        etag = f'"{problem_id}-{int(self.started)}"'
+        last_modified = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(self.started))
+        if request.headers.get('If-None-Match') == etag or request.headers.get('If-Modified-Since') == last_modified:
+            return web.Response(status=304, headers={'ETag': etag, 'Last-Modified': last_modified})
+        response = self._html(request, session, sample_pages.problem_page(problem_id))
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = last_modified
+        return response
+
+    def _progress(self, submission):
+        return min(1.0, (time.monotonic() - submission['created']) / self.judge_time) if self.judge_time else 1.0
+
+    async def summary_post(self, request):
+        session = self._session(request)
+        form = await request.post()
+        if form.get('csrf_token') != session['csrf']:
+            return web.Response(status=400, text="The CSRF token is invalid.")
+        submission = self.submissions.get(form.get('submission_id'))
+        if submission is None:
+            return web.Response(status=404, text="Not found")
+        progress = self._progress(submission)
+        finished_subtasks = int(progress * self.subtasks)
+        if progress < 0.1:
+            text = "Compiling"
+        elif progress < 1.0:
+            text = f"Evaluating subtask {finished_subtasks + 1}"
+        else:
+            text = "100 / 100"
+        full_score = 100
+        return web.json_response({
+            'compilation_message': "",
+            'evaluating_subtask_order': finished_subtasks if progress < 1.0 else -1,
+            'full_score': full_score,
+            'max_execution_time': 123,
+            'max_memory': 4567,
+            'score': full_score * finished_subtasks // self.subtasks,
+            'text': text,
+        })
+
+    async def submission_get(self, request):
+        session = self._session(request)
+        submission = self.submissions.get(request.match_info['submission_id'])
+        if submission is None:
+            raise web.HTTPNotFound()
+        html = sample_pages.submission_page(request.match_info['submission_id'], self.subtasks, self.tests_per_subtask)
+        if self._progress(submission) < 1.0:
+            html = html.replace("Correct", "Running")
+        return self._html(request, session, html)
+
+    def stats(self):
+        return {
+            'requests': dict(self.requests),
+            'total_requests': sum(self.requests.values()),
+            'submissions': len(self.submissions),
+            'blocks': self.blocks,
+            'submits_by_user': dict(self.submits_by_user),
+        }
+
+    async def stats_get(self, request):
+        return web.json_response(self.stats())
+
+
+async def start_fake_ojuz(fake, host='127.0.0.1', port=8090):
+    """Starts given FakeOjuz in the running loop
+
+    return (web.AppRunner): call `await runner.cleanup()` to stop it
+    """
+
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for oj.uz")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-jitter", type=float, default=0.02)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--session-expiry", type=float, default=3600)
+    parser.add_argument("--judge-time", type=float, default=3.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake = FakeOjuz(latency=args.latency, latency_jitter=args.latency_jitter, block_rate=args.block_rate,
+                    session_expiry=args.session_expiry, judge_time=args.judge_time)
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Load test of the submission path against benchmarks/fake_ojuz.py, no real oj.uz involved.
+Run from the project root.
+
+Drive OjuzManager directly, with the fake oj.uz started in-process:
+
+    python -m benchmarks.load_test manager --rps 5 --duration 30 --accounts 4
+
+Drive a running server's POST /submit (start the fake with `python -m benchmarks.fake_ojuz`
+and point `base_url` in ojuzmanager/manager_config.py to it before starting the server):
+
+    python -m benchmarks.load_test server --server-url http://127.0.0.1:8888 --fake-url http://localhost:8090
+
+Reports p50/p99 latency, submissions/sec per account and upstream requests per submission.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import aiohttp
+from benchmarks.fake_ojuz import FakeOjuz, start_fake_ojuz
+
+PROBLEM_PATH = "/problem/view/IOI18_combo"
+CODE = "#include <bits/stdc++.h>\nint main() { return 0; }\n"
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def drive(rps, duration, make_request):
+    """Starts make_request() open-loop at `rps` for `duration` seconds
+
+    return (list): (latency, result) of every request, result is None if it raised
+    """
+
+    results = []
+
+    async def timed(i):
+        started = time.perf_counter()
+        try:
+            result = await make_request(i)
+        except Exception as e:
+            print(f"request {i} failed: {e!r}")
+            result = None
+        results.append((time.perf_counter() - started, result))
+
+    tasks = []
+    started = time.perf_counter()
+    total = int(rps * duration)
+    for i in range(total):
+        await asyncio.sleep(max(0.0, started + i / rps - time.perf_counter()))
+        tasks.append(asyncio.create_task(timed(i)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def report(title, results, elapsed, upstream_stats, per_account=None):
+    latencies = [latency for latency, result in results]
+    succeeded = [result for latency, result in results if result is not None]
+    print(f"\n== {title}")
+    print(f"requests: {len(results)}  succeeded: {len(succeeded)}  elapsed: {elapsed:.1f}s"
+          f"  throughput: {len(succeeded) / elapsed:.2f}/s")
+    print(f"latency p50: {percentile(latencies, 0.5) * 1000:.0f}ms  p99: {percentile(latencies, 0.99) * 1000:.0f}ms"
+          f"  mean: {statistics.fmean(latencies) * 1000 if latencies else float('nan'):.0f}ms")
+    submissions = upstream_stats['submissions']
+    if submissions:
+        print(f"upstream requests: {upstream_stats['total_requests']}"
+              f"  per submission: {upstream_stats['total_requests'] / submissions:.2f}"
+              f"  blocks: {upstream_stats['blocks']}")
+    for route, count in sorted(upstream_stats['requests'].items()):
+        print(f"  {route:<45} {count}")
+    if per_account:
+        print("submissions/sec per account:")
+        for username, count in sorted(per_account.items()):
+            print(f"  {username:<20} {count / elapsed:.3f}")
+
+
+async def run_manager(args):
+    from ojuzmanager.manager_config import config
+    from ojuzmanager.OjuzSession import OjuzSession
+    from ojuzmanager.OjuzManager import OjuzManager
+
+    fake = FakeOjuz(latency=args.latency, block_rate=args.block_rate, session_expiry=args.session_expiry,
+                    judge_time=args.judge_time)
+    runner = await start_fake_ojuz(fake, port=args.fake_port)
+    base_url = f"http://localhost:{args.fake_port}" # aiohttp refuses cookies of bare IPs
+    OjuzSession.base_url = base_url
+    config['account_scheduler']['submits_per_minute'] = args.submits_per_minute
+    config['session_store']['directory'] = tempfile.mkdtemp(prefix="ojuz_sessions_")
+
+    ojuz = OjuzManager(accounts=[(f"user{i}@example.com", "password") for i in range(args.accounts)])
+    await ojuz.initialize_accounts()
+    # logins are startup cost, count only the steady state
+    fake.requests.clear()
+
+    async def make_request(i):
+        # distinct sources, identical ones would be answered by submission dedup without reaching oj.uz
+        submission_url = await ojuz.submit_solution(base_url + PROBLEM_PATH, CODE + f"// {i}\n")
+        if submission_url is not None and args.watch:
+            await ojuz.wait_submission_verdict(submission_url.split('/')[-1])
+        return submission_url
+
+    started = time.perf_counter()
+    results = await drive(args.rps, args.duration, make_request)
+    elapsed = time.perf_counter() - started
+    per_account = {username: stats['submits'] for username, stats in ojuz.scheduler.stats().items()}
+    report("OjuzManager.submit_solution" + (" + verdict" if args.watch else ""), results, elapsed,
+           fake.stats(), per_account)
+
+    await ojuz.close_sessions()
+    await runner.cleanup()
+
+
+async def run_server(args):
+    async with aiohttp.ClientSession() as session:
+        async def make_request(i):
+            payload = {'problem_url': args.fake_url + PROBLEM_PATH, 'solution_code': CODE + f"// {i}\n"}
+            async with session.post(f"{args.server_url}/submit", json=payload) as response:
+                if response.status != 202:
+                    raise RuntimeError(f"/submit answered {response.status}")
+                job = await response.json()
+            while True: # a submission is done when its job is, not when it is queued
+                async with session.get(args.server_url + job['status_url']) as response:
+                    status = await response.json()
+                if status['status'] in ('done', 'failed'):
+                    return status['submission_url']
+                await asyncio.sleep(0.2)
+
+        async with session.get(f"{args.fake_url}/_stats") as response:
+            before = await response.json()
+        started = time.perf_counter()
+        results = await drive(args.rps, args.duration, make_request)
+        elapsed = time.perf_counter() - started
+        async with session.get(f"{args.fake_url}/_stats") as response:
+            after = await response.json()
+
+    upstream = {
+        'requests': {route: count - before['requests'].get(route, 0) for route, count in after['requests'].items()},
+        'total_requests': after['total_requests'] - before['total_requests'],
+        'submissions': after['submissions'] - before['submissions'],
+        'blocks': after['blocks'] - before['blocks'],
+    }
+    per_account = {user: count - before['submits_by_user'].get(user, 0) for user, count in after['submits_by_user'].items()}
+    report(f"POST {args.server_url}/submit until the job is done", results, elapsed, upstream, per_account)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test against a fake oj.uz")
+    parser.add_argument("--rps", type=float, default=2.0, help="submissions started per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to keep submitting")
+    subparsers = parser.add_subparsers(dest="target", required=True)
+
+    manager = subparsers.add_parser("manager", help="drive OjuzManager in-process")
+    manager.add_argument("--accounts", type=int, default=4)
+    manager.add_argument("--submits-per-minute", type=float, default=60, help="per account scheduler limit")
+    manager.add_argument("--fake-port", type=int, default=8090)
+    manager.add_argument("--latency", type=float, default=0.05)
+    manager.add_argument("--block-rate", type=float, default=0.0)
+    manager.add_argument("--session-expiry", type=float, default=3600)
+    manager.add_argument("--judge-time", type=float, default=3.0)
+    manager.add_argument("--watch", action="store_true", help="also wait for the final verdict of every submission")
+
+    server = subparsers.add_parser("server", help="drive a running server's /submit")
+    server.add_argument("--server-url", default="http://127.0.0.1:8888")
+    server.add_argument("--fake-url", default="http://localhost:8090")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    asyncio.run(run_manager(args) if args.target == "manager" else run_server(args))
+
+
+if __name__ == "__main__":
+    main()
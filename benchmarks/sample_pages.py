@@ -0,0 +1,80 @@
+"""
+Synthetic pages shaped like the oj.uz pages we scrape: same nesting, forms and
+submission_details layout, filled with enough boilerplate to have a realistic size.
+Used by the benchmarks when no saved pages are given.
+"""
+import random
+
+NAVBAR = "".join(
+    f'<li class="nav-item"><a class="nav-link" href="/menu/{i}">Menu entry {i}</a></li>' for i in range(40)
+)
+
+
+def _page(title, body, logged_in=True):
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/static/css/bootstrap.min.css"><script src="/static/js/jquery.min.js"></script>
+</head><body><nav class="navbar navbar-default"><ul class="nav navbar-nav">{NAVBAR}</ul>
+{'<a href="/logout">Sign out</a>' if logged_in else '<a href="/login">Sign in</a>'}</nav><div class="container">{body}</div>
+<footer class="footer"><p>oj.uz</p></footer></body></html>"""
+
+
+def submit_page(problem_id="APIO13_interference", csrf_token="1660000000##0123456789abcdef0123456789abcdef01234567"):
+    statement = "".join(f"<p>Statement paragraph {i}: {'lorem ipsum dolor sit amet ' * 8}</p>" for i in range(30))
+    languages = "".join(f'<option value="{i}">Language {i}</option>' for i in range(12))
+    body = f"""<h1>{problem_id}</h1><div class="problem-statement">{statement}</div>
+<form method="post" action="/problem/submit/{problem_id}" enctype="multipart/form-data">
+<input type="hidden" name="codes" value=""><select name="language" class="form-control">{languages}</select>
+<textarea name="code_1" class="form-control"></textarea>
+<input id="csrf_token" name="csrf_token" type="hidden" value="{csrf_token}">
+<input type="submit" class="btn btn-primary" value="Submit"></form>"""
+    return _page(f"Submit {problem_id}", body)
+
+
+def problem_page(problem_id="APIO13_interference", time_limit_ms=2000, memory_limit_kb=262144,
+                 subtask_points=(7, 11, 23, 59)):
+    statement = "".join(f"<p>Statement paragraph {i}: {'lorem ipsum dolor sit amet ' * 8}</p>" for i in range(30))
+    subtasks = "".join(f"<tr><td>{i}</td><td>{points}</td></tr>" for i, points in enumerate(subtask_points, 1))
+    body = f"""<h1>{problem_id}</h1>
+<table class="table table-bordered"><tr><th>Time limit</th><td>{time_limit_ms} ms</td></tr>
+<tr><th>Memory limit</th><td>{memory_limit_kb} KiB</td></tr></table>
+<div class="problem-statement">{statement}</div>
+<table class="table"><tr><th>Subtask</th><th>Points</th></tr>{subtasks}</table>
+<a class="btn btn-primary" href="/problem/submit/{problem_id}">Submit</a>"""
+    return _page(problem_id, body)
+
+
+def login_page(csrf_token="1660000000##0123456789abcdef0123456789abcdef01234567", logged_in=False):
+    body = f"""<form method="post" action="/login?next=/?">
+<input type="hidden" name="next" value="/?"><input type="email" name="email"><input type="password" name="password">
+<input id="csrf_token" name="csrf_token" type="hidden" value="{csrf_token}">
+<input type="submit" name="submit" value="Sign in"></form>"""
+    return _page("Sign in", body, logged_in)
+
+
+def submission_details(subtasks=8, tests_per_subtask=40, seed=0):
+    rnd = random.Random(seed)
+    panels = []
+    for subtask in range(1, subtasks + 1):
+        full = 100 // subtasks
+        rows = []
+        accepted = True
+        for test in range(1, tests_per_subtask + 1):
+            verdict = "Correct" if rnd.random() < 0.95 else "Wrong answer"
+            accepted &= verdict == "Correct"
+            rows.append(f"""<tr><td>{test}</td><td><span class="label label-{'success' if verdict == 'Correct' else 'danger'}">{verdict}</span></td>
+<td>{rnd.randint(1, 900)} ms</td><td>{rnd.randint(200, 262144)} KB</td><td>{verdict}</td></tr>""")
+        score = full if accepted else 0
+        panels.append(f"""<div class="panel panel-default subtask"><div class="panel-heading">
+<h3 class="panel-title">Subtask #{subtask} <span class="label">{'Accepted' if accepted else 'Wrong answer'}</span>
+<span class="subtask-score">{score} / {full}</span></h3></div>
+<table class="table table-condensed"><thead><tr><th>#</th><th>Verdict</th><th>Execution time</th><th>Memory</th><th>Grader output</th></tr></thead>
+<tbody>{''.join(rows)}</tbody></table></div>""")
+    return f'<div id="submission_details">{"".join(panels)}</div>'
+
+
+def submission_page(submission_id="616582", subtasks=8, tests_per_subtask=40, seed=0):
+    header = f"""<table class="table"><tr><th>Submission #{submission_id}</th></tr>
+<tr><td>Problem</td><td>IOI18_combo</td></tr><tr><td>Language</td><td>cpp17</td></tr></table>
+<pre class="code">{'int main() { return 0; }' * 40}</pre>"""
+    return _page(f"Submission #{submission_id}", header + submission_details(subtasks, tests_per_subtask, seed))
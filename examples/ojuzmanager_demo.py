@@ -21,10 +21,9 @@ async def main():
             print(submission_url)
             submission_id = str(submission_url).split('/')[-1]
 
-            # prints what's going on for 10 times / 2.5s wait between them
-            for i in range(10):
-                print(await ojuz.get_submission_summary(submission_id))
-                await asyncio.sleep(2.5)
+            # prints every change of the summary until the final verdict
+            async for summary in ojuz.watch_submission(submission_id):
+                print(summary)
 
     # dummy_submission_id = "616582"
     # submissions_table = await ojuz.get_submission_details_table(dummy_submission_id)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import deque
+from ojuzmanager import debug
+
+logger = logging.getLogger("ojuzmanager.accountscheduler")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class AccountSchedulerException(Exception):
+    pass
+
+class AccountState:
+    """Scheduling state of one oj.uz account: token bucket, in-flight work, blocks and health"""
+
+    def __init__(self, session, burst, now) -> None:
+        self.session = session
+        self.tokens: float = burst
+        self.last_refill: float = now
+        self.in_flight: int = 0
+        self.cooldown_until: float = 0.0
+        self.block_events: deque[float] = deque()
+        self.consecutive_failures: int = 0
+        self.last_used: float = 0.0
+        self.submits: int = 0
+        self.blocks: int = 0
+
+    @property
+    def username(self):
+        return self.session.username
+
+    def __repr__(self) -> str:
+        return f"<AccountState {self.username} tokens={self.tokens:.2f} in_flight={self.in_flight}>"
+
+
+class AccountScheduler:
+    """
+    Dispatches submissions over the pool of logged in accounts.
+    Every account has a token bucket refilled at `submits_per_minute`, holding up to `burst` tokens.
+    A submission goes to the account with the earliest available slot, ties are broken by
+    fewest in-flight submissions and then by least recently used.
+    An account oj.uz blocked is cooled down, doubling the cooldown for every block
+    in the last `block_window` seconds, while its work moves to the other accounts.
+    With a `shared_limiter` (see Coordination.MongoRateLimiter), an account picked locally must
+    also get a token from the bucket shared with other processes, blocks are reported to it too.
+    """
+
+    def __init__(self, submits_per_minute=6, burst=2, block_cooldown=30, max_block_cooldown=600,
+                 block_window=600, max_in_flight=2, failure_cooldown=60, max_consecutive_failures=3,
+                 shared_limiter=None) -> None:
+        """
+        submits_per_minute (float): sustained submit rate allowed per account
+        burst (int): size of the token bucket
+        block_cooldown (float): seconds an account rests after its first recent block
+        max_block_cooldown (float): upper bound of the doubled cooldown
+        block_window (float): seconds a block event counts as recent
+        max_in_flight (int): concurrent submissions per account
+        failure_cooldown (float): seconds an account rests after `max_consecutive_failures` failures in a row
+        shared_limiter (MongoRateLimiter): global per-account limits of a multi-process deployment, None if alone
+        """
+
+        self.refill_rate = submits_per_minute / 60
+        self.burst = burst
+        self.block_cooldown = block_cooldown
+        self.max_block_cooldown = max_block_cooldown
+        self.block_window = block_window
+        self.max_in_flight = max_in_flight
+        self.failure_cooldown = failure_cooldown
+        self.max_consecutive_failures = max_consecutive_failures
+        self.shared_limiter = shared_limiter
+        self.shared_denials: int = 0
+
+        self.accounts: dict[str, AccountState] = {}
+        self._changed: asyncio.Condition | None = None
+
+    @property
+    def changed(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def add_session(self, session):
+        self.accounts[session.username] = AccountState(session, self.burst, time.monotonic())
+
+    def remove_session(self, session):
+        self.accounts.pop(session.username, None)
+
+    def _refill(self, account, now):
+        account.tokens = min(self.burst, account.tokens + (now - account.last_refill) * self.refill_rate)
+        account.last_refill = now
+
+    def available_at(self, account, now):
+        """return (float): monotonic time at which account can take another submission, inf if only completions free it"""
+
+        if account.in_flight >= self.max_in_flight:
+            return float('inf')
+        self._refill(account, now)
+        token_at = now if account.tokens >= 1 else now + (1 - account.tokens) / self.refill_rate
+        return max(token_at, account.cooldown_until)
+
+    def _pick(self, now):
+        if not self.accounts:
+            raise AccountSchedulerException("There are no accounts to schedule submissions on!")
+        return min(self.accounts.values(),
+                   key=lambda a: (self.available_at(a, now), a.in_flight, a.last_used))
+
+    async def acquire(self) -> AccountState:
+        """Waits for the account with the earliest available slot and reserves it.
+        Must be followed by release().
+        """
+
+        while True:
+            account = await self._acquire_local()
+            if self.shared_limiter is None:
+                return account
+            try:
+                wait = await self.shared_limiter.acquire(account.username)
+            except Exception as e:
+                # the local limits still hold, better than stopping every submission
+                logger.warning(f"Shared rate limit of {account.username} unavailable, using local limits: {e!r}")
+                return account
+            except BaseException:
+                # cancelled, the caller never gets the slot to release it
+                self._give_back(account)
+                async with self.changed:
+                    self.changed.notify_all()
+                raise
+            if wait <= 0:
+                return account
+            # other processes used the budget, give the slot back and rest the account until it refills
+            self.shared_denials += 1
+            self._give_back(account)
+            account.cooldown_until = max(account.cooldown_until, time.monotonic() + wait)
+            logger.debug("Shared rate limit deferred %s for %.2fs", account.username, wait)
+            async with self.changed:
+                self.changed.notify_all()
+
+    def _give_back(self, account):
+        """Undoes the reservation of _acquire_local"""
+
+        account.in_flight -= 1
+        account.submits -= 1
+        account.tokens = min(self.burst, account.tokens + 1)
+
+    async def _acquire_local(self) -> AccountState:
+        async with self.changed:
+            while True:
+                now = time.monotonic()
+                account = self._pick(now)
+                ready_at = self.available_at(account, now)
+                if ready_at <= now:
+                    account.tokens -= 1
+                    account.in_flight += 1
+                    account.last_used = now
+                    account.submits += 1
+                    logger.debug("Account scheduler picked %r", account)
+                    return account
+                # woken up early by release()/report_block() since the best choice might change
+                timeout = None if ready_at == float('inf') else ready_at - now
+                try:
+                    await asyncio.wait_for(self.changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, account, blocked=False, failed=False):
+        """Returns the account reserved by acquire()
+
+        blocked (bool): oj.uz blocked the submission, account is cooled down
+        failed (bool): submission failed for another reason, e.g. the login expired
+        """
+
+        now = time.monotonic()
+        account.in_flight -= 1
+        if blocked:
+            account.blocks += 1
+            account.block_events.append(now)
+            while account.block_events and account.block_events[0] < now - self.block_window:
+                account.block_events.popleft()
+            cooldown = min(self.max_block_cooldown, self.block_cooldown * 2 ** (len(account.block_events) - 1))
+            account.cooldown_until = max(account.cooldown_until, now + cooldown)
+            account.tokens = 0
+            logger.warning(f"oj.uz blocked {account.username}, cooling it down for {cooldown}s")
+            if self.shared_limiter is not None:
+                try:
+                    await self.shared_limiter.report_block(account.username, cooldown)
+                except Exception as e:
+                    logger.warning(f"Could not share the block of {account.username}: {e!r}")
+        elif failed:
+            account.consecutive_failures += 1
+            if account.consecutive_failures >= self.max_consecutive_failures:
+                account.cooldown_until = max(account.cooldown_until, now + self.failure_cooldown)
+                logger.warning(f"{account.username} failed {account.consecutive_failures} times in a row, "
+                               f"cooling it down for {self.failure_cooldown}s")
+        else:
+            account.consecutive_failures = 0
+
+        async with self.changed:
+            self.changed.notify_all()
+
+    def healthy(self, account, now=None):
+        now = time.monotonic() if now is None else now
+        return account.session.logged_in and account.cooldown_until <= now
+
+    def stats(self):
+        """return (dict): per account scheduling state keyed by username"""
+
+        now = time.monotonic()
+        return {
+            username: {
+                'tokens': round(min(self.burst, account.tokens + (now - account.last_refill) * self.refill_rate), 2),
+                'in_flight': account.in_flight,
+                'submits': account.submits,
+                'blocks': account.blocks,
+                'recent_blocks': len(account.block_events),
+                'cooldown_left': max(0.0, account.cooldown_until - now),
+                'healthy': self.healthy(account, now),
+            } for username, account in self.accounts.items()
+        }
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import logging
+import aiohttp
+from ojuzmanager import debug
+
+logger = logging.getLogger("ojuzmanager.connectionpool")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class ConnectionPool:
+    """
+    One aiohttp connector shared by the sessions of all accounts, so TLS handshakes,
+    DNS lookups and keep-alive connections to oj.uz are pooled across accounts.
+    Every account still gets its own ClientSession and therefore its own cookie jar.
+    """
+
+    def __init__(self, limit=100, limit_per_host=20, keepalive_timeout=30, ttl_dns_cache=300,
+                 total_timeout=60, connect_timeout=10, sock_read_timeout=30) -> None:
+        """
+        limit (int): maximum number of open connections
+        limit_per_host (int): maximum number of open connections to oj.uz
+        keepalive_timeout (float): seconds an idle connection is kept open
+        ttl_dns_cache (float): seconds DNS answers are cached
+        total_timeout, connect_timeout, sock_read_timeout (float): ClientTimeout of every request
+        """
+
+        self.connector_options = {
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': keepalive_timeout,
+            'ttl_dns_cache': ttl_dns_cache,
+            'use_dns_cache': True,
+        }
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout, sock_read=sock_read_timeout)
+        self._connector: aiohttp.TCPConnector | None = None
+
+        self.requests: int = 0
+        self.connections_created: int = 0
+        self.connections_reused: int = 0
+        self.dns_cache_hits: int = 0
+        self.dns_cache_misses: int = 0
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        self.trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        self.trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        self.trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        # created lazily since the connector has to be created inside the running loop
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(**self.connector_options)
+            logger.info(f"Shared connector created: {self.connector_options}")
+        return self._connector
+
+    def client_session(self, cookie_jar=None) -> aiohttp.ClientSession:
+        """Creates a ClientSession on the shared connector with its own cookie jar"""
+
+        return aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False, # closing one account must not close the others' connections
+            cookie_jar=cookie_jar or aiohttp.CookieJar(),
+            timeout=self.timeout,
+            trace_configs=[self.trace_config],
+        )
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    async def _on_dns_cache_hit(self, session, context, params):
+        self.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context, params):
+        self.dns_cache_misses += 1
+
+    def stats(self):
+        """return (dict): connection reuse counters, `reuse_ratio` is the share of requests served by a warm connection"""
+
+        connections = self.connections_created + self.connections_reused
+        return {
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': self.connections_reused / connections if connections else 0.0,
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses,
+        }
+
+    async def close(self):
+        if self._connector is not None:
+            logger.info(f"Shared connector closing, stats={self.stats()}")
+            await self._connector.close()
+            self._connector = None
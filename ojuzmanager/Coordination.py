@@ -0,0 +1,123 @@
+"""
+Coordination of several OjuzManager processes (on one or several nodes) sharing the same
+accounts through Mongo: a global token bucket and block cooldown per account, and leases
+so that only one process at a time logs an account in.
+"""
+from __future__ import annotations
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ojuzmanager import debug
+
+logger = logging.getLogger("ojuzmanager.coordination")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+
+def default_node_id():
+    """return (string): hostname:pid, unique among the processes sharing a database"""
+
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MongoRateLimiter:
+    """
+    Token bucket per account stored in Mongo, refilled at `submits_per_minute` up to `burst`
+    tokens, shared by every process. Taking a token is a single atomic find_one_and_update
+    with an aggregation pipeline, so processes never need a lock to agree on the budget.
+    A block seen by any process cools the account down for all of them.
+
+    Documents: {_id: username, tokens, updated_at, blocked_until, acquired}, times in epoch seconds
+    """
+
+    def __init__(self, collection, submits_per_minute=6, burst=2) -> None:
+        self.collection = collection
+        self.refill_rate = submits_per_minute / 60
+        self.burst = burst
+
+    async def acquire(self, username):
+        """Takes a token of the account if one is available
+
+        return (float): 0 if a token was taken, otherwise seconds until one might be
+        """
+
+        now = time.time()
+        tokens = {'$ifNull': ['$tokens', self.burst]}
+        elapsed = {'$max': [0, {'$subtract': [now, {'$ifNull': ['$updated_at', now]}]}]}
+        document = await self.collection.find_one_and_update(
+            {'_id': username},
+            [
+                {'$set': {
+                    'tokens': {'$min': [self.burst, {'$add': [tokens, {'$multiply': [elapsed, self.refill_rate]}]}]},
+                    'updated_at': now,
+                    'blocked_until': {'$ifNull': ['$blocked_until', 0]},
+                }},
+                {'$set': {'acquired': {'$and': [{'$gte': ['$tokens', 1]}, {'$lte': ['$blocked_until', now]}]}}},
+                {'$set': {'tokens': {'$cond': ['$acquired', {'$subtract': ['$tokens', 1]}, '$tokens']}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if document['acquired']:
+            return 0.0
+        token_wait = (1 - document['tokens']) / self.refill_rate if document['tokens'] < 1 else 0.0
+        return max(token_wait, document['blocked_until'] - now, 0.01)
+
+    async def report_block(self, username, cooldown):
+        """Cools the account down for every process, its bucket is emptied"""
+
+        until = time.time() + cooldown
+        await self.collection.update_one(
+            {'_id': username},
+            [{'$set': {'tokens': 0, 'blocked_until': {'$max': [{'$ifNull': ['$blocked_until', 0]}, until]}}}],
+            upsert=True,
+        )
+
+
+class MongoLease:
+    """
+    Named leases held by one owner until released or until they expire `ttl` seconds after
+    the last acquire. Acquiring is an upsert that only matches a free, expired or already
+    owned lease; a lease held by someone else makes the upsert collide on _id.
+
+    Documents: {_id: name, owner, expires_at}
+    """
+
+    def __init__(self, collection, owner, ttl=60) -> None:
+        """
+        owner (string): id of this process, see default_node_id
+        ttl (float): seconds after which a lease is free again if its owner died
+        """
+
+        self.collection = collection
+        self.owner = owner
+        self.ttl = ttl
+
+    async def acquire(self, name):
+        """Takes or renews the lease
+
+        return (bool): if this owner holds the lease now
+        """
+
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.find_one_and_update(
+                {'_id': name, '$or': [{'owner': self.owner}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'owner': self.owner, 'expires_at': now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def release(self, name):
+        await self.collection.delete_one({'_id': name, 'owner': self.owner})
+
+    async def owner_of(self, name):
+        """return (string or None): current owner of an unexpired lease"""
+
+        document = await self.collection.find_one({'_id': name, 'expires_at': {'$gte': datetime.now(timezone.utc)}})
+        return document['owner'] if document is not None else None
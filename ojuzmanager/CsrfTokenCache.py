@@ -0,0 +1,122 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from ojuzmanager import debug
+from ojuzmanager.Tracing import untraced
+
+logger = logging.getLogger("ojuzmanager.csrftokencache")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class CsrfTokenCache:
+    """
+    Caches the csrf token of a single oj.uz session.
+    oj.uz ties the csrf token to the session cookie, not to the page it was served on,
+    so one token can be reused for every form until it expires or a POST gets rejected.
+
+    Tokens older than `ttl - refresh_margin` are still handed out but refreshed in the background,
+    tokens older than `ttl` are re-fetched before being returned.
+
+    Every invalidate() or set() starts a new generation: a download started before it
+    does not overwrite the cache when it completes, and later misses do not join it.
+    """
+
+    def __init__(self, fetch_token, ttl=30 * 60, refresh_margin=5 * 60) -> None:
+        """
+        fetch_token (coroutine function): called with a url, downloads a fresh token from it
+        ttl (float): seconds a token is considered valid
+        refresh_margin (float): seconds before expiry when a background refresh is started
+        """
+
+        self.fetch_token = fetch_token
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+
+        self.token: str | None = None
+        self.fetched_at: float = 0.0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.refreshes: int = 0
+        self.invalidations: int = 0
+        self.generation: int = 0
+        self._inflight: asyncio.Task | None = None
+
+    def _age(self):
+        return time.monotonic() - self.fetched_at
+
+    async def _fetch(self, url, generation):
+        token = await self.fetch_token(url)
+        if generation == self.generation:
+            self.token = token
+            self.fetched_at = time.monotonic()
+        else:
+            logger.debug("Csrf token downloaded from %s is outdated, not caching it", url)
+        return token
+
+    def _start_fetch(self, url) -> asyncio.Task:
+        # all concurrent misses share the same download
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(untraced(self._fetch(url, self.generation)))
+        return self._inflight
+
+    async def get(self, url):
+        """Returns a valid csrf token, downloading one from url only if needed
+
+        url (string): the url that should contain a form/csfr token, used on cache miss
+
+        return (string): the csfr token to add to the payload
+        """
+
+        if self.token is not None and self._age() < self.ttl:
+            self.hits += 1
+            if self._age() >= self.ttl - self.refresh_margin and (self._inflight is None or self._inflight.done()):
+                self.refreshes += 1
+                logger.debug("Csrf token is about to expire, refreshing it in the background from %s", url)
+                self._start_fetch(url).add_done_callback(self._log_refresh_failure)
+            return self.token
+
+        self.misses += 1
+        return await asyncio.shield(self._start_fetch(url))
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background csrf token refresh failed: {task.exception()!r}")
+
+    def _new_generation(self):
+        self.generation += 1
+        self._inflight = None # left to finish for its current waiters
+
+    def set(self, token):
+        """Caches a token that was downloaded as a side effect of another request"""
+
+        self._new_generation()
+        self.token = token
+        self.fetched_at = time.monotonic()
+
+    def invalidate(self):
+        """Drops the cached token, next get() will download a new one"""
+
+        if self.token is not None:
+            self.invalidations += 1
+        self._new_generation()
+        self.token = None
+        self.fetched_at = 0.0
+
+    def stats(self):
+        """return (dict): counters of the cache, `hits` are saved page downloads"""
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'invalidations': self.invalidations,
+        }
+
+    async def close(self):
+        if self._inflight is not None and not self._inflight.done():
+            self._inflight.cancel()
+            try:
+                await self._inflight
+            except (asyncio.CancelledError, Exception):
+                pass
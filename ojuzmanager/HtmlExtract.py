@@ -0,0 +1,366 @@
+"""
+Targeted extraction of the few pieces of oj.uz pages we actually need.
+Building a whole BeautifulSoup tree with html.parser is by far the slowest part of scraping,
+so every function here has a fast path and falls back to the original full parse if it fails.
+
+Table extraction backends, fastest first: selectolax, lxml, strainer (SoupStrainer limited
+html.parser parse), soup (full html.parser parse). selectolax and lxml are optional,
+install them with `pip install selectolax` / `pip install lxml`.
+"""
+import html as htmllib
+import logging
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, SoupStrainer
+from ojuzmanager import debug
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser # older selectolax versions
+    except ImportError:
+        SelectolaxParser = None
+
+try:
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
+
+logger = logging.getLogger("ojuzmanager.htmlextract")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+_ATTRIBUTE_RE = re.compile(r'''([^\s"'>/=]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''')
+_input_re_cache = {}
+
+
+def _input_tag_re(name):
+    if name not in _input_re_cache:
+        _input_re_cache[name] = re.compile(
+            r'''<input\b[^>]*\bname\s*=\s*["']?''' + re.escape(name) + r'''(?:["'\s/>])[^>]*>''', re.IGNORECASE)
+    return _input_re_cache[name]
+
+
+def _tag_attributes(tag):
+    return {
+        match.group(1).lower(): htmllib.unescape(next(g for g in match.groups()[1:] if g is not None))
+        for match in _ATTRIBUTE_RE.finditer(tag)
+    }
+
+
+def extract_input_value_soup(html, name):
+    """Reference implementation, full html.parser parse"""
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.find('input', attrs={'name': name})['value']
+
+
+def extract_input_value(html, name):
+    """Returns the value attribute of the <input> with given name, e.g. the csrf token
+
+    html (string): page content
+    name (string): name attribute of the input
+
+    return (string): value of the input
+    """
+
+    match = _input_tag_re(name).search(html)
+    if match is not None:
+        attributes = _tag_attributes(match.group(0))
+        if attributes.get('name') == name and 'value' in attributes:
+            return attributes['value']
+    logger.debug("Regex fast path could not find input name=%s, falling back to BeautifulSoup", name)
+    return extract_input_value_soup(html, name)
+
+
+def _element_by_id_selectolax(html, element_id):
+    node = SelectolaxParser(html).css_first(f'[id="{element_id}"]')
+    return None if node is None else node.html
+
+
+def _element_by_id_lxml(html, element_id):
+    found = lxml_html.fromstring(html).xpath('//*[@id=$element_id]', element_id=element_id)
+    return lxml_html.tostring(found[0], encoding='unicode', method='html') if found else None
+
+
+def _element_by_id_strainer(html, element_id):
+    soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer(id=element_id))
+    element = soup.find(id=element_id)
+    return None if element is None else str(element)
+
+
+def _element_by_id_soup(html, element_id):
+    element = BeautifulSoup(html, 'html.parser').find(id=element_id)
+    return None if element is None else str(element)
+
+
+ELEMENT_BACKENDS = {
+    'selectolax': _element_by_id_selectolax,
+    'lxml': _element_by_id_lxml,
+    'strainer': _element_by_id_strainer,
+    'soup': _element_by_id_soup,
+}
+
+
+def available_backends():
+    """return (list): names of the table extraction backends that can be used, fastest first"""
+
+    unavailable = {'selectolax': SelectolaxParser is None, 'lxml': lxml_html is None}
+    return [name for name in ELEMENT_BACKENDS if not unavailable.get(name, False)]
+
+
+element_backend = available_backends()[0]
+
+
+def set_element_backend(name):
+    """Changes the backend used by extract_element_by_id"""
+
+    global element_backend
+    if name not in available_backends():
+        raise ValueError(f"Unknown or not installed html backend {name}, available: {available_backends()}")
+    element_backend = name
+
+
+def extract_element_by_id(html, element_id, backend=None):
+    """Returns the outer html of the element with given id
+
+    html (string): page content
+    element_id (string): id attribute of the element
+    backend (string): one of available_backends(), defaults to the fastest one
+
+    return (string or None): html of the element, None if it is not in the page
+    """
+
+    backend = backend or element_backend
+    try:
+        return ELEMENT_BACKENDS[backend](html, element_id)
+    except Exception as e:
+        if backend == 'soup':
+            raise
+        logger.warning(f"Html backend {backend} failed ({e!r}), falling back to BeautifulSoup")
+        return _element_by_id_soup(html, element_id)
+
+
+_SUBTASK_RE = re.compile(r'subtask\s*#?\s*(\d+)', re.IGNORECASE)
+_SCORE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)')
+_NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([a-zA-Z]*)')
+# substrings of a verdict that mean oj.uz is still working on it
+PENDING_VERDICTS = ('waiting', 'pending', 'queue', 'compiling', 'evaluating', 'judging', 'running')
+_MEMORY_UNITS_KB = {'b': 1 / 1024, 'kb': 1, 'kib': 1, 'mb': 1024, 'mib': 1024, 'gb': 1024 * 1024}
+_TIME_UNITS_MS = {'ms': 1, 's': 1000, 'sec': 1000}
+
+
+def _number(text, units, default_unit):
+    match = _NUMBER_RE.search(text or '')
+    if match is None:
+        return None
+    factor = units.get(match.group(2).lower() or default_unit, 1)
+    value = float(match.group(1)) * factor
+    return int(value) if value == int(value) else value
+
+
+class _SubmissionDetailsParser(HTMLParser):
+    """Streaming tokenizer over #submission_details, collects subtask headings and test rows"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.subtasks = []
+        self._heading_depth = 0 # >0 while inside a panel heading
+        self._heading_parts = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get('class') or '').split()
+        if self._heading_depth:
+            self._heading_depth += 1
+        elif 'panel-heading' in classes or tag in ('h3', 'h4'):
+            self._heading_depth = 1
+            self._heading_parts = []
+        elif tag == 'tr':
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if self._heading_depth:
+            self._heading_depth -= 1
+            if not self._heading_depth:
+                self._start_subtask(' '.join(''.join(self._heading_parts).split()))
+        elif tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            self._add_row(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._heading_depth:
+            self._heading_parts.append(data + ' ')
+        elif self._cell is not None:
+            self._cell.append(data)
+
+    def _start_subtask(self, heading):
+        match = _SUBTASK_RE.search(heading)
+        if match is None:
+            return
+        score = _SCORE_RE.search(heading)
+        verdict = heading[match.end():score.start() if score else len(heading)].strip()
+        self.subtasks.append({
+            'subtask': int(match.group(1)),
+            'verdict': verdict,
+            'score': _number(score.group(1), {}, '') if score else None,
+            'full_score': _number(score.group(2), {}, '') if score else None,
+            'tests': [],
+        })
+
+    def _add_row(self, cells):
+        if len(cells) < 2 or not cells[0].isdigit():
+            return # header row
+        if not self.subtasks: # tables without subtask headings
+            self.subtasks.append({'subtask': 1, 'verdict': '', 'score': None, 'full_score': None, 'tests': []})
+        cells = cells + [''] * (4 - len(cells))
+        self.subtasks[-1]['tests'].append({
+            'test': int(cells[0]),
+            'verdict': cells[1],
+            'time_ms': _number(cells[2], _TIME_UNITS_MS, 'ms'),
+            'memory_kb': _number(cells[3], _MEMORY_UNITS_KB, 'kb'),
+        })
+
+
+def parse_submission_details(html):
+    """Parses #submission_details of a submission page into plain data
+
+    html (string): submission page content
+
+    return (dict or None): None if the page has no details table, otherwise a dict with keys
+    'subtasks' (list of dicts with 'subtask', 'verdict', 'score', 'full_score' and 'tests',
+    each test a dict with 'test', 'verdict', 'time_ms', 'memory_kb'), 'score', 'full_score',
+    'max_time_ms', 'max_memory_kb', 'verdict' and 'final' (True if no test is pending anymore)
+    """
+
+    table = extract_element_by_id(html, 'submission_details')
+    if table is None:
+        return None
+    parser = _SubmissionDetailsParser()
+    parser.feed(table)
+    parser.close()
+    subtasks = parser.subtasks
+
+    tests = [test for subtask in subtasks for test in subtask['tests']]
+    verdicts = [subtask['verdict'] for subtask in subtasks] + [test['verdict'] for test in tests]
+    pending = any(marker in verdict.lower() for verdict in verdicts for marker in PENDING_VERDICTS)
+    failed = [test['verdict'] for test in tests if test['verdict'].lower() not in ('correct', 'accepted', 'ok')]
+    scores = [subtask['score'] for subtask in subtasks if subtask['score'] is not None]
+    full_scores = [subtask['full_score'] for subtask in subtasks if subtask['full_score'] is not None]
+    times = [test['time_ms'] for test in tests if test['time_ms'] is not None]
+    memories = [test['memory_kb'] for test in tests if test['memory_kb'] is not None]
+    return {
+        'verdict': 'Pending' if pending else (failed[0] if failed else 'Accepted'),
+        'score': sum(scores) if scores else None,
+        'full_score': sum(full_scores) if full_scores else None,
+        'max_time_ms': max(times, default=None),
+        'max_memory_kb': max(memories, default=None),
+        'final': bool(subtasks) and not pending,
+        'subtasks': subtasks,
+    }
+
+
+_POINTS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:points?|pts)?', re.IGNORECASE)
+_TIME_LIMIT_RE = re.compile(r'time\s+limit\s*:?\s*(\d+(?:\.\d+)?\s*[a-zA-Z]*)', re.IGNORECASE)
+_MEMORY_LIMIT_RE = re.compile(r'memory\s+limit\s*:?\s*(\d+(?:\.\d+)?\s*[a-zA-Z]*)', re.IGNORECASE)
+
+
+class _ProblemPageParser(HTMLParser):
+    """Streaming tokenizer over a problem page, collects the first heading, table rows and the page text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.rows = []
+        self.text = []
+        self._title_parts = None
+        self._skip = 0 # >0 inside script/style
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._skip += 1
+        elif tag in ('h1', 'h2') and self.title is None:
+            self._title_parts = []
+        elif tag == 'tr':
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self._skip = max(0, self._skip - 1)
+        elif tag in ('h1', 'h2') and self._title_parts is not None:
+            self.title = ' '.join(''.join(self._title_parts).split()) or None
+            self._title_parts = None
+        elif tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.text.append(data)
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_problem_page(html):
+    """Parses the metadata of an oj.uz problem page into plain data
+
+    html (string): problem page content
+
+    return (dict or None): None if the page is not a problem page, otherwise a dict with keys
+    'title', 'time_limit_ms', 'memory_limit_kb' (None when not shown) and 'subtasks'
+    (list of dicts with 'subtask' and 'points', empty when the page has no subtask table)
+    """
+
+    parser = _ProblemPageParser()
+    parser.feed(html)
+    parser.close()
+    if parser.title is None:
+        return None
+
+    time_limit = memory_limit = None
+    subtasks = []
+    in_subtask_table = False # numbered rows only count below a "Subtask" header row
+    for row in parser.rows:
+        if len(row) < 2:
+            continue
+        header = row[0].lower()
+        if 'time limit' in header:
+            time_limit = _number(row[1], _TIME_UNITS_MS, 'ms')
+        elif 'memory limit' in header:
+            memory_limit = _number(row[1], _MEMORY_UNITS_KB, 'kb')
+        elif header.strip() in ('subtask', '#'):
+            in_subtask_table = True
+        else:
+            subtask = _SUBTASK_RE.search(row[0]) or (re.fullmatch(r'(\d+)', row[0]) if in_subtask_table else None)
+            points = _POINTS_RE.fullmatch(row[-1])
+            if subtask is not None and points is not None:
+                subtasks.append({'subtask': int(subtask.group(1)), 'points': _number(points.group(1), {}, '')})
+
+    # limits written as text instead of a table
+    text = ' '.join(''.join(parser.text).split())
+    if time_limit is None and (match := _TIME_LIMIT_RE.search(text)):
+        time_limit = _number(match.group(1), _TIME_UNITS_MS, 'ms')
+    if memory_limit is None and (match := _MEMORY_LIMIT_RE.search(text)):
+        memory_limit = _number(match.group(1), _MEMORY_UNITS_KB, 'kb')
+    return {
+        'title': parser.title,
+        'time_limit_ms': time_limit,
+        'memory_limit_kb': memory_limit,
+        'subtasks': subtasks,
+    }
@@ -0,0 +1,28 @@
+from __future__ import annotations
+from collections import OrderedDict
+
+
+class LruCache(OrderedDict):
+    """OrderedDict holding at most `max_size` entries, the least recently used ones are dropped first.
+    Lookups through get() count as a use, `in` and [] do not.
+    """
+
+    def __init__(self, max_size) -> None:
+        super().__init__()
+        self.max_size = max_size
+
+    def put(self, key, value):
+        """Stores value as the most recently used entry"""
+
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+    def get(self, key, default=None):
+        """return: the value of key marked as the most recently used entry, default if key is not cached"""
+
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
@@ -0,0 +1,177 @@
+"""
+Minimal Prometheus instruments: counters, gauges and histograms with labels,
+rendered in the Prometheus text exposition format (version 0.0.4).
+Instruments are registered once at import time on the shared `registry`,
+recording a sample is a dict lookup and a few additions.
+"""
+from __future__ import annotations
+import math
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Instrument:
+    """Counters and gauges either record values or read them from `function` at every scrape,
+    a labelled function returns {label values tuple: value}"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), function=None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.values: dict[tuple, object] = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+    def _samples(self):
+        values = self.values
+        if self.function is not None:
+            values = self.function()
+            if not self.labelnames:
+                values = {(): values}
+        for key, value in values.items():
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Counter(_Instrument):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+
+class Gauge(_Instrument):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(_Instrument):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            # per bucket counts (not cumulative), sum, count
+            state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels):
+        """return (context manager): observes the seconds spent inside the with block"""
+
+        return _Timer(self, labels)
+
+    def _samples(self):
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Registry:
+    """Keeps instruments by name, registering the same name twice returns the first instrument"""
+
+    def __init__(self) -> None:
+        self.instruments: dict[str, _Instrument] = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        instrument = self.instruments.get(name)
+        if instrument is None:
+            instrument = self.instruments[name] = cls(name, *args, **kwargs)
+        elif not isinstance(instrument, cls):
+            raise ValueError(f"{name} is already registered as a {instrument.kind}")
+        return instrument
+
+    def _register_function(self, cls, name, documentation, labelnames, function):
+        instrument = self._register(cls, name, documentation, labelnames)
+        if function is not None:
+            instrument.function = function # the latest owner wins, e.g. after a component is recreated
+        return instrument
+
+    def counter(self, name, documentation, labelnames=(), function=None) -> Counter:
+        return self._register_function(Counter, name, documentation, labelnames, function)
+
+    def gauge(self, name, documentation, labelnames=(), function=None) -> Gauge:
+        return self._register_function(Gauge, name, documentation, labelnames, function)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """return (string): every instrument in the Prometheus text format"""
+
+        return '\n'.join(instrument.render() for instrument in self.instruments.values()) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -2,7 +2,21 @@ from __future__ import annotations
 import asyncio
 import logging
 from ojuzmanager import ojuz_accounts, debug
-from ojuzmanager.OjuzSession import OjuzSession
+from ojuzmanager.manager_config import config
+from ojuzmanager.OjuzSession import OjuzSession, OjuzSubmissionBlocked
+from ojuzmanager.AccountScheduler import AccountScheduler
+from ojuzmanager.RetryPolicy import CircuitOpenError
+from ojuzmanager.ConnectionPool import ConnectionPool
+from ojuzmanager.ParseExecutor import get_parse_executor
+from ojuzmanager.VerdictTracker import VerdictTracker, is_final_summary
+from ojuzmanager.SingleFlight import SingleFlight
+from ojuzmanager.ReadPool import ReadPool
+from ojuzmanager.Coordination import MongoLease, MongoRateLimiter, default_node_id
+from ojuzmanager.SourceStore import SourceStore, SubmissionDedup, submission_key
+from ojuzmanager.HtmlExtract import PENDING_VERDICTS
+from ojuzmanager.SubmissionDetailsCache import SubmissionDetailsCache
+from ojuzmanager.SessionStore import FileSessionStore, MongoSessionStore
+from ojuzmanager.ProblemCatalog import ProblemCatalog, problem_id_from_url
 
 logger = logging.getLogger("ojuzmanager.ojuzmanager")
 logger.setLevel(logging.DEBUG if debug else logging.INFO)
@@ -10,56 +24,396 @@ logger.setLevel(logging.DEBUG if debug else logging.INFO)
 class OjuzManagerException(Exception):
     pass
 
+class OjuzProblemNotFound(OjuzManagerException):
+    """The problem url is malformed or the problem does not exist on oj.uz"""
+    pass
+
+def _is_final_details_table(table):
+    # a judged table has no pending verdict left, same rule as HtmlExtract.parse_submission_details
+    if not table or table == 'None':
+        return False
+    table = table.lower()
+    return not any(marker in table for marker in PENDING_VERDICTS)
+
 class OjuzManager:
     """
     Main manager to interact with oj.uz
     Uses all specified accounts, ignores failed logins.
-    Uses LRU to submit.
+    Submissions are dispatched by AccountScheduler: per-account rate limits,
+    earliest available account first, blocked accounts are cooled down.
+    Reads (summaries, submission and problem pages) are spread by ReadPool over
+    all logged in accounts and a few anonymous sessions.
+    With config['coordination'] enabled, several managers in different processes share
+    the accounts: global per-account rate limits and one login per account, through mongo.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, mongo=None, accounts=None, node_id=None) -> None:
+        """
+        accounts (list): (username, password) pairs, defaults to ojuz_accounts from accounts.py
+        mongo (AsyncIOMotorDatabase): optional database to persist final submission details
+        and session cookies in, without it cookies are saved to a local directory
+        and problem metadata is cached in memory only
+        node_id (string): name of this process among the coordinated ones, defaults to hostname:pid
+        """
+        self.accounts = ojuz_accounts if accounts is None else accounts
         self.logged_sessions: list[OjuzSession] = []
+        self.anonymous_sessions: list[OjuzSession] = []
         self.username_to_session: dict[str, OjuzSession] = {}
-        self.solution_number: int = 0 # used for indexing
+        self.solution_number: int = 0 # number of submitted solutions
+        self.node_id = node_id or default_node_id()
+        coordination = config['coordination']
+        self.shared_limiter = self.leases = None
+        if coordination['enabled']:
+            if mongo is None:
+                raise OjuzManagerException("Coordinating accounts between processes needs a mongo database")
+            scheduler_config = config['account_scheduler']
+            self.shared_limiter = MongoRateLimiter(mongo[coordination['rate_limit_collection']],
+                scheduler_config['submits_per_minute'], scheduler_config['burst'])
+            self.leases = MongoLease(mongo[coordination['lease_collection']], self.node_id,
+                coordination['login_lease_seconds'])
+        self.scheduler = AccountScheduler(**config['account_scheduler'], shared_limiter=self.shared_limiter)
+        read_pool_config = dict(config['read_pool'])
+        self.anonymous_session_count = read_pool_config.pop('anonymous_sessions')
+        self.read_pool = ReadPool(**read_pool_config)
+        self.verdict_tracker = VerdictTracker(self.get_submission_summary)
+        flight_config = config['single_flight']
+        self.summary_flight = SingleFlight('summary', is_final=is_final_summary,
+            max_cached=flight_config['max_cached'], **flight_config['summary'])
+        self.details_table_flight = SingleFlight('details_table', is_final=_is_final_details_table,
+            max_cached=flight_config['max_cached'], **flight_config['details'])
+        self.details_flight = SingleFlight('details', is_final=lambda details: bool(details and details.get('final')),
+            max_cached=flight_config['max_cached'], **flight_config['details'])
+        self.parse_executor = get_parse_executor()
+        self.connection_pool = ConnectionPool(**config['connection_pool'])
+        details_config = config['submission_details_cache']
+        self.details_cache = SubmissionDetailsCache(
+            mongo[details_config['collection']] if mongo is not None else None, details_config['max_size'])
+        catalog_config = dict(config['problem_catalog'])
+        catalog_collection = catalog_config.pop('collection')
+        self.problem_catalog = ProblemCatalog(self._fetch_problem_page,
+            mongo[catalog_collection] if mongo is not None else None, **catalog_config)
+        dedup_config = config['dedup']
+        self.submission_dedup = SubmissionDedup(mongo[dedup_config['collection']] if mongo is not None else None,
+            dedup_config['window'], dedup_config['max_size'])
+        # identical submissions arriving together (double clicks) wait for the first one
+        self.submit_flight = SingleFlight('submit', ttl=0)
+        source_config = config['source_store']
+        self.source_store = SourceStore(mongo[source_config['collection']] if mongo is not None else None,
+            source_config['compression_level'])
+        store_config = config['session_store']
+        if mongo is not None:
+            self.session_store = MongoSessionStore(mongo[store_config['collection']])
+        else:
+            self.session_store = FileSessionStore(store_config['directory'])
+        self.login_tasks: list[asyncio.Task] = []
+        self._account_ready = asyncio.Event()
     
-    async def initialize_accounts(self) -> None:
-        login_tasks = []
-        for username, password in ojuz_accounts:
-            ojuz_session = OjuzSession(username, password)
-            self.username_to_session[username] = ojuz_session
+    async def initialize_accounts(self, wait_for_all=True) -> None:
+        """Restores saved sessions and logs in the rest of the accounts concurrently.
 
-            await ojuz_session.start_session()
-            # we will attempt 3 times to login
-            login_tasks.append(asyncio.create_task(ojuz_session.attempt_multiple_logins(3)))
+        wait_for_all (bool): if False, returns as soon as the first account is ready,
+        the others keep logging in in the background and join the pool when ready
+        """
+        if not self.accounts:
+            raise OjuzManagerException("No accounts are specified in ojuzmanager/accounts.py!")
+        semaphore = asyncio.Semaphore(config['login']['parallelism'])
+        for username, password in self.accounts:
+            ojuz_session = OjuzSession(username, password, self.parse_executor, self.connection_pool)
+            self.username_to_session[username] = ojuz_session
+            self.login_tasks.append(asyncio.create_task(self._initialize_account(ojuz_session, semaphore)))
+        for i in range(self.anonymous_session_count):
+            # nothing to log in, they start their aiohttp session on the first read
+            ojuz_session = OjuzSession(f"anonymous-{i}", None, self.parse_executor, self.connection_pool, anonymous=True)
+            self.anonymous_sessions.append(ojuz_session)
+            self.read_pool.add_session(ojuz_session)
 
-        await asyncio.gather(*login_tasks)
-        logged_usernames = []
-        for username, password in ojuz_accounts:
-            ojuz_session = self.username_to_session[username]
-            if ojuz_session.logged_in:
-                self.logged_sessions.append(ojuz_session)
-                logged_usernames.append(username)
+        all_done = asyncio.ensure_future(asyncio.wait(self.login_tasks))
+        if not wait_for_all:
+            first_ready = asyncio.ensure_future(self._account_ready.wait())
+            await asyncio.wait([all_done, first_ready], return_when=asyncio.FIRST_COMPLETED)
+            first_ready.cancel()
+        else:
+            await all_done
 
         if not self.logged_sessions:
             raise OjuzManagerException("Could not login with any of the specified accounts!")
     
-        logger.info(f"Ojuzmanager initialized, the following usernames logged in and are ready to use: {logged_usernames}")
+        logged_usernames = [session.username for session in self.logged_sessions]
+        logger.info("Ojuzmanager initialized, the following usernames logged in and are ready to use: %s", logged_usernames)
+
+    async def _initialize_account(self, ojuz_session, semaphore):
+        try:
+            await self._restore_or_login(ojuz_session, semaphore)
+        except Exception:
+            logger.exception(f"Could not initialize account {ojuz_session.username}")
+
+    async def _restore(self, ojuz_session):
+        """return (bool): if the saved cookies of the account are still logged in"""
+        try:
+            cookie_jar = await self.session_store.load(ojuz_session.username)
+        except Exception as e:
+            logger.warning(f"Could not load saved session of {ojuz_session.username}: {e!r}")
+            cookie_jar = None
+        if ojuz_session.session is not None:
+            await ojuz_session.session.close()
+        await ojuz_session.start_session(cookie_jar)
+
+        try:
+            return cookie_jar is not None and await ojuz_session.probe_login()
+        except Exception as e:
+            logger.warning(f"Probing saved session of {ojuz_session.username} failed: {e!r}")
+            return False
+
+    async def _login(self, ojuz_session):
+        if not await ojuz_session.attempt_multiple_logins(config['login']['attempts']):
+            logger.warning(f"Could not login with {ojuz_session.username}")
+            return False
+        await self._save_session(ojuz_session)
+        return True
+
+    async def _coordinated_login(self, ojuz_session):
+        """Logs in only if no other process is logging the same account in, otherwise
+        waits for that process and continues with the cookies it saved"""
+        lease = f"login:{ojuz_session.username}"
+        deadline = asyncio.get_running_loop().time() + self.leases.ttl
+        while not await self.leases.acquire(lease):
+            if asyncio.get_running_loop().time() > deadline:
+                logger.warning(f"Login lease of {ojuz_session.username} still taken, logging in anyway")
+                return await self._login(ojuz_session)
+            await asyncio.sleep(1)
+            # probe only once the other process is done, its cookies are in the session store by then
+            if await self.leases.owner_of(lease) is None and await self._restore(ojuz_session):
+                logger.info("%s continues the session another process logged in", ojuz_session.username)
+                return True
+        try:
+            # the previous owner might have finished between our restore and acquire
+            return await self._restore(ojuz_session) or await self._login(ojuz_session)
+        finally:
+            await self.leases.release(lease)
+
+    async def _restore_or_login(self, ojuz_session, semaphore):
+        if not await self._restore(ojuz_session):
+            async with semaphore:
+                if self.leases is not None:
+                    logged_in = await self._coordinated_login(ojuz_session)
+                else:
+                    logged_in = await self._login(ojuz_session)
+            if not logged_in:
+                return
+
+        self.logged_sessions.append(ojuz_session)
+        self.scheduler.add_session(ojuz_session)
+        self.read_pool.add_session(ojuz_session)
+        self._account_ready.set()
+
+    async def _save_session(self, ojuz_session):
+        try:
+            await self.session_store.save(ojuz_session.username, ojuz_session.session.cookie_jar)
+        except Exception as e:
+            logger.warning(f"Could not save session of {ojuz_session.username}: {e!r}")
 
     async def close_sessions(self):
-        await asyncio.gather(*[session.close_session() for session in self.logged_sessions])
+        for task in self.login_tasks:
+            task.cancel()
+        await asyncio.gather(*self.login_tasks, return_exceptions=True)
+        self.login_tasks = []
+        # cookies might have been refreshed since login, next start continues with them
+        await asyncio.gather(*[self._save_session(session) for session in self.logged_sessions])
+        await self.verdict_tracker.close()
+        await self.problem_catalog.close()
+        # all sessions, not only logged ones, share the connector
+        await asyncio.gather(*[session.close_session()
+                               for session in list(self.username_to_session.values()) + self.anonymous_sessions])
         self.username_to_session = {}
+        self.anonymous_sessions = []
         self.solution_number = 0
-        logger.info(f"Ojuzmanager closing all sessions")
+        self.parse_executor.shutdown()
+        await self.connection_pool.close()
+        logger.info("Ojuzmanager closing all sessions")
     
-    async def submit_solution(self, problem_url, raw_code):
-        active_sessions = len(self.logged_sessions)
-        lru_session = self.logged_sessions[self.solution_number % active_sessions]
-        self.solution_number += 1 # concurrency-safe to write this before following line
-        logger.info(f"Ojuz manager submitted {self.solution_number}th solution with session={lru_session}")
-        return await lru_session.submit_solution(problem_url, raw_code)
+    async def submit_solution(self, problem_url, raw_code, dedup=True, digest=None):
+        """Submits on the account with the earliest free slot, moving to another
+        account if oj.uz blocks it.
+
+        Problems that are known not to exist are rejected without spending an account's rate budget.
+        The same code submitted to the same problem within config['dedup']['window'] seconds
+        gets the url of the first submission instead of a new one.
+
+        dedup (bool): False always makes a new submission, e.g. when each submission must count on its own
+        digest (string): SourceStore key of raw_code if the caller already stored it, e.g. a queued job
+
+        return (string): the url that contains submission information, None if it failed
+        """
+        await self.validate_problem_url(problem_url)
+        problem_id = problem_id_from_url(problem_url, OjuzSession.base_url)
+        problem_url = f"{OjuzSession.base_url}/problem/view/{problem_id}" # e.g. http:// or www. urls are accepted too
+        if not dedup:
+            return await self._submit_and_store(problem_id, problem_url, raw_code, None, digest)
+        key = submission_key(problem_id, OjuzSession.language, raw_code)
+        submission_url = await self.submission_dedup.find(key)
+        if submission_url is not None:
+            logger.info("Ojuz manager reusing %s for an identical submission to %s", submission_url, problem_id)
+            return submission_url
+        return await self.submit_flight.do(key, self._submit_and_store, problem_id, problem_url, raw_code, key, digest)
+
+    async def find_duplicate_submission(self, problem_url, raw_code):
+        """Looks up a submission of the same code to the same problem within the dedup window
+
+        return (dict or None): {'submission_url', 'summary'}, summary is None if it could not be fetched
+        """
+        problem_id = problem_id_from_url(problem_url, OjuzSession.base_url)
+        if problem_id is None:
+            return None
+        submission_url = await self.submission_dedup.find(submission_key(problem_id, OjuzSession.language, raw_code))
+        if submission_url is None:
+            return None
+        try:
+            summary = await self.get_submission_summary(submission_url.rstrip('/').split('/')[-1])
+        except Exception as e:
+            logger.warning(f"Could not get the summary of {submission_url}: {e!r}")
+            summary = None
+        return {'submission_url': submission_url, 'summary': summary}
+
+    async def _submit_and_store(self, problem_id, problem_url, raw_code, key, digest=None):
+        if digest is None:
+            try:
+                digest = await self.source_store.put(raw_code)
+            except Exception as e:
+                # the submission does not depend on it
+                logger.warning(f"Could not store the source of a submission to {problem_id}: {e!r}")
+        submission_url = await self._submit(problem_url, raw_code)
+        if submission_url is not None and key is not None:
+            await self.submission_dedup.record(key, submission_url, problem_id, digest)
+        return submission_url
+
+    async def _submit(self, problem_url, raw_code):
+        self.solution_number += 1
+        for _ in range(config['max_submit_attempts']):
+            account = await self.scheduler.acquire()
+            outcome = {} # stays empty when cancelled, which says nothing about the account
+            try:
+                submission_url = await account.session.submit_solution(problem_url, raw_code, retry_on_block=False)
+            except OjuzSubmissionBlocked:
+                outcome = {'blocked': True}
+                continue
+            except CircuitOpenError as e:
+                logger.warning(f"Ojuz manager skipping account={account.username}: {e}")
+                outcome = {'failed': True}
+                continue
+            except Exception:
+                outcome = {'failed': True}
+                raise
+            else:
+                outcome = {'failed': submission_url is None}
+            finally:
+                # released on every path, a leaked slot would make the account unschedulable
+                await self.scheduler.release(account, **outcome)
+            logger.info("Ojuz manager submitted %dth solution with account=%s", self.solution_number, account.username)
+            return submission_url
+
+        logger.warning(f"Ojuz manager gave up on {problem_url} after {config['max_submit_attempts']} attempts")
+        return None
     
+    async def submit_many(self, solutions):
+        """Submits a batch of solutions spread over all accounts, see submit_solution.
+        Csrf tokens of every account are fetched up front, so dispatched submissions only POST.
+
+        solutions (list): (problem_url, raw_code) pairs
+
+        yields (dict): {'index', 'problem_url', 'submission_url', 'error'} as soon as each submission lands,
+        in completion order, 'index' is the position in solutions
+        """
+        async def warm_csrf(session):
+            try:
+                await session.get_cached_csrf_token()
+            except Exception as e:
+                logger.warning(f"Could not prefetch csrf token of {session.username}: {e!r}")
+
+        async def submit(index, problem_url, raw_code):
+            result = {'index': index, 'problem_url': problem_url, 'submission_url': None, 'error': None}
+            try:
+                result['submission_url'] = await self.submit_solution(problem_url, raw_code)
+                if result['submission_url'] is None:
+                    result['error'] = "oj.uz did not accept the submission"
+            except Exception as e:
+                result['error'] = repr(e)
+            return result
+
+        warm_up = [asyncio.create_task(warm_csrf(session)) for session in list(self.logged_sessions)]
+        # the scheduler rate limits the submissions themselves, all of them can wait for a slot at once
+        tasks = [asyncio.create_task(submit(index, problem_url, raw_code))
+                 for index, (problem_url, raw_code) in enumerate(solutions)]
+        logger.info("Ojuz manager submitting a batch of %d solutions", len(tasks))
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks + warm_up:
+                task.cancel()
+
+    async def _fetch_problem_page(self, problem_id, etag, last_modified):
+        return await self.read_pool.call('get_problem_page', problem_id, etag, last_modified)
+
+    async def get_problem(self, problem):
+        """Problem metadata from the catalog, see ProblemCatalog
+
+        problem (string): problem url or id
+
+        return (dict or None): None if problem is not a problem url or id
+        """
+        return await self.problem_catalog.get(problem)
+
+    async def validate_problem_url(self, problem_url):
+        """Raises OjuzProblemNotFound if problem_url is not an oj.uz problem url or the problem does not exist.
+        If oj.uz can not be reached to check, the url is given the benefit of the doubt.
+        """
+        if problem_id_from_url(problem_url, OjuzSession.base_url) is None:
+            raise OjuzProblemNotFound(f"{problem_url} is not an oj.uz problem url")
+        if await self.problem_catalog.exists(problem_url) is False:
+            raise OjuzProblemNotFound(f"There is no problem at {problem_url}")
+
     async def get_submission_summary(self, submission_id):
-        return await self.logged_sessions[0].get_submission_summary(submission_id)
+        """Concurrent calls for the same submission share one upstream request, see SingleFlight,
+        which runs on the least loaded session of the read pool"""
+        submission_id = str(submission_id)
+        return await self.summary_flight.do(submission_id, self.read_pool.call, 'get_submission_summary', submission_id)
 
     async def get_submission_details_table(self, submission_id):
-        return await self.logged_sessions[0].get_submission_details_table(submission_id)
\ No newline at end of file
+        submission_id = str(submission_id)
+        return await self.details_table_flight.do(submission_id,
+            self.read_pool.call, 'get_submission_details_table', submission_id)
+
+    async def get_submission_details(self, submission_id):
+        """Parsed submission details, final ones are served from the LRU/Mongo cache
+        so oj.uz is scraped only once per judged submission.
+        """
+        details = await self.details_cache.get(submission_id)
+        if details is None:
+            details = await self.details_flight.do(str(submission_id), self._fetch_submission_details, submission_id)
+        return details
+
+    async def _fetch_submission_details(self, submission_id):
+        details = await self.read_pool.call('get_submission_details', submission_id)
+        await self.details_cache.put(submission_id, details)
+        return details
+
+    def single_flight_stats(self):
+        """return (dict): dedup counters of the summary and details single-flight layers"""
+        return {flight.name: flight.stats() for flight in (self.summary_flight, self.details_table_flight, self.details_flight)}
+
+    def watch_submission(self, submission_id):
+        """Async iterator over summary updates of given submission until its final verdict.
+        All watchers of the same submission share one upstream poll, see VerdictTracker.
+        """
+        return self.verdict_tracker.watch(submission_id)
+
+    async def wait_submission_verdict(self, submission_id):
+        return await self.verdict_tracker.wait_final(submission_id)
+
+    def csrf_cache_stats(self):
+        """return (dict): csrf cache counters summed over all accounts and anonymous sessions"""
+        totals = {}
+        for session in list(self.username_to_session.values()) + self.anonymous_sessions:
+            for key, value in session.csrf_cache.stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
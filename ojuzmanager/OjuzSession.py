@@ -1,18 +1,61 @@
 import aiohttp
 import asyncio
 import logging
-from bs4 import BeautifulSoup
+import time
+from yarl import URL
 from ojuzmanager import debug
+from ojuzmanager import HtmlExtract
+from ojuzmanager.manager_config import config
+from ojuzmanager.ParseExecutor import get_parse_executor
+from ojuzmanager.CsrfTokenCache import CsrfTokenCache
+from ojuzmanager.RetryPolicy import RetryPolicy, CircuitBreaker, CircuitOpenError
+from ojuzmanager.Metrics import registry
+from ojuzmanager.Tracing import tracer
 
 logger = logging.getLogger("ojuzmanager.ojuzsession")
 logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
+class OjuzSubmissionBlocked(Exception):
+    """oj.uz refused the submission, usually because the account submits too often"""
+    pass
+
+class OjuzSessionExpired(Exception):
+    """oj.uz redirected to the login page, the session has to log in again"""
+    pass
+
+class OjuzLoginFailed(Exception):
+    pass
+
+class OjuzServerError(Exception):
+    """oj.uz answered with a 5xx status"""
+    pass
+
+# transient failures of a single request, worth retrying on the same account
+NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OjuzServerError)
+# shared by every session: if oj.uz as a whole is down, stop hammering it
+ojuz_breaker = CircuitBreaker('oj.uz', **config['circuit_breaker']['ojuz'])
+
+upstream_latency = registry.histogram('ojuz_upstream_latency_seconds',
+    "Latency of single oj.uz requests including the body, by operation (csrf, login, submit, summary, details...)",
+    ['operation'])
+upstream_errors = registry.counter('ojuz_upstream_errors_total',
+    "oj.uz requests that failed with a network error or a 5xx status", ['operation'])
+account_submits = registry.counter('ojuz_account_submits_total', "Submissions accepted by oj.uz per account", ['account'])
+account_blocks = registry.counter('ojuz_account_blocks_total', "Submissions blocked by oj.uz per account", ['account'])
+account_expired = registry.counter('ojuz_account_session_expired_total',
+    "Submissions that found the account logged out", ['account'])
+
 class OjuzSession:
     """An abstraction for submitting oj.uz solutions given user credentials.
     Async implementation, make sure to await when needed.
     """
 
     csrf_token_name = 'csrf_token'
+    csrf_token_ttl = 30 * 60 # seconds a cached csrf token is reused for
+    csrf_refresh_margin = 5 * 60 # refresh cached token in the background this long before it expires
+    csrf_fallback_path = "/problem/submit/APIO13_interference" # any page with a form
+    language = "9" # C++17, hardcoded for now
+    base_url = config['base_url']
     generic_headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
         'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:103.0) Gecko/20100101 Firefox/103.0',
@@ -20,18 +63,40 @@ class OjuzSession:
         'DNT': '1'
     }
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, parse_executor=None, connection_pool=None, anonymous=False):
+        """
+        parse_executor (ParseExecutor): where html is parsed, defaults to the shared one
+        connection_pool (ConnectionPool): connector shared with other accounts, None for a private one
+        anonymous (bool): a session that never logs in and only reads public pages, username is just a label
+        """
         self.username = username
         self.password = password        
+        self.anonymous = anonymous
         self.logged_in = False
+        self.session = None
+        self.connection_pool = connection_pool
+        self.parse_executor = parse_executor or get_parse_executor()
+        self.breaker = CircuitBreaker(f'account:{username}', **config['circuit_breaker']['account'])
+        self.network_policy = RetryPolicy(**config['retry']['network'])
+        self.submit_policy = RetryPolicy(**config['retry']['submit'])
+        self.csrf_cache = CsrfTokenCache(self.get_csfr_token,
+            ttl=OjuzSession.csrf_token_ttl, refresh_margin=OjuzSession.csrf_refresh_margin)
     
-    async def start_session(self):
-        self.session = aiohttp.ClientSession()
-        logger.info(f"Ojuz session started: {self.session}")
+    async def start_session(self, cookie_jar=None):
+        """
+        cookie_jar (aiohttp.CookieJar): cookies of a previous session to continue, see SessionStore
+        """
+        if self.connection_pool is not None:
+            self.session = self.connection_pool.client_session(cookie_jar)
+        else:
+            self.session = aiohttp.ClientSession(cookie_jar=cookie_jar)
+        logger.info("Ojuz session started: %s", self.session)
     
     async def close_session(self):
-        logger.info(f"Ojuz session closed: {self.session}")
-        await self.session.close()
+        logger.info("Ojuz session closed: %s csrf_cache=%s", self.session, self.csrf_cache.stats())
+        await self.csrf_cache.close()
+        if self.session is not None:
+            await self.session.close()
 
     async def get_csfr_token(self, url):
         """Returns the csfr token from given url
@@ -41,8 +106,21 @@ class OjuzSession:
         return (string): the csfr token to add to the payload
         """
 
-        soup = BeautifulSoup(await self.get_html(url), 'html.parser')
-        return soup.find('input', attrs={'name': OjuzSession.csrf_token_name})['value']
+        html = await self.get_html(url, operation='csrf')
+        return await self.parse_executor.run(HtmlExtract.extract_input_value, html, OjuzSession.csrf_token_name)
+
+    async def get_cached_csrf_token(self, url=None):
+        """Returns a csrf token for this session, only downloading url if no valid token is cached
+        
+        url (string): the url that should contain a form/csfr token, used on cache miss
+
+        return (string): the csfr token to add to the payload
+        """
+
+        if url is None:
+            # submit pages redirect anonymous visitors to the login page, which has a form too
+            url = f"{self.base_url}/login" if self.anonymous else self.base_url + OjuzSession.csrf_fallback_path
+        return await self.csrf_cache.get(url)
 
     async def login(self):
         """Tries to login to oj.uz using given credentials
@@ -51,22 +129,41 @@ class OjuzSession:
         return (bool): if the login succeeded
         """
 
-        login_url = "https://oj.uz/login?next=/?"
+        login_url = f"{self.base_url}/login?next=/?"
         login_data = {
             'next': ["/?", "/?"],
             'email': self.username,
             'password': self.password,
             'submit': 'Sign+in',
-            OjuzSession.csrf_token_name: await self.get_csfr_token(login_url) # will create self.session if needed
+            OjuzSession.csrf_token_name: await self.get_cached_csrf_token(login_url) # will create self.session if needed
         }
         login_headers = OjuzSession.generic_headers | {
             'Referer': login_url # referer for login is itself
         }
-        req = await self.session.post(login_url, data=login_data, headers=login_headers)
+        req = await self._request('login', 'POST', login_url, data=login_data, headers=login_headers)
         self.logged_in = 'Sign out' in await req.text()
-        logger.info(f"Ojuz session logging in attempt: {self.session} login={self.logged_in}")
+        # a new login gets a new server-side session, the old token is either rejected or stale now
+        self.csrf_cache.invalidate()
+        logger.info("Ojuz session logging in attempt: %s login=%s", self.session, self.logged_in)
         return self.logged_in
     
+    async def probe_login(self):
+        """Checks if the session cookies are still logged in with a single GET.
+        The probed page has a form, so its csrf token is cached for the next POST.
+
+        return (bool): if the session is logged in
+        """
+
+        req = await self._request('probe', 'GET', self.base_url + OjuzSession.csrf_fallback_path)
+        if str(req.url).startswith(f"{self.base_url}/login") or 'Sign out' not in await req.text():
+            self.logged_in = False
+            return False
+        self.logged_in = True
+        self.csrf_cache.set(await self.parse_executor.run(
+            HtmlExtract.extract_input_value, await req.text(), OjuzSession.csrf_token_name))
+        logger.info("Ojuz session %s restored from saved cookies", self.username)
+        return True
+
     async def attempt_multiple_logins(self, attempts):
         """Attempts multiple logins until login is successful or attemps are finished
         
@@ -75,52 +172,73 @@ class OjuzSession:
         return (bool): if the login succeeded
         """
 
-        while attempts > 0 and not await self.login():
-            attempts -= 1
+        async def login_or_raise():
+            if not await self.login():
+                raise OjuzLoginFailed(f"oj.uz did not accept the login of {self.username}")
+
+        policy = RetryPolicy(**(config['retry']['login'] | {'max_attempts': attempts}))
+        try:
+            await policy.call('login', login_or_raise, retry_on=(OjuzLoginFailed,) + NETWORK_ERRORS)
+        except (OjuzLoginFailed, CircuitOpenError) + NETWORK_ERRORS:
+            pass
         return self.logged_in
 
-    async def submit_solution(self, problem_url, raw_code, attempt_login=True):
+    async def submit_solution(self, problem_url, raw_code, attempt_login=True, retry_on_block=True):
         """Submits given code into given problem
+        Expired logins and blocked submissions are retried with backoff according to self.submit_policy.
         
         problem_url (string): url to the problem itself (not the submission page)
         raw_code (string): code contents
+        retry_on_block (bool): if False, raises OjuzSubmissionBlocked instead of waiting and retrying
 
-        return (URL): the url that contains submission information
+        return (string): the url that contains submission information, None if login failed
         """
 
-        if not self.logged_in and attempt_login and not await self.login():
+        retry_on = ((OjuzSessionExpired,) if attempt_login else ()) + ((OjuzSubmissionBlocked,) if retry_on_block else ())
+        try:
+            # the account breaker is checked by every request of _submit_once, checking it here as well
+            # would take its half-open trial and make the nested request fail fast
+            return await self.submit_policy.call('submit', self._submit_once, problem_url, raw_code, attempt_login,
+                                                 retry_on=retry_on)
+        except (OjuzSessionExpired, OjuzLoginFailed):
             return None
+
+    async def _submit_once(self, problem_url, raw_code, attempt_login):
+        if not self.logged_in and attempt_login and not await self.login():
+            raise OjuzLoginFailed(f"oj.uz did not accept the login of {self.username}")
         submit_url = problem_url.replace("problem/view", "problem/submit") # just "view"->"submit" is ambigious
         submit_data = {
             'codes': ["", ""], # not sure what this serves for
-            'language': "9", # C++17, hardcoded for now
+            'language': OjuzSession.language,
             'code_1': raw_code,
-            OjuzSession.csrf_token_name: await self.get_csfr_token(submit_url), # will create self.session if needed
+            OjuzSession.csrf_token_name: await self.get_cached_csrf_token(submit_url), # will create self.session if needed
         }
         submit_headers = OjuzSession.generic_headers | {
             'Referer': submit_url
         }
-        req = await self.session.post(submit_url, data=submit_data, headers=submit_headers)
-        submission_url = str(req.url)
+        # the redirect target tells the outcome, following it would download the whole submission page
+        req = await self._request('submit', 'POST', submit_url, data=submit_data, headers=submit_headers,
+                                  allow_redirects=False)
+        submission_url = str(req.url.join(URL(req.headers['Location']))) if 'Location' in req.headers else str(req.url)
 
-        if submission_url.startswith("https://oj.uz/login"): # log in issue, maybe session timed out?
+        if submission_url.startswith(f"{self.base_url}/login"): # log in issue, maybe session timed out?
+            account_expired.inc(account=self.username)
             self.logged_in = False
-            if attempt_login:
-                return await self.submit_solution(problem_url, raw_code, attempt_login)
-            else:
-                return None
+            self.csrf_cache.invalidate()
+            raise OjuzSessionExpired(f"session of {self.username} expired")
         
-        # TODO FIX this! this is a bad workaround!
-        if submission_url.startswith("https://oj.uz/problem/submit"): # oj.uz blocked the submission!
-            logger.warn("oj.uz blocked the submission!")
-            await asyncio.sleep(10) # wait 10 seconds
-            return await self.submit_solution(problem_url, raw_code, attempt_login) 
+        if submission_url.startswith(f"{self.base_url}/problem/submit"): # oj.uz blocked the submission!
+            logger.warning("oj.uz blocked the submission!")
+            account_blocks.inc(account=self.username)
+            self.csrf_cache.invalidate() # the rejection might as well be caused by a stale token
+            raise OjuzSubmissionBlocked(f"oj.uz blocked the submission of {self.username}")
 
-        logger.info(f"Ojuz session {self.session} submitted solution URL={req.url}")
+        account_submits.inc(account=self.username)
+        logger.info("Ojuz session %s submitted solution URL=%s", self.session, submission_url)
         return submission_url
 
 
-    async def get_submission_summary(self, submission_id):
+    async def get_submission_summary(self, submission_id, retry_on_reject=True):
         """Gets submission summary given submission_id
         
         submission_id (string): id of the submission
@@ -130,36 +248,111 @@ class OjuzSession:
         'score', 'text'.
         """
 
-        if not self.session or self.session.closed:
-            await self.start_session()
-        
-        summary_url = "https://oj.uz/submission/summary/1"
-        # this endpoint requires a CSRF token, so we get a random one
+        summary_url = f"{self.base_url}/submission/summary/1"
+        # this endpoint requires a CSRF token, any valid token of this session works
         summary_data = {
             'submission_id': submission_id,
-            OjuzSession.csrf_token_name: await self.get_csfr_token("https://oj.uz/problem/submit/APIO13_interference"),
+            OjuzSession.csrf_token_name: await self.get_cached_csrf_token(),
         }
         summary_header = OjuzSession.generic_headers | {
-            'Referer': f'https://oj.uz/submission/{submission_id}'
+            'Referer': f'{self.base_url}/submission/{submission_id}'
         }
         
-        req = await self.session.post(summary_url, data=summary_data, headers=summary_header)
+        req = await self._request('summary', 'POST', summary_url, data=summary_data, headers=summary_header)
+        if req.status != 200 or req.content_type != 'application/json': # token got rejected
+            self.csrf_cache.invalidate()
+            if retry_on_reject:
+                return await self.get_submission_summary(submission_id, retry_on_reject=False)
+            req.raise_for_status()
         return await req.json()
     
     async def get_submission_details_table(self, submission_id):
-        submission_url = f'https://oj.uz/submission/{submission_id}'
-        soup = BeautifulSoup(await self.get_html(submission_url), 'html.parser')
-        return str(soup.find(id="submission_details"))
+        submission_url = f'{self.base_url}/submission/{submission_id}'
+        html = await self.get_html(submission_url, operation='details')
+        return str(await self.parse_executor.run(HtmlExtract.extract_element_by_id, html, "submission_details"))
+
+    async def get_submission_details(self, submission_id):
+        """Gets the parsed submission details table given submission_id
+        
+        submission_id (string): id of the submission
+
+        return (dict): see HtmlExtract.parse_submission_details
+        """
+
+        submission_url = f'{self.base_url}/submission/{submission_id}'
+        html = await self.get_html(submission_url, operation='details')
+        return await self.parse_executor.run(HtmlExtract.parse_submission_details, html)
+
+    async def get_problem_page(self, problem_id, etag=None, last_modified=None):
+        """Conditionally GETs the page of a problem
 
-    async def get_html(self, url):
+        problem_id (string): e.g. 'IOI18_combo'
+        etag, last_modified (string): validators of the cached copy, sent as If-None-Match/If-Modified-Since
+
+        return (dict): 'status' (304 if the cached copy is still valid), 'metadata' (see
+        HtmlExtract.parse_problem_page, None unless the status is 200), 'location' of a redirect,
+        'etag' and 'last_modified'
+        """
+
+        headers = dict(OjuzSession.generic_headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        # unknown problems redirect to the problem list, following it would only cost a download
+        req = await self._request('problem', 'GET', f'{self.base_url}/problem/view/{problem_id}',
+                                  headers=headers, allow_redirects=False)
+        if 300 <= req.status < 400 and req.headers.get('Location', '').split('?')[0].endswith('/login'):
+            self.logged_in = False
+            raise OjuzSessionExpired(f"session of {self.username} expired")
+        metadata = None
+        if req.status == 200:
+            metadata = await self.parse_executor.run(HtmlExtract.parse_problem_page, await req.text())
+        return {
+            'status': req.status,
+            'metadata': metadata,
+            'location': req.headers.get('Location'),
+            'etag': req.headers.get('ETag', etag),
+            'last_modified': req.headers.get('Last-Modified', last_modified),
+        }
+
+    async def get_html(self, url, operation='html'):
         """GETs HTML content of given url with the current session
         
         url (string): url to get
+        operation (string): name of the request in retry metrics
 
         return (string): html content of url
         """
 
+        req = await self._request(operation, 'GET', url)
+        return await req.text()
+
+    async def _request(self, operation, method, url, **kwargs):
+        """Makes a single HTTP request, retrying network errors and 5xx answers
+        according to self.network_policy, guarded by this account's and oj.uz's circuit breakers.
+        The body is read before returning, so req.text()/req.json() do not touch the network.
+        """
+
         if not self.session or self.session.closed:
             await self.start_session()
-        req = await self.session.get(url)
-        return await req.text()
\ No newline at end of file
+
+        async def request_once():
+            with tracer.span(f'ojuz {operation}', method=method, url=url, account=self.username) as span:
+                started = time.perf_counter()
+                try:
+                    req = await self.session.request(method, url, **kwargs)
+                    await req.read()
+                except NETWORK_ERRORS:
+                    upstream_errors.inc(operation=operation)
+                    raise
+                finally:
+                    upstream_latency.observe(time.perf_counter() - started, operation=operation)
+                span.set('status', req.status)
+                if req.status >= 500:
+                    upstream_errors.inc(operation=operation)
+                    raise OjuzServerError(f"{method} {url} answered {req.status}")
+                return req
+
+        return await self.network_policy.call(operation, request_once, retry_on=NETWORK_ERRORS,
+                                              breakers=[ojuz_breaker, self.breaker])
\ No newline at end of file
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from ojuzmanager import debug
+from ojuzmanager.manager_config import config
+from ojuzmanager.Metrics import registry
+from ojuzmanager.Tracing import tracer
+
+logger = logging.getLogger("ojuzmanager.parseexecutor")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+parse_time = registry.histogram('ojuz_parse_seconds', "Time spent parsing html in the parse executor",
+                                ['function'], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+parse_wait_time = registry.histogram('ojuz_parse_wait_seconds', "Time parse jobs waited for a free worker",
+                                     buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+
+
+def _timed_call(func, args):
+    # runs inside the worker, so only the parsing itself is measured
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class ParseExecutor:
+    """
+    Runs html parsing off the event loop in a thread or process pool.
+    Parse functions must be module level (picklable) and return plain data
+    (strings, dicts, lists), never soup objects.
+    """
+
+    def __init__(self, kind='thread', max_workers=4) -> None:
+        """
+        kind (string): 'thread' or 'process'
+        max_workers (int): size of the pool
+        """
+
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown parse executor kind {kind}, expected 'thread' or 'process'")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Executor | None = None
+
+        self.in_flight: int = 0
+        self.max_queue_depth: int = 0
+        self.parses: int = 0
+        self.parse_seconds: float = 0.0
+        self.max_parse_seconds: float = 0.0
+        self.wait_seconds: float = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ojuz-parse")
+        return self._executor
+
+    @property
+    def queue_depth(self):
+        """return (int): number of parse jobs waiting for a free worker"""
+
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, func, *args):
+        """Runs func(*args) in the pool and returns its result
+
+        func (function): module level parse function
+        args: its arguments, usually the html string first
+        """
+
+        name = getattr(func, '__name__', str(func))
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        submitted = time.perf_counter()
+        with tracer.span('parse', function=name):
+            try:
+                result, parse_seconds = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, _timed_call, func, args)
+            finally:
+                self.in_flight -= 1
+
+        wait_seconds = max(0.0, time.perf_counter() - submitted - parse_seconds)
+        self.parses += 1
+        self.parse_seconds += parse_seconds
+        self.max_parse_seconds = max(self.max_parse_seconds, parse_seconds)
+        self.wait_seconds += wait_seconds
+        parse_time.observe(parse_seconds, function=name)
+        parse_wait_time.observe(wait_seconds)
+        if debug:
+            logger.debug("Parsed %s in %.2fms", name, parse_seconds * 1000)
+        return result
+
+    def stats(self):
+        """return (dict): queue depth and parse time counters"""
+
+        return {
+            'kind': self.kind,
+            'max_workers': self.max_workers,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'parses': self.parses,
+            'avg_parse_ms': 1000 * self.parse_seconds / self.parses if self.parses else 0.0,
+            'max_parse_ms': 1000 * self.max_parse_seconds,
+            'avg_wait_ms': 1000 * self.wait_seconds / self.parses if self.parses else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_default_executor: ParseExecutor | None = None
+
+registry.gauge('ojuz_parse_queue_depth', "Parse jobs waiting for a free worker",
+               function=lambda: _default_executor.queue_depth if _default_executor is not None else 0)
+
+
+def get_parse_executor() -> ParseExecutor:
+    """return (ParseExecutor): the executor shared by all OjuzSessions, created from manager_config"""
+
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ParseExecutor(**config['parse_executor'])
+    return _default_executor
+
+
+def configure_parse_executor(kind='thread', max_workers=4) -> ParseExecutor:
+    """Replaces the shared executor, call before any OjuzSession starts scraping"""
+
+    global _default_executor
+    if _default_executor is not None:
+        _default_executor.shutdown()
+    _default_executor = ParseExecutor(kind, max_workers)
+    return _default_executor
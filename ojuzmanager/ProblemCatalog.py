@@ -0,0 +1,199 @@
+from __future__ import annotations
+import asyncio
+import functools
+import logging
+import re
+import time
+from urllib.parse import urlsplit
+from ojuzmanager import debug
+from ojuzmanager.LruCache import LruCache
+from ojuzmanager.Tracing import untraced
+
+logger = logging.getLogger("ojuzmanager.problemcatalog")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class ProblemCatalogException(Exception):
+    pass
+
+_PROBLEM_URL_RE = re.compile(r'/problem/(?:view|submit)/([A-Za-z0-9_\-]+)/?$')
+_PROBLEM_ID_RE = re.compile(r'[A-Za-z0-9_\-]+')
+
+
+def _site(url):
+    """return (tuple): host without 'www.' and port of url, the scheme is optional"""
+
+    parsed = urlsplit(url if '//' in url else '//' + url)
+    try:
+        port = parsed.port
+    except ValueError:
+        port = -1
+    return (parsed.hostname or '').removeprefix('www.'), port
+
+
+def problem_id_from_url(problem_url, base_url=None):
+    """return (string or None): id of the problem of an oj.uz problem (or submit page) url, None if the url is not one
+
+    base_url (string): if given, the url must point to the same site: http or https, with or without
+    'www.' or the scheme, e.g. oj.uz/problem/view/IOI18_combo is a url of https://oj.uz
+    """
+
+    problem_url = (problem_url or '').strip()
+    if base_url is not None and _site(problem_url) != _site(base_url):
+        return None
+    match = _PROBLEM_URL_RE.search(problem_url.split('?', 1)[0])
+    return match.group(1) if match else None
+
+
+class ProblemCatalog:
+    """
+    Cache of oj.uz problem metadata (title, limits, subtasks, existence):
+    an in-process LRU in front of a Mongo collection in front of the problem pages.
+    Entries older than `ttl` are still served but revalidated in the background with
+    a conditional GET, which costs oj.uz a 304 instead of a page when nothing changed.
+    Problems that do not exist are remembered for `missing_ttl` seconds. Only a 404 or a redirect
+    away from the problem means it does not exist: a page that can not be parsed (e.g. oj.uz changed
+    its layout) still counts as an existing problem, without metadata, and is also retried after
+    `missing_ttl` seconds.
+
+    Entries: {_id: problem_id, exists, title, time_limit_ms, memory_limit_kb, subtasks,
+    etag, last_modified, fetched_at}
+    """
+
+    def __init__(self, fetch_page, collection=None, max_size=2048, ttl=6 * 3600, missing_ttl=600) -> None:
+        """
+        fetch_page (coroutine function): called with (problem_id, etag, last_modified), see OjuzSession.get_problem_page
+        collection (AsyncIOMotorCollection): where entries are persisted, None keeps them in memory only
+        max_size (int): number of problems kept in the LRU
+        ttl (float): seconds after which an existing problem is revalidated
+        missing_ttl (float): seconds after which a missing problem is looked up again
+        """
+
+        self.fetch_page = fetch_page
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.lru: LruCache = LruCache(max_size)
+        self._fetches: dict[str, asyncio.Task] = {}
+
+        self.lru_hits: int = 0
+        self.mongo_hits: int = 0
+        self.fetches: int = 0
+        self.not_modified: int = 0
+        self.refreshes: int = 0
+
+    def _stale(self, entry):
+        ttl = self.ttl if entry['exists'] and entry['title'] is not None else self.missing_ttl
+        return time.time() - entry['fetched_at'] > ttl
+
+    async def get(self, problem):
+        """Returns the metadata of a problem, downloading its page only on a cold miss
+
+        problem (string): problem url or id
+
+        return (dict or None): the catalog entry, None if problem is not a problem url
+        """
+
+        problem_id = problem if _PROBLEM_ID_RE.fullmatch(problem or '') else problem_id_from_url(problem)
+        if problem_id is None:
+            return None
+
+        entry = self.lru.get(problem_id)
+        if entry is not None:
+            self.lru_hits += 1
+        elif self.collection is not None:
+            entry = await self.collection.find_one({'_id': problem_id})
+            if entry is not None:
+                self.mongo_hits += 1
+                self.lru.put(entry['_id'], entry)
+
+        if entry is None:
+            return await self._start_fetch(problem_id, None)
+        if self._stale(entry):
+            # stale while revalidate, the caller does not wait for oj.uz
+            self.refreshes += 1
+            self._start_fetch(problem_id, entry)
+        return entry
+
+    async def exists(self, problem):
+        """return (bool or None): if the problem exists on oj.uz, None if it could not be checked"""
+
+        try:
+            entry = await self.get(problem)
+        except Exception as e:
+            logger.warning(f"Could not look up problem {problem}: {e!r}")
+            return None
+        return entry is not None and entry['exists']
+
+    def _start_fetch(self, problem_id, cached) -> asyncio.Task:
+        # concurrent lookups of the same problem share one download
+        task = self._fetches.get(problem_id)
+        if task is None or task.done():
+            task = self._fetches[problem_id] = asyncio.create_task(untraced(self._fetch(problem_id, cached)))
+            task.add_done_callback(functools.partial(self._forget_fetch, problem_id))
+            if cached is not None:
+                # background refreshes report their own failures
+                task.add_done_callback(self._log_refresh_failure)
+        return task
+
+    def _forget_fetch(self, problem_id, task):
+        if self._fetches.get(problem_id) is task:
+            del self._fetches[problem_id]
+
+    @staticmethod
+    def _log_refresh_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Problem refresh failed: {task.exception()!r}")
+
+    async def _fetch(self, problem_id, cached):
+        self.fetches += 1
+        page = await self.fetch_page(problem_id,
+                                     cached.get('etag') if cached else None,
+                                     cached.get('last_modified') if cached else None)
+        entry = {
+            '_id': problem_id,
+            'etag': page['etag'],
+            'last_modified': page['last_modified'],
+            'fetched_at': time.time(),
+        }
+        status = page['status']
+        unknown = {'title': None, 'time_limit_ms': None, 'memory_limit_kb': None, 'subtasks': []}
+        redirected_to = problem_id_from_url(page.get('location') or '') if 300 <= status < 400 else None
+        if status == 304 and cached is not None:
+            self.not_modified += 1
+            entry = cached | entry
+        elif status == 200 and page['metadata'] is not None:
+            entry |= {'exists': True} | page['metadata']
+        elif status == 200 or redirected_to == problem_id:
+            # validation fails open, a page the parser does not understand must not reject the problem
+            logger.warning(f"Problem {problem_id} page could not be parsed (status {status}), assuming it exists")
+            entry |= {'exists': True} | unknown
+        elif status == 404 or 300 <= status < 400: # missing, or redirected away from the problem
+            entry |= {'exists': False} | unknown
+        else:
+            raise ProblemCatalogException(f"oj.uz answered {status} for problem {problem_id}")
+
+        self.lru.put(entry['_id'], entry)
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one({'_id': problem_id}, entry, upsert=True)
+            except Exception as e:
+                logger.warning(f"Could not persist problem {problem_id}: {e!r}")
+        logger.debug("Problem %s fetched: status=%s exists=%s", problem_id, page['status'], entry['exists'])
+        return entry
+
+    async def close(self):
+        for task in self._fetches.values():
+            task.cancel()
+        await asyncio.gather(*self._fetches.values(), return_exceptions=True)
+        self._fetches = {}
+
+    def stats(self):
+        return {
+            'lru_size': len(self.lru),
+            'lru_hits': self.lru_hits,
+            'mongo_hits': self.mongo_hits,
+            'fetches': self.fetches,
+            'not_modified': self.not_modified,
+            'refreshes': self.refreshes,
+        }
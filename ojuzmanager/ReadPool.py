@@ -0,0 +1,177 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import aiohttp
+from ojuzmanager import debug
+from ojuzmanager.Metrics import registry
+from ojuzmanager.OjuzSession import NETWORK_ERRORS, OjuzSessionExpired
+from ojuzmanager.RetryPolicy import CircuitOpenError
+
+logger = logging.getLogger("ojuzmanager.readpool")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+# failures that say something about the session rather than the request, the read moves to another session
+FAILOVER_ERRORS = NETWORK_ERRORS + (CircuitOpenError, OjuzSessionExpired)
+
+class ReadPoolException(Exception):
+    pass
+
+class ReadSessionState:
+    """Load and health of one session of the read pool"""
+
+    def __init__(self, session) -> None:
+        self.session = session
+        self.in_flight: int = 0
+        self.last_used: float = 0.0
+        self.consecutive_failures: int = 0
+        self.cooldown_until: float = 0.0
+        self.requests: int = 0
+        self.failures: int = 0
+
+    @property
+    def username(self):
+        return self.session.username
+
+    def __repr__(self) -> str:
+        return f"<ReadSessionState {self.username} in_flight={self.in_flight}>"
+
+
+class ReadPool:
+    """
+    Spreads read-only requests (summaries, submission and problem pages) over every session
+    that can serve them: logged in accounts and anonymous sessions alike.
+    A read goes to the healthy session with the fewest requests in flight, each session has at
+    most `max_in_flight` of them. A session failing with a network error, 5xx, open circuit or
+    expired login is cooled down and the read is retried on another session.
+    """
+
+    def __init__(self, max_in_flight=4, failure_cooldown=10, max_failure_cooldown=120, max_attempts=3) -> None:
+        """
+        max_in_flight (int): concurrent reads per session
+        failure_cooldown (float): seconds a failing session is skipped, doubled for every consecutive failure
+        max_failure_cooldown (float): upper bound of the cooldown
+        max_attempts (int): sessions a read is tried on before its error is raised
+        """
+
+        self.max_in_flight = max_in_flight
+        self.failure_cooldown = failure_cooldown
+        self.max_failure_cooldown = max_failure_cooldown
+        self.max_attempts = max_attempts
+        self.states: dict[str, ReadSessionState] = {}
+        self._changed: asyncio.Condition | None = None
+        registry.gauge('ojuz_read_pool_in_flight', "Reads in flight per session of the read pool", ['session'],
+                       function=lambda: {(username,): state.in_flight for username, state in self.states.items()})
+        registry.counter('ojuz_read_pool_requests_total', "Reads per session of the read pool by outcome",
+                         ['session', 'outcome'],
+                         function=lambda: {key: value for username, state in self.states.items()
+                                           for key, value in (((username, 'ok'), state.requests - state.failures),
+                                                              ((username, 'failed'), state.failures))})
+
+    @property
+    def changed(self) -> asyncio.Condition:
+        # created lazily so the pool can be built outside of a running loop
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def add_session(self, session):
+        self.states.setdefault(session.username, ReadSessionState(session))
+
+    def remove_session(self, session):
+        self.states.pop(session.username, None)
+
+    def __len__(self):
+        return len(self.states)
+
+    def _pick(self, excluded, now):
+        """return (ReadSessionState or None, bool): the least loaded free session and if any candidate is left at all"""
+
+        candidates = [state for state in self.states.values() if state.username not in excluded]
+        if not candidates:
+            return None, False
+        healthy = [state for state in candidates if state.cooldown_until <= now]
+        # when everything is cooling down, trying the one that failed the longest ago beats failing outright
+        pool = healthy or [min(candidates, key=lambda state: state.cooldown_until)]
+        free = [state for state in pool if state.in_flight < self.max_in_flight]
+        if not free:
+            return None, True
+        return min(free, key=lambda state: (state.in_flight, state.last_used)), True
+
+    async def _acquire(self, excluded) -> ReadSessionState | None:
+        async with self.changed:
+            while True:
+                now = time.monotonic()
+                state, any_left = self._pick(excluded, now)
+                if state is not None:
+                    state.in_flight += 1
+                    state.last_used = now
+                    state.requests += 1
+                    return state
+                if not any_left:
+                    return None
+                await self.changed.wait()
+
+    async def _release(self, state, failed=False):
+        state.in_flight -= 1
+        if failed:
+            state.failures += 1
+            state.consecutive_failures += 1
+            cooldown = min(self.max_failure_cooldown, self.failure_cooldown * 2 ** (state.consecutive_failures - 1))
+            state.cooldown_until = time.monotonic() + cooldown
+            logger.warning(f"Read session {state.username} failed, skipping it for {cooldown}s")
+        else:
+            state.consecutive_failures = 0
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def call(self, method_name, *args):
+        """Runs session.<method_name>(*args) on a session of the pool, failing over to others
+
+        method_name (string): OjuzSession method, e.g. 'get_submission_summary'
+
+        return: what the method returns
+        """
+
+        if not self.states:
+            raise ReadPoolException("The read pool has no sessions")
+        tried: set[str] = set()
+        last_error = None
+        for _ in range(self.max_attempts):
+            state = await self._acquire(tried)
+            if state is None:
+                break
+            tried.add(state.username)
+            try:
+                result = await getattr(state.session, method_name)(*args)
+            except aiohttp.ClientResponseError as e:
+                if e.status >= 500 or e.status in (400, 403):
+                    await self._release(state, failed=True)
+                    last_error = e
+                    continue
+                await self._release(state) # e.g. 404, the same on every session
+                raise
+            except FAILOVER_ERRORS as e:
+                await self._release(state, failed=True)
+                last_error = e
+                continue
+            except BaseException:
+                await self._release(state)
+                raise
+            await self._release(state)
+            return result
+
+        logger.warning(f"Read {method_name}{args} failed on sessions {sorted(tried)}: {last_error!r}")
+        if last_error is None:
+            raise ReadPoolException(f"No session could run {method_name}")
+        raise last_error
+
+    def stats(self):
+        return {
+            username: {
+                'in_flight': state.in_flight,
+                'requests': state.requests,
+                'failures': state.failures,
+                'cooling_down': state.cooldown_until > time.monotonic(),
+            } for username, state in self.states.items()
+        }
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from ojuzmanager import debug
+from ojuzmanager.Metrics import registry
+
+logger = logging.getLogger("ojuzmanager.retrypolicy")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+# counters keyed by (operation, event), event is one of 'calls', 'retries', 'giveups', 'rejected'
+retry_counters: Counter = Counter()
+# every breaker created, keyed by its name
+circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, the call was not even attempted"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling something that keeps failing.
+    After `failure_threshold` failures in a row the breaker opens and every call fails fast with
+    CircuitOpenError. After `reset_timeout` seconds one trial call is let through (half-open):
+    success closes the breaker, failure opens it again. Other calls are rejected while the trial
+    runs; a trial that ends without an outcome (e.g. cancelled) opens the breaker again and the
+    next call becomes the new trial.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self.trips: int = 0
+        circuit_breakers[name] = self
+
+    def allow(self):
+        """return (bool): if a call may be attempted now.
+        A call allowed while the breaker is half-open is its trial and must be ended with end_trial()
+        """
+
+        if self.state == CircuitBreaker.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = CircuitBreaker.HALF_OPEN
+            return True
+        return self.state == CircuitBreaker.CLOSED
+
+    def end_trial(self):
+        """Frees the half-open slot once the trial call is over, whatever its outcome"""
+
+        if self.state == CircuitBreaker.HALF_OPEN:
+            # neither a success nor a failure was recorded, keep opened_at so the next call may try again
+            self.state = CircuitBreaker.OPEN
+
+    def record_success(self):
+        self.failures = 0
+        self.state = CircuitBreaker.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CircuitBreaker.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit breaker {self.name} opened after {self.failures} failures")
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'trips': self.trips}
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter.
+    A call is attempted at most `max_attempts` times and no retry is started
+    if it would end after `deadline` seconds since the first attempt.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=10, multiplier=2, jitter=True, deadline=None) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delay(self, retry_number):
+        """return (float): seconds to wait before given retry, starting from 1"""
+
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (retry_number - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    async def call(self, operation, func, *args, retry_on=(Exception,), breakers=(), **kwargs):
+        """Calls `await func(*args, **kwargs)` retrying on given exceptions
+
+        operation (string): name used in the metrics, e.g. 'login'
+        retry_on (tuple): exception types that are worth retrying, others are raised immediately
+        breakers (list of CircuitBreaker): must all allow the call, retried failures are recorded on them.
+        A breaker must not guard both a call and calls nested in it, the inner check would see the outer trial.
+
+        return: whatever func returns, the last exception is raised when giving up
+        """
+
+        started = time.monotonic()
+        retry_counters[operation, 'calls'] += 1
+        attempt = 1
+        while True:
+            trials = self._admit(operation, breakers)
+            try:
+                result = await func(*args, **kwargs)
+            except retry_on as e:
+                error = e
+                for breaker in breakers:
+                    breaker.record_failure()
+                delay = self.delay(attempt)
+                out_of_time = self.deadline is not None and time.monotonic() - started + delay > self.deadline
+                if attempt >= self.max_attempts or out_of_time:
+                    retry_counters[operation, 'giveups'] += 1
+                    logger.warning(f"{operation} failed after {attempt} attempts: {e!r}")
+                    raise
+            else:
+                for breaker in breakers:
+                    breaker.record_success()
+                return result
+            finally:
+                for breaker in trials:
+                    breaker.end_trial()
+            retry_counters[operation, 'retries'] += 1
+            logger.debug("%s attempt %d failed (%r), retrying in %.2fs", operation, attempt, error, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _admit(operation, breakers):
+        """return (list of CircuitBreaker): the breakers for which this call is the half-open trial"""
+
+        trials = []
+        for breaker in breakers:
+            if not breaker.allow():
+                for trial in trials:
+                    trial.end_trial()
+                retry_counters[operation, 'rejected'] += 1
+                raise CircuitOpenError(f"{operation}: circuit {breaker.name} is open")
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                trials.append(breaker)
+        return trials
+
+
+registry.counter('ojuz_retry_events_total', "Calls, retries, give-ups and circuit rejections per operation",
+                 ['operation', 'event'], function=lambda: dict(retry_counters))
+registry.gauge('ojuz_circuit_open', "1 if the circuit breaker is open or half open", ['circuit'],
+               function=lambda: {(name,): int(breaker.state != CircuitBreaker.CLOSED)
+                                 for name, breaker in circuit_breakers.items()})
+
+
+def retry_metrics():
+    """return (dict): retry counters per operation and the state of every circuit breaker"""
+
+    operations: dict[str, dict[str, int]] = {}
+    for (operation, event), count in retry_counters.items():
+        operations.setdefault(operation, {})[event] = count
+    return {
+        'operations': operations,
+        'circuit_breakers': {name: breaker.stats() for name, breaker in circuit_breakers.items()},
+    }
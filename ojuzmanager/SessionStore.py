@@ -0,0 +1,95 @@
+"""
+Snapshots of account cookie jars, so a restart can reuse the oj.uz sessions
+of the previous run instead of logging every account in again.
+Cookies are stored as plain data (no pickles) either in a directory or in a Mongo collection.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+from http.cookies import SimpleCookie
+import aiohttp
+from yarl import URL
+from ojuzmanager import debug
+
+logger = logging.getLogger("ojuzmanager.sessionstore")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+MORSEL_ATTRIBUTES = ('domain', 'path', 'expires', 'max-age', 'secure', 'httponly')
+
+
+def dump_cookie_jar(cookie_jar):
+    """return (list): the cookies of given jar as a list of plain dicts"""
+
+    return [
+        {'name': morsel.key, 'value': morsel.value} | {attr: morsel[attr] for attr in MORSEL_ATTRIBUTES if morsel[attr]}
+        for morsel in cookie_jar
+    ]
+
+
+def load_cookie_jar(cookies):
+    """return (aiohttp.CookieJar): a jar filled with cookies returned by dump_cookie_jar"""
+
+    cookie_jar = aiohttp.CookieJar()
+    for cookie in cookies:
+        simple_cookie = SimpleCookie()
+        simple_cookie[cookie['name']] = cookie['value']
+        for attr in MORSEL_ATTRIBUTES:
+            if attr in cookie:
+                simple_cookie[cookie['name']][attr] = cookie[attr]
+        domain = (cookie.get('domain') or 'oj.uz').lstrip('.')
+        cookie_jar.update_cookies(simple_cookie, URL(f"https://{domain}/"))
+    return cookie_jar
+
+
+class FileSessionStore:
+    """Keeps one json file of cookies per account in given directory"""
+
+    def __init__(self, directory) -> None:
+        self.directory = directory
+
+    def _path(self, username):
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in username)
+        return os.path.join(self.directory, f"{safe_name}.json")
+
+    def _read(self, username):
+        try:
+            with open(self._path(username), "r", encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, username, cookies):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(username)
+        # these cookies are as good as the password, the file is private from its creation on
+        fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600) # a leftover .tmp keeps the mode it was created with
+        with open(fd, "w", encoding='utf-8') as f:
+            json.dump(cookies, f)
+        os.replace(path + ".tmp", path)
+
+    async def load(self, username):
+        """return (aiohttp.CookieJar or None): the saved jar of given account"""
+
+        cookies = await asyncio.to_thread(self._read, username)
+        return None if cookies is None else load_cookie_jar(cookies)
+
+    async def save(self, username, cookie_jar):
+        await asyncio.to_thread(self._write, username, dump_cookie_jar(cookie_jar))
+
+
+class MongoSessionStore:
+    """Keeps cookies of every account in a Mongo collection, one document per account"""
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    async def load(self, username):
+        document = await self.collection.find_one({'_id': username})
+        return None if document is None else load_cookie_jar(document['cookies'])
+
+    async def save(self, username, cookie_jar):
+        await self.collection.replace_one(
+            {'_id': username}, {'_id': username, 'cookies': dump_cookie_jar(cookie_jar)}, upsert=True)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from ojuzmanager import debug
+from ojuzmanager.LruCache import LruCache
+from ojuzmanager.Metrics import registry
+
+logger = logging.getLogger("ojuzmanager.singleflight")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+# every SingleFlight created, keyed by its name
+single_flights: dict[str, SingleFlight] = {}
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical upstream calls: the first caller of a key runs the call,
+    callers arriving while it is in flight await the same result instead of firing their own.
+    Results are then kept for `ttl` seconds (a micro-cache for spikes on data that is still
+    changing, e.g. a submission being judged), or `final_ttl` seconds once `is_final(result)`.
+    Failures are shared by the callers in flight but never cached.
+    Results are shared between callers, treat them as read-only.
+    """
+
+    def __init__(self, name, ttl=1.0, final_ttl=0.0, is_final=None, max_cached=4096) -> None:
+        """
+        name (string): label in stats and metrics, e.g. 'summary'
+        ttl (float): seconds a result is reused for, 0 to only share in-flight calls
+        final_ttl (float): seconds a result for which is_final(result) is True is reused for
+        is_final (function): tells if a result will not change anymore, None if no result is final
+        max_cached (int): cached results kept at most
+        """
+
+        self.name = name
+        self.ttl = ttl
+        self.final_ttl = final_ttl
+        self.is_final = is_final
+        self.max_cached = max_cached
+        self.in_flight: dict[object, asyncio.Task] = {}
+        self.cache: LruCache = LruCache(max_cached) # key -> (expires_at, result)
+
+        self.calls: int = 0
+        self.upstream_calls: int = 0
+        self.joined: int = 0
+        self.cache_hits: int = 0
+        single_flights[name] = self
+
+    async def do(self, key, func, *args):
+        """Returns func(*args), sharing the call with every concurrent caller of the same key
+
+        key: hashable identity of the call, e.g. the submission id
+        func (coroutine function): the upstream call
+        """
+
+        self.calls += 1
+        cached = self.cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+            del self.cache[key]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = self.in_flight[key] = asyncio.create_task(self._run(key, func, args))
+            # retrieved here too, in case every caller was cancelled before it failed
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            self.joined += 1
+        # a cancelled caller must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _run(self, key, func, args):
+        try:
+            result = await func(*args)
+        finally:
+            del self.in_flight[key]
+        ttl = self.final_ttl if self.is_final is not None and self.is_final(result) else self.ttl
+        if ttl > 0:
+            self.cache.put(key, (time.monotonic() + ttl, result))
+        return result
+
+    def forget(self, key):
+        """Drops the cached result of key, e.g. after it is known to be outdated"""
+
+        self.cache.pop(key, None)
+
+    def stats(self):
+        """return (dict): call counters, dedup_ratio is the share of calls that did not reach upstream"""
+
+        return {
+            'calls': self.calls,
+            'upstream_calls': self.upstream_calls,
+            'joined': self.joined,
+            'cache_hits': self.cache_hits,
+            'in_flight': len(self.in_flight),
+            'cached': len(self.cache),
+            'dedup_ratio': 1 - self.upstream_calls / self.calls if self.calls else 0.0,
+        }
+
+
+registry.counter('ojuz_single_flight_calls_total',
+                 "Calls through single-flight layers by outcome: upstream, joined (shared an in-flight call), cache_hit",
+                 ['name', 'outcome'],
+                 function=lambda: {(name, outcome): value for name, flight in single_flights.items()
+                                   for outcome, value in (('upstream', flight.upstream_calls),
+                                                          ('joined', flight.joined),
+                                                          ('cache_hit', flight.cache_hits))})
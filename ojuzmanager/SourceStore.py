@@ -0,0 +1,179 @@
+"""
+Content-addressed storage of submitted sources and detection of duplicate submissions.
+A source is stored once under the sha256 of its exact code, zlib compressed.
+A submission is identified by (problem, language, hash of the normalized code); the same
+key submitted again within the dedup window gets the submission that is already on oj.uz.
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from ojuzmanager import debug
+from ojuzmanager.LruCache import LruCache
+from ojuzmanager.Metrics import registry
+
+logger = logging.getLogger("ojuzmanager.sourcestore")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+
+def normalize_code(code):
+    """Normalizes what editors and browsers change without changing the program:
+    line endings, trailing whitespace and trailing empty lines"""
+
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n') + '\n'
+
+
+def source_hash(code):
+    """return (string): hex sha256 of the normalized code"""
+
+    return hashlib.sha256(normalize_code(code).encode()).hexdigest()
+
+
+def content_hash(code):
+    """return (string): hex sha256 of the exact code, its key in SourceStore"""
+
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def submission_key(problem_id, language, code):
+    """return (string): identity of a submission for deduplication"""
+
+    return hashlib.sha256(f"{problem_id}\0{language}\0{source_hash(code)}".encode()).hexdigest()
+
+
+class SourceStore:
+    """
+    Sources keyed by their content_hash, every distinct source is written once and read back byte for byte.
+    Without a collection sources are not kept at all, only hashed.
+
+    Documents: {_id: content_hash, code: zlib compressed utf-8, size, compressed_size, created_at}
+    """
+
+    def __init__(self, collection=None, compression_level=6, max_known=16384) -> None:
+        """
+        collection (AsyncIOMotorCollection): where sources are stored
+        compression_level (int): zlib level, 1 (fast) to 9 (small)
+        max_known (int): hashes remembered as stored, to skip writing them again
+        """
+
+        self.collection = collection
+        self.compression_level = compression_level
+        self.max_known = max_known
+        self.known: LruCache = LruCache(max_known)
+        self.writes: int = 0
+        self.skipped_writes: int = 0
+        self.bytes_in: int = 0
+        self.bytes_stored: int = 0
+        registry.counter('ojuz_source_store_bytes_total', "Bytes of new sources before and after compression", ['kind'],
+                         function=lambda: {('raw',): self.bytes_in, ('compressed',): self.bytes_stored})
+
+    async def put(self, code):
+        """Stores the source if it is not stored yet
+
+        return (string): its hash, the key for get()
+        """
+
+        digest = content_hash(code)
+        if self.collection is None:
+            return digest
+        if self.known.get(digest):
+            self.skipped_writes += 1
+            return digest
+        data = code.encode()
+        compressed = zlib.compress(data, self.compression_level)
+        await self.collection.update_one({'_id': digest}, {'$setOnInsert': {
+            'code': compressed,
+            'size': len(data),
+            'compressed_size': len(compressed),
+            'created_at': datetime.now(timezone.utc),
+        }}, upsert=True)
+        self.writes += 1
+        self.bytes_in += len(data)
+        self.bytes_stored += len(compressed)
+        self.known.put(digest, True)
+        return digest
+
+    async def get(self, digest):
+        """return (string or None): the source with given hash"""
+
+        if self.collection is None:
+            return None
+        document = await self.collection.find_one({'_id': digest}, {'code': 1})
+        if document is None:
+            return None
+        self.known.put(digest, True)
+        return zlib.decompress(document['code']).decode()
+
+    def stats(self):
+        return {
+            'writes': self.writes,
+            'skipped_writes': self.skipped_writes,
+            'compression_ratio': self.bytes_stored / self.bytes_in if self.bytes_in else 1.0,
+        }
+
+
+class SubmissionDedup:
+    """
+    Remembers which submission each submission key produced for `window` seconds:
+    an in-process LRU in front of a Mongo collection shared with other processes.
+
+    Documents: {_id: submission key, submission_url, problem_id, source_hash (its SourceStore key), submitted_at}
+    """
+
+    def __init__(self, collection=None, window=600, max_size=4096) -> None:
+        """
+        collection (AsyncIOMotorCollection): where submission keys are persisted, None keeps them in memory only
+        window (float): seconds a submission is reused for identical submissions, 0 disables deduplication
+        max_size (int): submission keys kept in the LRU
+        """
+
+        self.collection = collection
+        self.window = window
+        self.max_size = max_size
+        self.lru: LruCache = LruCache(max_size) # key -> (submitted_at epoch, submission_url)
+        self.duplicates: int = 0
+        registry.counter('ojuz_submissions_deduplicated_total',
+                         "Submissions answered with an identical recent submission instead of a new one",
+                         function=lambda: self.duplicates)
+
+    async def find(self, key):
+        """return (string or None): url of the submission made for key within the window"""
+
+        if self.window <= 0:
+            return None
+        now = time.time()
+        cached = self.lru.get(key)
+        if cached is not None and cached[0] >= now - self.window:
+            self.duplicates += 1
+            return cached[1]
+        if self.collection is not None:
+            since = datetime.now(timezone.utc) - timedelta(seconds=self.window)
+            document = await self.collection.find_one({'_id': key, 'submitted_at': {'$gte': since}},
+                                                      {'submission_url': 1, 'submitted_at': 1})
+            if document is not None:
+                submitted_at = document['submitted_at'].replace(tzinfo=timezone.utc).timestamp()
+                self.lru.put(key, (submitted_at, document['submission_url']))
+                self.duplicates += 1
+                return document['submission_url']
+        return None
+
+    async def record(self, key, submission_url, problem_id, digest):
+        if self.window <= 0:
+            return
+        submitted_at = datetime.now(timezone.utc)
+        self.lru.put(key, (submitted_at.timestamp(), submission_url))
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one({'_id': key}, {
+                    '_id': key,
+                    'submission_url': submission_url,
+                    'problem_id': problem_id,
+                    'source_hash': digest,
+                    'submitted_at': submitted_at,
+                }, upsert=True)
+            except Exception as e:
+                # only costs a resubmission of the same code later
+                logger.warning(f"Could not record submission {submission_url}: {e!r}")
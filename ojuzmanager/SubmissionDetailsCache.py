@@ -0,0 +1,73 @@
+from __future__ import annotations
+import logging
+from ojuzmanager import debug
+from ojuzmanager.LruCache import LruCache
+
+logger = logging.getLogger("ojuzmanager.submissiondetailscache")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class SubmissionDetailsCache:
+    """
+    Two level cache of parsed submission details: an in-process LRU in front of a Mongo collection.
+    Only final details are stored, they never change on oj.uz anymore,
+    so every submission is scraped at most once after it is judged.
+    """
+
+    def __init__(self, collection=None, max_size=1024) -> None:
+        """
+        collection (AsyncIOMotorCollection): where final details are persisted, None keeps them in memory only
+        max_size (int): number of submissions kept in the LRU
+        """
+
+        self.collection = collection
+        self.max_size = max_size
+        self.lru: LruCache = LruCache(max_size)
+        self.lru_hits: int = 0
+        self.mongo_hits: int = 0
+        self.misses: int = 0
+
+    async def get(self, submission_id):
+        """return (dict or None): cached final details of given submission"""
+
+        submission_id = str(submission_id)
+        details = self.lru.get(submission_id)
+        if details is not None:
+            self.lru_hits += 1
+            return details
+
+        if self.collection is not None:
+            try:
+                document = await self.collection.find_one({'_id': submission_id}, {'_id': 0, 'details': 1})
+            except Exception as e:
+                # same as a miss, the details are scraped from oj.uz instead
+                logger.warning(f"Could not read cached details of submission={submission_id}: {e!r}")
+                document = None
+            if document is not None:
+                self.mongo_hits += 1
+                self.lru.put(submission_id, document['details'])
+                return document['details']
+
+        self.misses += 1
+        return None
+
+    async def put(self, submission_id, details):
+        """Stores given details if they are final, non-final details are ignored"""
+
+        if not details or not details.get('final'):
+            return
+        submission_id = str(submission_id)
+        self.lru.put(submission_id, details)
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one({'_id': submission_id}, {'_id': submission_id, 'details': details}, upsert=True)
+            except Exception as e:
+                # the LRU still has it, persisting can be retried the next time it is scraped
+                logger.warning(f"Could not persist details of submission={submission_id}: {e!r}")
+
+    def stats(self):
+        return {
+            'lru_size': len(self.lru),
+            'lru_hits': self.lru_hits,
+            'mongo_hits': self.mongo_hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,152 @@
+"""
+Optional per-request trace spans. A span started inside another one (in the same task
+or in tasks created from it) becomes its child, so a server request is linked to the
+upstream oj.uz calls it causes. Disabled tracing returns a shared no-op span, which
+costs one attribute check per instrumented call.
+"""
+from __future__ import annotations
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from ojuzmanager import debug
+from ojuzmanager.manager_config import config
+
+logger = logging.getLogger("ojuzmanager.tracing")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+_current_span: ContextVar[Span | None] = ContextVar('ojuz_current_span', default=None)
+
+
+def _new_id():
+    return os.urandom(8).hex()
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'attributes',
+                 'start', 'duration', 'error', '_token')
+
+    def __init__(self, tracer, name, trace_id, parent_id, attributes) -> None:
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+        self.duration = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.time() - self.start
+        if exc is not None:
+            self.error = repr(exc)
+        _current_span.reset(self._token)
+        self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': None if self.duration is None else 1000 * self.duration,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+async def untraced(coroutine):
+    """Runs coroutine outside of any span. A task copies the span of the request creating it,
+    wrap the coroutine of tasks shared by many requests (pollers, joined downloads) with this.
+    """
+
+    _current_span.set(None)
+    return await coroutine
+
+
+class Tracer:
+    """Records spans of the last `max_traces` traces in memory"""
+
+    def __init__(self, enabled=False, max_traces=1000, max_spans_per_trace=200) -> None:
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.traces: OrderedDict[str, list[Span]] = OrderedDict()
+
+    def span(self, name, trace_id=None, **attributes):
+        """Starts a span, use as a context manager
+
+        name (string): what the span measures, e.g. 'ojuz submit'
+        trace_id (string): continue this trace instead of the current one, e.g. from a queued job
+        attributes: extra fields recorded with the span
+
+        return (Span): the span, or a no-op span when tracing is disabled
+        """
+
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if trace_id is None:
+            trace_id = parent.trace_id if parent is not None else _new_id()
+        parent_id = parent.span_id if parent is not None and parent.trace_id == trace_id else None
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def current_trace_id(self):
+        """return (string or None): trace of the running span"""
+
+        span = _current_span.get()
+        return span.trace_id if span is not None else None
+
+    def _finish(self, span):
+        spans = self.traces.get(span.trace_id)
+        if spans is None:
+            spans = self.traces[span.trace_id] = []
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+        if len(spans) < self.max_spans_per_trace:
+            spans.append(span)
+        logger.debug("Span %s of trace %s took %.1fms", span.name, span.trace_id, 1000 * span.duration)
+
+    def get_trace(self, trace_id):
+        """return (list or None): spans of the trace ordered by start time, as dicts"""
+
+        spans = self.traces.get(trace_id)
+        if spans is None:
+            return None
+        return [span.to_dict() for span in sorted(spans, key=lambda span: span.start)]
+
+    def recent_traces(self, count=50):
+        """return (list): ids of the most recently started traces"""
+
+        return list(self.traces.keys())[-count:][::-1]
+
+
+tracer = Tracer(**config['tracing'])
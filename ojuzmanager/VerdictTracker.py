@@ -0,0 +1,253 @@
+from __future__ import annotations
+import asyncio
+import inspect
+import logging
+import time
+from ojuzmanager import debug
+from ojuzmanager.HtmlExtract import PENDING_VERDICTS
+from ojuzmanager.Tracing import untraced
+
+logger = logging.getLogger("ojuzmanager.verdicttracker")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+
+def is_final_summary(summary):
+    """Checks if given submission summary contains the final verdict
+
+    summary (dict): summary as returned by OjuzSession.get_submission_summary
+
+    return (bool): True if oj.uz will not change this summary anymore
+    """
+
+    if not summary:
+        return False
+    text = str(summary.get('text') or '').lower()
+    return not any(marker in text for marker in PENDING_VERDICTS)
+
+
+class _TrackedSubmission:
+    """Book-keeping for a single submission inside VerdictTracker"""
+
+    def __init__(self, submission_id, now):
+        self.submission_id = submission_id
+        self.queues: set[asyncio.Queue] = set()
+        self.callbacks: list = []
+        self.waiters = 0 # wait_final callers
+        self.summary: dict | None = None
+        self.final_future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.unchanged_polls = 0
+        self.next_poll = now
+        self.started = now
+
+
+class VerdictTracker:
+    """
+    Polls oj.uz submission summaries on behalf of all interested callers.
+    Keeps one registry of in-flight submissions, so N watchers of the same
+    submission cost a single upstream request per tick.
+
+    Polling is adaptive: a submission whose summary keeps changing (compiling,
+    subtasks being evaluated) is polled every `min_interval` seconds, every
+    unchanged poll multiplies the interval by `backoff` up to `max_interval`,
+    and polling stops at the final verdict.
+    """
+
+    def __init__(self, fetch_summary, batch_size=20, min_interval=1.0,
+                 max_interval=15.0, backoff=1.6, max_tracking_time=30 * 60) -> None:
+        """
+        fetch_summary (coroutine function): called with a submission id, returns the summary dict
+        batch_size (int): maximum number of summaries fetched concurrently in one tick
+        min_interval (float): seconds between polls while the verdict is changing
+        max_interval (float): upper bound for the backed off interval
+        backoff (float): multiplier applied to the interval after every unchanged poll
+        max_tracking_time (float): seconds after which a submission is dropped even if not final
+        """
+
+        self.fetch_summary = fetch_summary
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_tracking_time = max_tracking_time
+
+        self.tracked: dict[str, _TrackedSubmission] = {}
+        self.upstream_requests: int = 0
+        self._poll_task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def _ensure_running(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(untraced(self._poll_loop()))
+
+    def track(self, submission_id) -> _TrackedSubmission:
+        """Registers submission_id for polling, it is a no-op if it is already tracked
+
+        submission_id (string): id of the submission
+
+        return (_TrackedSubmission): internal book-keeping entry of the submission
+        """
+
+        submission_id = str(submission_id)
+        entry = self.tracked.get(submission_id)
+        if entry is None:
+            entry = self.tracked[submission_id] = _TrackedSubmission(submission_id, time.monotonic())
+            logger.debug("Verdict tracker started tracking submission=%s", submission_id)
+            self._ensure_running()
+            self._wakeup.set()
+        return entry
+
+    def add_callback(self, submission_id, callback):
+        """Calls callback(submission_id, summary) every time the summary changes.
+        callback can be a regular function or a coroutine function.
+        If the submission is dropped after max_tracking_time without a final verdict,
+        callback is called one last time with summary None.
+        """
+
+        self.track(submission_id).callbacks.append(callback)
+
+    def remove_callback(self, submission_id, callback):
+        """Stops calling callback, polling stops once nobody is interested in the submission anymore"""
+
+        entry = self.tracked.get(str(submission_id))
+        if entry is not None and callback in entry.callbacks:
+            entry.callbacks.remove(callback)
+            self._release(entry)
+
+    def _release(self, entry):
+        if entry.callbacks or entry.queues or entry.waiters or self.tracked.get(entry.submission_id) is not entry:
+            return
+        del self.tracked[entry.submission_id]
+        entry.final_future.cancel()
+        logger.debug("Verdict tracker dropped unwatched submission=%s", entry.submission_id)
+
+    async def watch(self, submission_id):
+        """Async iterator over summary updates of given submission, ends at the final verdict
+
+        submission_id (string): id of the submission
+
+        yields (dict): the summary every time it changes
+        """
+
+        entry = self.track(submission_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        entry.queues.add(queue)
+        if entry.summary is not None:
+            queue.put_nowait(entry.summary)
+        try:
+            while True:
+                summary = await queue.get()
+                if summary is None:
+                    return
+                yield summary
+        finally:
+            entry.queues.discard(queue)
+            self._release(entry)
+
+    async def wait_final(self, submission_id):
+        """Waits until given submission has its final verdict
+
+        return (dict): the final summary
+        """
+
+        entry = self.track(submission_id)
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.final_future)
+        finally:
+            entry.waiters -= 1
+            self._release(entry)
+
+    def _interval(self, entry):
+        return min(self.max_interval, self.min_interval * self.backoff ** entry.unchanged_polls)
+
+    async def _poll_one(self, entry):
+        try:
+            self.upstream_requests += 1
+            summary = await self.fetch_summary(entry.submission_id)
+        except Exception as e:
+            logger.warning(f"Verdict tracker failed to fetch submission={entry.submission_id}: {e!r}")
+            entry.unchanged_polls += 1
+            return
+
+        if summary == entry.summary:
+            entry.unchanged_polls += 1
+            return
+        entry.summary = summary
+        entry.unchanged_polls = 0
+        await self._publish(entry, summary)
+
+    async def _publish(self, entry, summary):
+        for queue in entry.queues:
+            queue.put_nowait(summary)
+        await self._run_callbacks(entry, summary)
+
+    async def _run_callbacks(self, entry, summary):
+        for callback in list(entry.callbacks):
+            try:
+                result = callback(entry.submission_id, summary)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception(f"Verdict tracker callback failed for submission={entry.submission_id}")
+
+    def _finish(self, entry):
+        self.tracked.pop(entry.submission_id, None)
+        for queue in entry.queues:
+            queue.put_nowait(None)
+        if not entry.final_future.done():
+            if entry.summary is not None and is_final_summary(entry.summary):
+                entry.final_future.set_result(entry.summary)
+            else:
+                entry.final_future.set_exception(
+                    asyncio.TimeoutError(f"submission {entry.submission_id} did not finish in time"))
+            # nobody might be waiting on it, don't warn about the unretrieved result
+            entry.final_future.exception()
+        logger.debug("Verdict tracker stopped tracking submission=%s", entry.submission_id)
+
+    async def _poll_loop(self):
+        while True:
+            now = time.monotonic()
+            for entry in list(self.tracked.values()):
+                if now - entry.started > self.max_tracking_time:
+                    self._finish(entry)
+                    logger.warning("Verdict tracker gave up on submission=%s after %ds",
+                                   entry.submission_id, self.max_tracking_time)
+                    await self._run_callbacks(entry, None) # the watchers were ended by _finish
+
+            due = sorted((e for e in self.tracked.values() if e.next_poll <= now),
+                         key=lambda e: e.next_poll)[:self.batch_size]
+            if due:
+                await asyncio.gather(*[self._poll_one(entry) for entry in due])
+                now = time.monotonic()
+                for entry in due:
+                    if is_final_summary(entry.summary):
+                        self._finish(entry)
+                    else:
+                        entry.next_poll = now + self._interval(entry)
+
+            if not self.tracked:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            sleep_for = max(0.0, min(e.next_poll for e in self.tracked.values()) - time.monotonic())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stops polling and ends all active watchers"""
+
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+        for entry in list(self.tracked.values()):
+            self._finish(entry)
@@ -4,6 +4,9 @@
 # or define ojuz_accounts here
 from .accounts import ojuz_accounts
 
-debug = True
+import os
+
+# VC_OJUZ_DEBUG=1 turns on debug logging
+debug = os.environ.get('VC_OJUZ_DEBUG', '0') not in ('', '0', 'false', 'False')
 import coloredlogs
 coloredlogs.install()
\ No newline at end of file
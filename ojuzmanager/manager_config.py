@@ -0,0 +1,91 @@
+config = {
+    'base_url': 'https://oj.uz', # point it to benchmarks/fake_ojuz.py to test without oj.uz
+    'connection_pool': {
+        'limit': 100, # open connections in total
+        'limit_per_host': 20, # open connections to oj.uz, shared by all accounts
+        'keepalive_timeout': 30,
+        'ttl_dns_cache': 300,
+        'total_timeout': 60,
+        'connect_timeout': 10,
+        'sock_read_timeout': 30
+    },
+    'login': {
+        'parallelism': 4, # accounts logging in at the same time
+        'attempts': 3
+    },
+    'session_store': {
+        'collection': 'ojuz_sessions', # used when the manager has a mongo database
+        'directory': '.ojuz_sessions' # used otherwise
+    },
+    'parse_executor': {
+        'kind': 'thread', # 'thread' or 'process'
+        'max_workers': 4
+    },
+    'submission_details_cache': {
+        'collection': 'submission_details', # mongo collection of final submission details
+        'max_size': 1024 # submissions kept in the in-process LRU
+    },
+    'problem_catalog': {
+        'collection': 'problems', # mongo collection of problem metadata
+        'max_size': 2048, # problems kept in the in-process LRU
+        'ttl': 6 * 3600, # seconds before a problem page is revalidated with a conditional GET
+        'missing_ttl': 600 # seconds a missing problem is remembered
+    },
+    'single_flight': {
+        # concurrent identical summary/details requests share one upstream call,
+        # results are then reused for ttl seconds, final ones for final_ttl seconds
+        'summary': {'ttl': 1.0, 'final_ttl': 300},
+        'details': {'ttl': 2.0, 'final_ttl': 300},
+        'max_cached': 4096
+    },
+    'read_pool': {
+        'anonymous_sessions': 2, # logged out sessions serving public reads next to the accounts
+        'max_in_flight': 4, # concurrent reads per session
+        'failure_cooldown': 10, # seconds a failing session is skipped for reads, doubled per failure
+        'max_failure_cooldown': 120,
+        'max_attempts': 3 # sessions a read is tried on
+    },
+    'coordination': {
+        # several processes/nodes sharing the accounts through mongo, needs a mongo database
+        'enabled': False,
+        'rate_limit_collection': 'ojuz_rate_limits', # global token bucket and block cooldown per account
+        'lease_collection': 'ojuz_leases',
+        'login_lease_seconds': 60 # one process logs an account in, the others reuse its cookies
+    },
+    'dedup': {
+        'window': 600, # seconds identical code for the same problem gets the existing submission, 0 disables
+        'collection': 'submission_dedup',
+        'max_size': 4096 # submission keys kept in the in-process LRU
+    },
+    'source_store': {
+        'collection': 'sources', # compressed sources keyed by their sha256, needs a mongo database
+        'compression_level': 6
+    },
+    'account_scheduler': {
+        'submits_per_minute': 6, # sustained submit rate per account
+        'burst': 2,
+        'block_cooldown': 30, # seconds, doubled for every recent block
+        'max_block_cooldown': 600,
+        'block_window': 600,
+        'max_in_flight': 2,
+        'failure_cooldown': 60,
+        'max_consecutive_failures': 3
+    },
+    'max_submit_attempts': 5, # accounts tried before giving up on a submission
+    'retry': {
+        # single requests failing with network errors or 5xx
+        'network': {'max_attempts': 3, 'base_delay': 0.5, 'max_delay': 5, 'deadline': 30},
+        # expired logins and blocked submissions, replaces the fixed 10s sleep
+        'submit': {'max_attempts': 4, 'base_delay': 5, 'max_delay': 60, 'deadline': 180},
+        'login': {'max_attempts': 3, 'base_delay': 1, 'max_delay': 10}
+    },
+    'tracing': {
+        'enabled': False, # record spans linking server requests to their oj.uz calls
+        'max_traces': 1000, # traces kept in memory for /traces
+        'max_spans_per_trace': 200
+    },
+    'circuit_breaker': {
+        'account': {'failure_threshold': 5, 'reset_timeout': 60},
+        'ojuz': {'failure_threshold': 20, 'reset_timeout': 30} # oj.uz as a whole
+    }
+}
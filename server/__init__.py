@@ -1,4 +1,7 @@
-debug = True
+import os
+
+# VC_OJUZ_DEBUG=1 turns on debug logging
+debug = os.environ.get('VC_OJUZ_DEBUG', '0') not in ('', '0', 'false', 'False')
 
 import coloredlogs
 coloredlogs.install()
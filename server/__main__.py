@@ -1,3 +1,5 @@
 from server import main
 
-main()
\ No newline at end of file
+# spawned worker processes import this module too, only the parent starts the server
+if __name__ == "__main__":
+    main()
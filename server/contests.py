@@ -0,0 +1,331 @@
+from __future__ import annotations
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from ojuzmanager.Coordination import MongoLease
+from ojuzmanager.OjuzManager import OjuzManager, OjuzProblemNotFound
+from ojuzmanager.VerdictTracker import is_final_summary
+from server import debug
+from server.db import BulkWriter
+from server.scoreboard import Scoreboard
+from server.submission_queue import SubmissionQueue
+from server.verdict_stream import VerdictHub
+
+logger = logging.getLogger("server.contests")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class ContestException(Exception):
+    pass
+
+class Contests:
+    """
+    Virtual contests: a set of oj.uz problems, participants and a time window.
+    Contest submissions go through the submission queue, their verdicts are tracked and
+    every final verdict updates the in-memory scoreboard of its contest incrementally.
+    Scoreboard changes are published on the 'contest:<id>' topic of the verdict hub.
+
+    With several server processes (`leases` given) the verdicts of a contest are tracked by the
+    one process holding its lease. The others follow it from Mongo every `sync_interval` seconds:
+    they refresh their contests and scoreboards and republish the owner's events to their own
+    subscribers. A process that dies loses its leases and another one takes the contests over.
+
+    Collections:
+    contests: {_id, name, problems: [problem_url], start, end, participants: [name]}
+    contest_submissions: {_id: submission_id, contest_id, participant, problem_index, elapsed, score, text, final}
+    """
+
+    # fields of contest_submissions the scoreboard needs
+    SUBMISSION_PROJECTION = {'contest_id': 1, 'participant': 1, 'problem_index': 1, 'elapsed': 1, 'score': 1,
+                             'text': 1, 'final': 1}
+
+    def __init__(self, mongo, ojuz: OjuzManager, submission_queue: SubmissionQueue, verdict_hub: VerdictHub,
+                 contests_collection='contests', submissions_collection='contest_submissions',
+                 leases: MongoLease | None = None, sync_interval=2) -> None:
+        """
+        leases (MongoLease): contest ownership shared with the other processes, None if this process is alone
+        sync_interval (float): seconds between refreshes from Mongo when leases are used
+        """
+        self.contests = mongo[contests_collection]
+        self.submissions = mongo[submissions_collection]
+        # verdicts arrive in bursts, write them in batches
+        self.submission_writer = BulkWriter(self.submissions)
+        self.ojuz = ojuz
+        self.submission_queue = submission_queue
+        self.verdict_hub = verdict_hub
+
+        self.contest_cache: dict[str, dict] = {}
+        self.scoreboards: dict[str, Scoreboard] = {}
+        self.tracked: dict[str, dict] = {} # submission_id -> contest_submissions document, until final
+        self.leases = leases
+        self.sync_interval = sync_interval
+        self.owned: set[str] = set() # contests whose verdicts this process tracks, only with leases
+        # contest_id -> submission_id -> (text, score, final) last seen in Mongo, for contests owned elsewhere
+        self.seen: dict[str, dict[str, tuple]] = {}
+        self._sync_task: asyncio.Task | None = None
+        submission_queue.add_listener(self._on_job_finished)
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    @staticmethod
+    def _aware(moment):
+        # Mongo hands back naive UTC datetimes
+        return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+    async def create(self, name, problems, start=None, duration_minutes=300, participants=()):
+        """Creates a contest
+
+        problems (list): oj.uz problem urls
+        start (datetime): start of the contest, now if None
+        duration_minutes (float): length of the contest window
+
+        return (dict): the contest document
+        """
+
+        if not problems:
+            raise ContestException("A contest needs at least one problem")
+        for problem_url in problems:
+            try:
+                await self.ojuz.validate_problem_url(problem_url)
+            except OjuzProblemNotFound as e:
+                raise ContestException(str(e))
+        start = self._aware(start) if start is not None else self._now()
+        contest = {
+            '_id': uuid.uuid4().hex,
+            'name': name,
+            'problems': list(problems),
+            'start': start,
+            'end': start + timedelta(minutes=duration_minutes),
+            'participants': list(dict.fromkeys(participants)),
+        }
+        await self.contests.insert_one(contest)
+        self.contest_cache[contest['_id']] = contest
+        logger.info(f"Contest {contest['_id']} ({name}) created with {len(problems)} problems")
+        return contest
+
+    async def get(self, contest_id, reload=False):
+        """
+        reload (bool): read the contest from Mongo even if it is cached, e.g. another process registered a participant
+        """
+        contest = None if reload else self.contest_cache.get(contest_id)
+        if contest is None:
+            contest = await self.contests.find_one({'_id': contest_id})
+            if contest is None:
+                raise ContestException(f"There is no contest {contest_id}")
+            contest['start'], contest['end'] = self._aware(contest['start']), self._aware(contest['end'])
+            self.contest_cache[contest_id] = contest
+        return contest
+
+    async def register(self, contest_id, participant):
+        contest = await self.get(contest_id)
+        if participant not in contest['participants']:
+            await self.contests.update_one({'_id': contest_id}, {'$addToSet': {'participants': participant}})
+            contest['participants'].append(participant)
+        (await self.scoreboard(contest_id)).add_participant(participant)
+
+    async def submit(self, contest_id, participant, problem_index, solution_code):
+        """Queues a contest submission
+
+        return (string): id of the submission queue job
+        """
+
+        contest = await self.get(contest_id)
+        now = self._now()
+        if not contest['start'] <= now < contest['end']:
+            raise ContestException("The contest is not running")
+        if participant not in contest['participants'] and self.leases is not None:
+            contest = await self.get(contest_id, reload=True) # maybe registered through another process
+        if participant not in contest['participants']:
+            raise ContestException(f"{participant} is not registered to the contest")
+        if not 0 <= problem_index < len(contest['problems']):
+            raise ContestException(f"The contest has no problem {problem_index}")
+        return await self.submission_queue.enqueue(contest['problems'][problem_index], solution_code, {
+            'contest_id': contest_id,
+            'participant': participant,
+            'problem_index': problem_index,
+            'elapsed': (now - contest['start']).total_seconds(),
+        }, dedup=False) # every participant's submission is judged and scored on its own
+
+    async def scoreboard(self, contest_id) -> Scoreboard:
+        """return (Scoreboard): scoreboard of the contest, built from Mongo once and then kept up to date"""
+
+        scoreboard = self.scoreboards.get(contest_id)
+        if scoreboard is not None:
+            return scoreboard
+        contest = await self.get(contest_id)
+        scoreboard = Scoreboard(len(contest['problems']))
+        for participant in contest['participants']:
+            scoreboard.add_participant(participant)
+        async for submission in self.submissions.find({'contest_id': contest_id}, Contests.SUBMISSION_PROJECTION):
+            if submission.get('final'):
+                scoreboard.update(submission['participant'], submission['problem_index'],
+                                  submission['score'], submission['elapsed'])
+            elif self.leases is None or contest_id in self.owned:
+                self._track(submission)
+        # another coroutine might have built it while this one was reading Mongo
+        return self.scoreboards.setdefault(contest_id, scoreboard)
+
+    async def resume(self):
+        """Tracks the verdicts of contest submissions that were not final at the last shutdown,
+        with leases the contests are taken over by the sync loop instead"""
+
+        if self.leases is not None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+            return
+        async for submission in self.submissions.find({'final': False}, Contests.SUBMISSION_PROJECTION):
+            self._track(submission)
+        logger.info(f"Contests resumed tracking {len(self.tracked)} submissions")
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Contest sync failed: {e!r}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self):
+        """Follows the contests owned by other processes and takes over those without an owner"""
+
+        await self.submission_writer.flush() # Mongo must show this process' own verdicts first
+        followed = set(self.scoreboards) | {topic.removeprefix('contest:') for topic in self.verdict_hub.subscribers
+                                            if topic.startswith('contest:')}
+        for contest_id in followed - self.owned:
+            await self._refresh(contest_id)
+
+        pending = set(await self.submissions.distinct('contest_id', {'final': False}))
+        for contest_id in pending | self.owned:
+            lease = f'contest:{contest_id}'
+            if contest_id in pending and await self.leases.acquire(lease): # renews the leases already held
+                if contest_id not in self.owned:
+                    logger.info(f"Contest {contest_id} verdicts tracked by this process")
+                    self.owned.add(contest_id)
+                    self.seen.pop(contest_id, None)
+                async for submission in self.submissions.find({'contest_id': contest_id, 'final': False},
+                                                              Contests.SUBMISSION_PROJECTION):
+                    self._track(submission)
+                continue
+            if contest_id not in self.owned:
+                continue # tracked by another process
+            if contest_id not in pending:
+                await self.leases.release(lease) # every verdict is final
+            else:
+                logger.warning(f"Contest {contest_id} lease lost, another process tracks its verdicts")
+            self.owned.discard(contest_id)
+            for submission_id, submission in list(self.tracked.items()):
+                if submission['contest_id'] == contest_id:
+                    self._untrack(submission_id)
+
+    async def _refresh(self, contest_id):
+        """Reloads a contest owned by another process from Mongo and publishes what changed since the last refresh"""
+
+        try:
+            contest = await self.get(contest_id, reload=True)
+        except ContestException:
+            return
+        initial = contest_id not in self.seen
+        seen = self.seen.setdefault(contest_id, {})
+        scoreboard = Scoreboard(len(contest['problems']))
+        for participant in contest['participants']:
+            scoreboard.add_participant(participant)
+        async for submission in self.submissions.find({'contest_id': contest_id}, Contests.SUBMISSION_PROJECTION):
+            state = (submission.get('text'), submission.get('score'), submission.get('final'))
+            if not initial and seen.get(submission['_id']) != state:
+                self._publish_submission(submission, submission['_id'], submission.get('text'), submission.get('score'))
+            seen[submission['_id']] = state
+            if submission.get('final'):
+                scoreboard.update(submission['participant'], submission['problem_index'],
+                                  submission['score'], submission['elapsed'])
+
+        previous = self.scoreboards.get(contest_id)
+        self.scoreboards[contest_id] = scoreboard
+        if previous is None:
+            return
+        for participant, row in scoreboard.rows.items():
+            if previous.rows.get(participant) != row:
+                self.verdict_hub.publish(f'contest:{contest_id}', {
+                    'type': 'scoreboard',
+                    'contest_id': contest_id,
+                    'row': scoreboard.row(participant),
+                })
+
+    def _track(self, submission):
+        if submission['_id'] in self.tracked:
+            return
+        self.tracked[submission['_id']] = submission
+        self.ojuz.verdict_tracker.add_callback(submission['_id'], self._on_summary)
+
+    def _untrack(self, submission_id):
+        del self.tracked[submission_id]
+        self.ojuz.verdict_tracker.remove_callback(submission_id, self._on_summary)
+
+    def _publish_submission(self, submission, submission_id, text, score):
+        contest_id = submission['contest_id']
+        self.verdict_hub.publish(f'contest:{contest_id}', {
+            'type': 'submission',
+            'contest_id': contest_id,
+            'participant': submission['participant'],
+            'problem_index': submission['problem_index'],
+            'submission_id': submission_id,
+            'text': text,
+            'score': score,
+        })
+
+    async def _on_job_finished(self, job):
+        metadata = job.get('metadata') or {}
+        if 'contest_id' not in metadata or not job.get('submission_url'):
+            return
+        submission = metadata | {
+            '_id': job['submission_url'].rstrip('/').split('/')[-1],
+            'score': None,
+            'final': False,
+        }
+        fields = {key: value for key, value in submission.items() if key != '_id'}
+        self.submission_writer.update_one({'_id': submission['_id']}, {'$set': fields}, upsert=True)
+        if self.leases is None or metadata['contest_id'] in self.owned:
+            self._track(submission) # otherwise its owner picks it up on its next sync
+
+    async def _on_summary(self, submission_id, summary):
+        submission = self.tracked.get(submission_id)
+        if submission is None:
+            return
+        if summary is None:
+            # the tracker gave up on it, let it be tracked again: by the next sync or right away without one
+            del self.tracked[submission_id]
+            if self.leases is None:
+                self._track(submission)
+            return
+        contest_id = submission['contest_id']
+        self._publish_submission(submission, submission_id, summary.get('text'), summary.get('score'))
+        if not is_final_summary(summary):
+            if self.leases is not None:
+                # the processes following this contest republish the progress from Mongo
+                self.submission_writer.update_one({'_id': submission_id},
+                    {'$set': {'text': summary.get('text'), 'score': summary.get('score')}})
+            return
+
+        # built before untracking: a build reads this submission as pending from Mongo and would track it again
+        scoreboard = await self.scoreboard(contest_id)
+        if submission_id not in self.tracked:
+            return # finalized by a concurrent call while the scoreboard was built
+        self._untrack(submission_id)
+        self.submission_writer.update_one({'_id': submission_id},
+            {'$set': {'score': summary.get('score'), 'text': summary.get('text'), 'final': True}})
+        if scoreboard.update(submission['participant'], submission['problem_index'],
+                             summary.get('score'), submission['elapsed']):
+            self.verdict_hub.publish(f'contest:{contest_id}', {
+                'type': 'scoreboard',
+                'contest_id': contest_id,
+                'row': scoreboard.row(submission['participant']),
+            })
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+        await self.submission_writer.close()
+        if self.leases is not None:
+            for contest_id in self.owned:
+                await self.leases.release(f'contest:{contest_id}')
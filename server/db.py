@@ -0,0 +1,148 @@
+"""
+Data access helpers shared by the server components: index definitions,
+batched verdict writes and slow query logging for the Motor client.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from pymongo import ASCENDING, IndexModel, UpdateOne, monitoring
+from server import debug
+
+logger = logging.getLogger("server.db")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+DUPLICATE_KEY = 11000 # mongo error code
+
+# collection name -> indexes it needs, _id is always indexed
+INDEXES = {
+    'submission_jobs': [
+        # workers dequeue the oldest queued job, recovery looks for expired leases
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_created_at'),
+        IndexModel([('status', ASCENDING), ('lease_until', ASCENDING)], name='status_lease_until'),
+        IndexModel([('submission_id', ASCENDING)], name='submission_id', sparse=True),
+    ],
+    'contest_submissions': [
+        IndexModel([('contest_id', ASCENDING), ('participant', ASCENDING)], name='contest_participant'),
+        # only pending verdicts are looked up by status, keep the index small
+        IndexModel([('final', ASCENDING)], name='pending', partialFilterExpression={'final': False}),
+    ],
+    'contests': [
+        IndexModel([('end', ASCENDING)], name='end'),
+    ],
+    # far beyond the dedup window, expired keys are ignored by the lookup before Mongo drops them
+    'submission_dedup': [
+        IndexModel([('submitted_at', ASCENDING)], name='submitted_at_ttl', expireAfterSeconds=24 * 3600),
+    ],
+}
+
+
+async def ensure_indexes(mongo):
+    """Creates the indexes of INDEXES, existing ones are left untouched"""
+
+    for collection, indexes in INDEXES.items():
+        names = await mongo[collection].create_indexes(indexes)
+        logger.debug("Indexes of %s: %s", collection, names)
+
+
+class SlowQueryLogger(monitoring.CommandListener):
+    """Logs every Mongo command slower than `threshold_ms`"""
+
+    def __init__(self, threshold_ms=100) -> None:
+        self.threshold_ms = threshold_ms
+        self.slow_queries: int = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            self.slow_queries += 1
+            logger.warning(f"Slow mongo {event.command_name} took {duration_ms:.1f}ms (request_id={event.request_id})")
+
+    def failed(self, event):
+        if event.failure.get('code') == DUPLICATE_KEY:
+            # expected, e.g. MongoLease.acquire upserts a lease held by another process
+            logger.debug("Mongo %s hit a duplicate key: %s", event.command_name, event.failure)
+            return
+        logger.warning(f"Mongo {event.command_name} failed after {event.duration_micros / 1000:.1f}ms: {event.failure}")
+
+
+class BulkWriter:
+    """
+    Collects update_one operations for one collection and sends them with a single
+    ordered bulk_write, when `max_batch` operations are pending or every `interval` seconds.
+    The batch is ordered because it can hold several updates of the same document
+    (the upsert, progress texts, the final verdict) which must be applied in the order they were made.
+
+    A failed batch is kept in front of the newer operations and retried with exponential backoff,
+    at most `max_pending` operations are kept, the oldest are dropped beyond that.
+    """
+
+    def __init__(self, collection, max_batch=500, interval=0.5, max_pending=20000, max_backoff=30.0) -> None:
+        self.collection = collection
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.operations: list[UpdateOne] = []
+        self.flushes: int = 0
+        self.failures: int = 0 # consecutive failed flushes
+        self.dropped: int = 0
+        self._flush_task: asyncio.Task | None = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    def update_one(self, query, update, upsert=False):
+        self.operations.append(UpdateOne(query, update, upsert=upsert))
+        if len(self.operations) >= self.max_batch and not self.failures:
+            task = asyncio.create_task(self.flush())
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(self.interval))
+
+    def _backoff(self):
+        return min(self.max_backoff, self.interval * 2 ** self.failures)
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    def _schedule_retry(self):
+        current = asyncio.current_task()
+        if self._flush_task is not None and self._flush_task is not current and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = asyncio.create_task(self._flush_later(self._backoff()))
+
+    async def flush(self):
+        async with self._lock:
+            operations, self.operations = self.operations, []
+            if not operations:
+                return
+            try:
+                await self.collection.bulk_write(operations, ordered=True)
+                self.flushes += 1
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                # keep what was not written in front of the newer operations, an ordered batch
+                # stops at its first error so the written prefix is applied again, which is idempotent
+                operations = operations + self.operations
+                if len(operations) > self.max_pending:
+                    dropped = len(operations) - self.max_pending
+                    self.dropped += dropped
+                    operations = operations[dropped:]
+                    logger.warning("Dropped %d oldest pending operations to %s", dropped, self.collection.name)
+                self.operations = operations
+                logger.warning("Bulk write of %d operations to %s failed (%d in a row), retrying in %.1fs: %r",
+                               len(operations), self.collection.name, self.failures, self._backoff(), e)
+                if not self._closed:
+                    self._schedule_retry()
+
+    async def close(self):
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
@@ -1,18 +1,31 @@
 from __future__ import annotations
-from ojuzmanager.OjuzManager import OjuzManager
+from ojuzmanager.OjuzManager import OjuzManager, OjuzProblemNotFound
+from server.submission_queue import SubmissionQueue, SubmissionQueueFull
+from server.verdict_stream import VerdictHub, VerdictStreamHandler
+from server.contests import Contests, ContestException
+from ojuzmanager import Metrics
+from ojuzmanager.Tracing import tracer
+from datetime import datetime
 import aiohttp_jinja2
-from server import debug
+from server import debug, config
 from aiohttp import web
+import json
 import logging
 
 logger = logging.getLogger("server.handler")
 logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
+MAX_CONTEST_MINUTES = 366 * 24 * 60
+
 class SiteHandler:
 
-    def __init__(self, mongo, contest_managers):
+    def __init__(self, mongo, contest_managers, submission_queue, verdict_hub, contests):
         self._mongo = mongo
         self._contest_managers = contest_managers
+        self._submission_queue = submission_queue
+        self._verdict_hub = verdict_hub
+        self._verdict_stream = VerdictStreamHandler(verdict_hub)
+        self._contests = contests
 
     @property
     def mongo(self):
@@ -21,18 +34,227 @@ class SiteHandler:
     @property
     def contest_managers(self):
         return self._contest_managers
+
+    @property
+    def submission_queue(self) -> SubmissionQueue:
+        return self._submission_queue
+
+    @property
+    def verdict_hub(self) -> VerdictHub:
+        return self._verdict_hub
+
+    @property
+    def verdict_stream(self) -> VerdictStreamHandler:
+        return self._verdict_stream
+
+    @property
+    def contests(self) -> Contests:
+        return self._contests
     
     async def test_submit_post(self, request):
         form = await request.json()
-        logger.debug(form)
+        if not isinstance(form, dict) or not isinstance(form.get("problem_url"), str) \
+                or not isinstance(form.get("solution_code"), str):
+            return web.json_response({'error': "problem_url and solution_code are required"}, status=400)
+        # only the fields, the body holds the whole solution code
+        logger.debug("Test submission to %s with fields %s", form["problem_url"], sorted(form))
         ojuz: OjuzManager = self.contest_managers['ojuz']
-        submission_url = await ojuz.submit_solution(form["problem_url"], form["solution_code"])
-        logger.debug(submission_url)
-        return web.json_response({'submission_url': submission_url})
+        try:
+            # a queued job for a missing problem would only fail later, after holding an account
+            await ojuz.validate_problem_url(form["problem_url"])
+        except OjuzProblemNotFound as e:
+            return web.json_response({'error': str(e)}, status=404)
+        # the same code was just submitted to the same problem, answer with that submission instead of a job
+        duplicate = await ojuz.find_duplicate_submission(form["problem_url"], form["solution_code"])
+        if duplicate is not None:
+            logger.debug("Deduplicated submission to %s", duplicate['submission_url'])
+            return web.json_response(duplicate | {'deduplicated': True})
+        try:
+            job_id = await self.submission_queue.enqueue(form["problem_url"], form["solution_code"])
+        except SubmissionQueueFull as e:
+            return web.json_response({'error': str(e)}, status=429, headers={'Retry-After': '10'})
+        logger.debug("Queued submission job=%s", job_id)
+        status_url = request.app.router['submission_job'].url_for(job_id=job_id)
+        return web.json_response({'job_id': job_id, 'status_url': str(status_url)}, status=202)
+
+    async def batch_submit_post(self, request):
+        """Submits {"submissions": [{"problem_url", "solution_code"}, ...]} and streams
+        one NDJSON line per submission as soon as it lands on oj.uz"""
+        try:
+            form = await request.json()
+        except ValueError:
+            return web.json_response({'error': "the body must be JSON"}, status=400)
+        submissions = form.get("submissions", []) if isinstance(form, dict) else None
+        if not isinstance(submissions, list):
+            return web.json_response({'error': 'the body must be an object with a "submissions" list'}, status=400)
+        if len(submissions) > config['max_batch_size']:
+            return web.json_response({'error': f"at most {config['max_batch_size']} submissions per batch"}, status=413)
+        try:
+            solutions = [(s["problem_url"], s["solution_code"]) for s in submissions]
+        except (KeyError, TypeError):
+            return web.json_response({'error': "every submission needs problem_url and solution_code"}, status=400)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        ojuz: OjuzManager = self.contest_managers['ojuz']
+        results = ojuz.submit_many(solutions)
+        try:
+            async for result in results:
+                await response.write(json.dumps(result).encode() + b"\n")
+        finally:
+            # a disconnected client must not leave the remaining submissions running until garbage collection
+            await results.aclose()
+        await response.write_eof()
+        return response
+
+    async def submission_job_get(self, request):
+        job = await self.submission_queue.get(request.match_info['job_id'])
+        if job is None:
+            raise web.HTTPNotFound()
+        return web.json_response({
+            'job_id': job['_id'],
+            'status': job['status'],
+            'submission_url': job.get('submission_url'),
+            'error': job.get('error'),
+            'attempts': job['attempts'],
+            'trace_id': job.get('trace_id'),
+        })
 
     @aiohttp_jinja2.template("test_submit.html")
     async def test_submit_get(self, request):
         return {}
-    
-    
-    
\ No newline at end of file
+
+    async def submission_details_get(self, request):
+        ojuz: OjuzManager = self.contest_managers['ojuz']
+        details = await ojuz.get_submission_details(request.match_info['submission_id'])
+        if details is None:
+            raise web.HTTPNotFound()
+        return web.json_response(details)
+
+    async def problem_get(self, request):
+        ojuz: OjuzManager = self.contest_managers['ojuz']
+        problem = await ojuz.get_problem(request.match_info['problem_id'])
+        if problem is None or not problem['exists']:
+            raise web.HTTPNotFound()
+        return web.json_response({key: value for key, value in problem.items() if key not in ('_id', 'etag', 'last_modified')}
+                                 | {'problem_id': problem['_id']})
+
+    @staticmethod
+    def _contest_json(contest):
+        return {
+            'contest_id': contest['_id'],
+            'name': contest['name'],
+            'problems': contest['problems'],
+            'start': contest['start'].isoformat(),
+            'end': contest['end'].isoformat(),
+            'participants': contest['participants'],
+        }
+
+    @staticmethod
+    def _contest_fields(form):
+        """Validates the body of a contest creation
+
+        return (tuple): name, problems, start, duration_minutes, participants as Contests.create takes them
+        raises ValueError: with the message for the client
+        """
+
+        if not isinstance(form, dict):
+            raise ValueError("the body must be a JSON object")
+        name = form.get('name', '')
+        if not isinstance(name, str):
+            raise ValueError("name must be a string")
+        problems, participants = form.get('problems', []), form.get('participants', [])
+        if not isinstance(problems, list) or not all(isinstance(problem, str) for problem in problems):
+            raise ValueError("problems must be a list of problem urls")
+        if not isinstance(participants, list) or not all(isinstance(participant, str) and participant
+                                                         for participant in participants):
+            raise ValueError("participants must be a list of names")
+        start = form.get('start')
+        if start is not None and not isinstance(start, str):
+            raise ValueError("start must be an ISO 8601 date")
+        start = datetime.fromisoformat(start) if start else None
+        duration = form.get('duration_minutes', 300)
+        if isinstance(duration, bool) or not isinstance(duration, (int, float, str)):
+            raise ValueError("duration_minutes must be a number")
+        duration = float(duration)
+        if not 0 < duration <= MAX_CONTEST_MINUTES:
+            raise ValueError(f"duration_minutes must be between 0 and {MAX_CONTEST_MINUTES}")
+        return name, problems, start, duration, participants
+
+    async def contest_create_post(self, request):
+        try:
+            contest = await self.contests.create(*self._contest_fields(await request.json()))
+        except (ContestException, ValueError) as e:
+            return web.json_response({'error': str(e)}, status=400)
+        return web.json_response(self._contest_json(contest), status=201)
+
+    async def contest_get(self, request):
+        try:
+            contest = await self.contests.get(request.match_info['contest_id'])
+        except ContestException as e:
+            return web.json_response({'error': str(e)}, status=404)
+        return web.json_response(self._contest_json(contest))
+
+    async def contest_register_post(self, request):
+        form = await request.json()
+        if not isinstance(form.get('participant'), str) or not form['participant']:
+            return web.json_response({'error': "participant is required"}, status=400)
+        try:
+            await self.contests.register(request.match_info['contest_id'], form['participant'])
+        except ContestException as e:
+            return web.json_response({'error': str(e)}, status=404)
+        return web.json_response({'participant': form['participant']}, status=201)
+
+    async def contest_submit_post(self, request):
+        form = await request.json()
+        if not isinstance(form.get('participant'), str) or not isinstance(form.get('solution_code'), str):
+            return web.json_response({'error': "participant and solution_code are required"}, status=400)
+        try:
+            problem_index = int(form['problem_index'])
+        except (KeyError, TypeError, ValueError):
+            return web.json_response({'error': "problem_index must be an integer"}, status=400)
+        try:
+            job_id = await self.contests.submit(request.match_info['contest_id'], form['participant'],
+                                                problem_index, form['solution_code'])
+        except ContestException as e:
+            return web.json_response({'error': str(e)}, status=403)
+        except SubmissionQueueFull as e:
+            return web.json_response({'error': str(e)}, status=429, headers={'Retry-After': '10'})
+        status_url = request.app.router['submission_job'].url_for(job_id=job_id)
+        return web.json_response({'job_id': job_id, 'status_url': str(status_url)}, status=202)
+
+    async def contest_scoreboard_get(self, request):
+        try:
+            scoreboard = await self.contests.scoreboard(request.match_info['contest_id'])
+        except ContestException as e:
+            return web.json_response({'error': str(e)}, status=404)
+        try:
+            top = int(request.query.get('top', 50))
+        except ValueError:
+            return web.json_response({'error': "top must be an integer"}, status=400)
+        if top < 0:
+            return web.json_response({'error': "top must not be negative"}, status=400)
+        top = min(top, 1000)
+        return web.json_response({'participants': len(scoreboard), 'rows': scoreboard.top(top)})
+
+    async def contest_rank_get(self, request):
+        try:
+            scoreboard = await self.contests.scoreboard(request.match_info['contest_id'])
+        except ContestException as e:
+            return web.json_response({'error': str(e)}, status=404)
+        row = scoreboard.row(request.match_info['participant'])
+        if row is None:
+            raise web.HTTPNotFound()
+        return web.json_response(row)
+
+    async def metrics_get(self, request):
+        return web.Response(body=Metrics.registry.render().encode(), headers={'Content-Type': Metrics.CONTENT_TYPE})
+
+    async def traces_get(self, request):
+        return web.json_response({'enabled': tracer.enabled, 'traces': tracer.recent_traces()})
+
+    async def trace_get(self, request):
+        spans = tracer.get_trace(request.match_info['trace_id'])
+        if spans is None:
+            raise web.HTTPNotFound()
+        return web.json_response({'trace_id': request.match_info['trace_id'], 'spans': spans})
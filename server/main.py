@@ -1,9 +1,18 @@
 import asyncio
 import logging
+import multiprocessing
+import socket
+from ojuzmanager.Coordination import MongoLease
 from ojuzmanager.OjuzManager import OjuzManager
+from ojuzmanager.manager_config import config as manager_config
 from server import debug, config
 from server.utils import init_mongo
+from server.db import ensure_indexes
 from server.handler import SiteHandler
+from server.submission_queue import SubmissionQueue
+from server.verdict_stream import VerdictHub
+from server.contests import Contests
+from server.monitoring import EventLoopLagMonitor, monitoring_middleware
 from server.setup_routes import setup_routes
 from aiohttp import web
 import aiohttp_jinja2, jinja2
@@ -19,35 +28,91 @@ logger.setLevel(logging.DEBUG if debug else logging.INFO)
 async def setup_mongo(app, loop):
     mongo = await init_mongo(config['mongo'], loop)
     app.on_cleanup.append(lambda app: mongo.client.close())
+    await ensure_indexes(mongo)
     return mongo
 
 def setup_jinja(app):
     jinja_env = aiohttp_jinja2.setup(
         app, loader=jinja2.FileSystemLoader(str(TEMPLATES_ROOT)))
 
-async def initialize_vcs(app):
+async def initialize_vcs(app, mongo, node_id=None):
     contest_managers = {}
-    ojuz = contest_managers['ojuz'] = OjuzManager()
-    await ojuz.initialize_accounts()
+    ojuz = contest_managers['ojuz'] = OjuzManager(mongo, node_id=node_id)
+    # start serving as soon as one account is ready, the rest join the pool in the background
+    await ojuz.initialize_accounts(wait_for_all=False)
     app.on_cleanup.append(lambda app: ojuz.close_sessions())
 
     return contest_managers
 
-async def initialize_app(loop):
-    app = web.Application(loop=loop)
+async def setup_submission_queue(app, mongo, ojuz, node_id=None):
+    queue_config = dict(config['submission_queue'])
+    collection = mongo[queue_config.pop('collection')]
+    submission_queue = SubmissionQueue(collection, ojuz.submit_solution, **queue_config, owner=node_id,
+                                       source_store=ojuz.source_store)
+    await submission_queue.start()
+    app.on_cleanup.append(lambda app: submission_queue.stop())
+    return submission_queue
+
+async def initialize_app(loop, node_id=None):
+    """
+    node_id (string): stable name of this worker when several share the accounts and the queue
+    """
+    app = web.Application(loop=loop, middlewares=[monitoring_middleware])
+    lag_monitor = EventLoopLagMonitor(config['event_loop_lag_interval'])
+    lag_monitor.start()
+    app.on_cleanup.append(lambda app: lag_monitor.stop())
     mongo = await setup_mongo(app, loop)
-    contest_managers = await initialize_vcs(app)
-    handler = SiteHandler(mongo, contest_managers)
+    contest_managers = await initialize_vcs(app, mongo, node_id)
+    submission_queue = await setup_submission_queue(app, mongo, contest_managers['ojuz'], node_id)
+    verdict_hub = VerdictHub(contest_managers['ojuz'])
+    leases = None
+    if node_id is not None:
+        leases = MongoLease(mongo[manager_config['coordination']['lease_collection']], node_id,
+                            config['contests']['lease_seconds'])
+    contests = Contests(mongo, contest_managers['ojuz'], submission_queue, verdict_hub, leases=leases,
+                        sync_interval=config['contests']['sync_interval'])
+    await contests.resume()
+    # flush pending verdict writes while mongo is still open
+    app.on_shutdown.append(lambda app: contests.close())
+    handler = SiteHandler(mongo, contest_managers, submission_queue, verdict_hub, contests)
     setup_jinja(app)
     setup_routes(app, handler, PROJ_ROOT)
     return app
 
 
-def main():
+def run_worker(index, workers):
+    """Runs one server process, with several workers they all listen on the same port (SO_REUSEPORT)
+    and share the oj.uz accounts and the submission queue through mongo"""
+    node_id = None
+    if workers > 1 or manager_config['coordination']['enabled']:
+        manager_config['coordination']['enabled'] = True
+        node_id = f"{config['node_id'] or socket.gethostname()}:worker-{index}"
+        logger.info(f"Starting {node_id}")
     # asyncio.get_event_loop() is deprecated since Python 3.10
     try:
         loop = asyncio.get_running_loop()
     except:
         loop = asyncio.new_event_loop()
-    app = loop.run_until_complete(initialize_app(loop))
-    web.run_app(app, host=config['host'], port=config['port'], loop=loop)
\ No newline at end of file
+    app = loop.run_until_complete(initialize_app(loop, node_id))
+    web.run_app(app, host=config['host'], port=config['port'], loop=loop, reuse_port=workers > 1)
+
+
+def main():
+    workers = int(config['workers'])
+    if workers <= 1:
+        run_worker(0, 1)
+        return
+    # spawned, not forked: every worker builds its own event loop, connections and parse pool
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(index, workers), name=f"vc-ojuz-worker-{index}")
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
\ No newline at end of file
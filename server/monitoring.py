@@ -0,0 +1,73 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from aiohttp import web
+from ojuzmanager.Metrics import registry
+from ojuzmanager.Tracing import tracer
+from server import debug
+
+logger = logging.getLogger("server.monitoring")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+event_loop_lag = registry.histogram('vc_event_loop_lag_seconds', "Delay of event loop callbacks behind schedule",
+                                    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+http_latency = registry.histogram('vc_http_request_seconds', "Latency of server requests by route and status",
+                                  ['route', 'method', 'status'])
+
+# long lived streams would only skew the latency histogram
+UNTIMED_ROUTES = {'verdicts_ws', 'verdicts_sse', 'batch_submit'}
+
+
+class EventLoopLagMonitor:
+    """Sleeps `interval` seconds in a loop and records how late every wakeup is"""
+
+    def __init__(self, interval=0.5) -> None:
+        self.interval = interval
+        self.max_lag: float = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            scheduled = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - scheduled)
+            event_loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > 0.5:
+                logger.warning(f"Event loop lagged {lag * 1000:.0f}ms behind")
+
+
+@web.middleware
+async def monitoring_middleware(request, handler):
+    """Times every request and, when tracing is enabled, runs it inside a span whose
+    id is returned in the X-Trace-Id header"""
+
+    resource = request.match_info.route.resource
+    route = request.match_info.route.name or (resource.canonical if resource is not None else 'unmatched')
+    with tracer.span(f'{request.method} {route}', path=request.path) as span:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            span.set('status', status)
+            if route not in UNTIMED_ROUTES:
+                http_latency.observe(time.perf_counter() - started, route=route, method=request.method, status=status)
+        if span.trace_id is not None and not response.prepared:
+            response.headers['X-Trace-Id'] = span.trace_id
+        return response
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import random
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, key) -> None:
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left: _Node | None = None
+        self.right: _Node | None = None
+
+
+def _size(node):
+    return node.size if node is not None else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node, key):
+    """Splits into (keys < key, keys >= key)"""
+
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+class OrderStatisticTree:
+    """Treap of unique, comparable keys with O(log n) expected insert, remove, rank and k-th lookups"""
+
+    def __init__(self) -> None:
+        self.root: _Node | None = None
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        left, right = _split(self.root, key)
+        # right starts with key, drop its smallest element
+        self.root = _merge(left, self._remove_min(right, key))
+
+    def _remove_min(self, node, key):
+        if node is None:
+            raise KeyError(key)
+        if node.left is None:
+            if node.key != key:
+                raise KeyError(key)
+            return node.right
+        node.left = self._remove_min(node.left, key)
+        return _update(node)
+
+    def rank(self, key):
+        """return (int): number of keys smaller than key"""
+
+        rank, node = 0, self.root
+        while node is not None:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def kth(self, k):
+        """return: the k-th smallest key, 0-indexed"""
+
+        node = self.root
+        while node is not None:
+            left_size = _size(node.left)
+            if k < left_size:
+                node = node.left
+            elif k == left_size:
+                return node.key
+            else:
+                k -= left_size + 1
+                node = node.right
+        raise IndexError(k)
+
+    def first(self, count):
+        """return (list): the `count` smallest keys in order"""
+
+        result, stack, node = [], [], self.root
+        while (stack or node is not None) and len(result) < count:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            result.append(node.key)
+            node = node.right
+        return result
+
+
+class Scoreboard:
+    """
+    IOI style scoreboard maintained incrementally: a participant's score on a problem is the
+    best score of their submissions, ties on total score are broken by the time of the last
+    improvement. Every verdict touches only the affected participant, which is re-inserted
+    in an order statistic tree, so updates, rank lookups and top-K reads are O(log n + K).
+    """
+
+    def __init__(self, problem_count) -> None:
+        self.problem_count = problem_count
+        self.tree = OrderStatisticTree()
+        self.rows: dict[str, dict] = {}
+
+    @staticmethod
+    def _key(row):
+        return (-row['total'], row['penalty'], row['participant'])
+
+    def add_participant(self, participant):
+        if participant in self.rows:
+            return
+        row = self.rows[participant] = {
+            'participant': participant,
+            'scores': [0] * self.problem_count,
+            'total': 0,
+            'penalty': 0.0, # seconds from contest start to the last improvement
+        }
+        self.tree.insert(self._key(row))
+
+    def update(self, participant, problem_index, score, elapsed):
+        """Records a verdict, only improvements change the scoreboard
+
+        participant (string): who submitted
+        problem_index (int): index of the problem in the contest
+        score (float): score of the submission
+        elapsed (float): seconds from contest start to the submission
+
+        return (bool): if the participant's row changed
+        """
+
+        self.add_participant(participant)
+        row = self.rows[participant]
+        if score is None or score <= row['scores'][problem_index]:
+            return False
+        self.tree.remove(self._key(row))
+        row['total'] += score - row['scores'][problem_index]
+        row['scores'][problem_index] = score
+        row['penalty'] = max(row['penalty'], elapsed)
+        self.tree.insert(self._key(row))
+        return True
+
+    def rank(self, participant):
+        """return (int or None): 1-based rank, participants with equal score and penalty get the same rank"""
+
+        row = self.rows.get(participant)
+        if row is None:
+            return None
+        return self.tree.rank((-row['total'], row['penalty'])) + 1
+
+    def row(self, participant):
+        row = self.rows.get(participant)
+        return None if row is None else row | {'rank': self.rank(participant)}
+
+    def top(self, count):
+        """return (list): the first `count` rows with their ranks"""
+
+        return [self.row(participant) for _, _, participant in self.tree.first(count)]
+
+    def __len__(self):
+        return len(self.rows)
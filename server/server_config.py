@@ -3,8 +3,28 @@ config = {
         'host': '127.0.0.1',
         'port': '27017',
         'database': 'vc_ojuz',
-        'max_pool_size': '15'
+        'max_pool_size': '15',
+        'slow_query_ms': '100' # mongo commands slower than this are logged
     },
+    'submission_queue': {
+        'collection': 'submission_jobs',
+        'workers': 4, # jobs submitted to oj.uz concurrently
+        'max_pending': 500, # /submit answers 429 above this many waiting jobs
+        'lease_seconds': 120, # running jobs not acknowledged in time are requeued
+        'max_attempts': 3,
+        'recovery_interval': 30
+    },
+    'contests': {
+        # with several workers one of them tracks the verdicts of a contest, the others refresh from mongo
+        'sync_interval': 2,
+        'lease_seconds': 30
+    },
+    'max_batch_size': 200, # solutions accepted by one POST /submit/batch
+    'event_loop_lag_interval': 0.5, # seconds between event loop lag samples for /metrics
+    # worker processes sharing the port, more than 1 turns on account coordination through mongo;
+    # several nodes need ojuzmanager/manager_config.py coordination.enabled and the same mongo
+    'workers': 1,
+    'node_id': None, # prefix of this node's worker names, defaults to the hostname
     'host': '127.0.0.01',
     'port': '8888'
 }
\ No newline at end of file
@@ -2,4 +2,19 @@ def setup_routes(app, handler, project_root):
     router = app.router
     h = handler
     router.add_get("/submit", h.test_submit_get, name="test_submit")
-    router.add_post("/submit", h.test_submit_post)
\ No newline at end of file
+    router.add_post("/submit", h.test_submit_post)
+    router.add_post("/submit/batch", h.batch_submit_post, name="batch_submit")
+    router.add_get("/jobs/{job_id}", h.submission_job_get, name="submission_job")
+    router.add_get("/submission/{submission_id}/details", h.submission_details_get, name="submission_details")
+    router.add_get("/problems/{problem_id}", h.problem_get, name="problem")
+    router.add_post("/contests", h.contest_create_post, name="contests")
+    router.add_get("/contests/{contest_id}", h.contest_get, name="contest")
+    router.add_post("/contests/{contest_id}/participants", h.contest_register_post)
+    router.add_post("/contests/{contest_id}/submit", h.contest_submit_post)
+    router.add_get("/contests/{contest_id}/scoreboard", h.contest_scoreboard_get, name="contest_scoreboard")
+    router.add_get("/contests/{contest_id}/participants/{participant}/rank", h.contest_rank_get)
+    router.add_get("/ws/verdicts", h.verdict_stream.websocket, name="verdicts_ws")
+    router.add_get("/events/verdicts", h.verdict_stream.server_sent_events, name="verdicts_sse")
+    router.add_get("/metrics", h.metrics_get, name="metrics")
+    router.add_get("/traces", h.traces_get, name="traces")
+    router.add_get("/traces/{trace_id}", h.trace_get, name="trace")
\ No newline at end of file
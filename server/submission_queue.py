@@ -0,0 +1,287 @@
+from __future__ import annotations
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from ojuzmanager.Metrics import registry
+from ojuzmanager.OjuzManager import OjuzProblemNotFound
+from ojuzmanager.Tracing import tracer
+from server import debug
+
+logger = logging.getLogger("server.submission_queue")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+job_latency = registry.histogram('vc_submission_job_seconds', "Time from enqueue to the end of a submission job",
+                                 ['status'], buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+class SubmissionQueueFull(Exception):
+    pass
+
+class SubmissionQueueException(Exception):
+    pass
+
+# failures that would happen again on every attempt, their jobs fail right away
+PERMANENT_ERRORS = (OjuzProblemNotFound, SubmissionQueueException)
+
+class SubmissionQueue:
+    """
+    Durable queue of submissions stored in Mongo, drained by a bounded number of workers.
+    A job is leased while a worker submits it and the worker renews the lease until it is done;
+    jobs whose lease expired without an acknowledgement (e.g. the server crashed mid-submit)
+    are put back in the queue. Several processes can share the collection, each leased job
+    records its `owner`. Acknowledgements only apply to the lease they were made under
+    (owner and attempt), a worker that lost its job leaves it to the new one.
+
+    Job statuses: queued -> running -> done | failed
+    """
+
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    def __init__(self, collection, submit, workers=4, max_pending=500, lease_seconds=120,
+                 max_attempts=3, recovery_interval=30, owner=None, source_store=None) -> None:
+        """
+        collection (AsyncIOMotorCollection): where jobs are stored
+        submit (coroutine function): called with (problem_url, solution_code, dedup=..., digest=...), returns the
+        submission url, digest is the source_store key of the code or None
+        workers (int): number of jobs submitted concurrently
+        max_pending (int): queued + running jobs above which enqueue() raises SubmissionQueueFull
+        lease_seconds (float): how long a running job may stay unacknowledged without its lease being renewed
+        max_attempts (int): dequeues of a job before it is marked failed
+        recovery_interval (float): seconds between sweeps for expired leases
+        owner (string): stable name of this process when several share the queue, e.g. 'host:worker-1'.
+        At startup only its own running jobs are requeued, the others belong to live processes.
+        source_store (SourceStore): if given, jobs reference their source by hash instead of embedding it
+        """
+
+        self.collection = collection
+        self.submit = submit
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.recovery_interval = recovery_interval
+        self.owner = owner
+        self.source_store = source_store
+
+        self.pending: int = 0
+        self.listeners: list = []
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        registry.gauge('vc_submission_queue_pending', "Queued and running submission jobs",
+                       function=lambda: self.pending)
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    async def start(self):
+        await self.recover_expired(all_running=True)
+        await self._count_pending()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recovery_loop()))
+        logger.info(f"Submission queue started with {self.workers} workers, {self.pending} jobs pending")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _count_pending(self):
+        # other processes enqueue and finish jobs too, the local count drifts between sweeps
+        self.pending = await self.collection.count_documents(
+            {'status': {'$in': [SubmissionQueue.QUEUED, SubmissionQueue.RUNNING]}})
+
+    def add_listener(self, listener):
+        """Calls `await listener(job)` with every job that reaches done or failed"""
+
+        self.listeners.append(listener)
+
+    async def enqueue(self, problem_url, solution_code, metadata=None, dedup=True):
+        """Stores a new job and wakes up a worker
+
+        metadata (dict): stored with the job for listeners, e.g. the contest it belongs to
+        dedup (bool): if the job may reuse an identical recent submission, see OjuzManager.submit_solution
+
+        return (string): id of the job
+        """
+
+        if self.pending >= self.max_pending:
+            raise SubmissionQueueFull(f"{self.pending} submissions are already waiting")
+        job_id = uuid.uuid4().hex
+        job = {
+            '_id': job_id,
+            'problem_url': problem_url,
+            'status': SubmissionQueue.QUEUED,
+            'dedup': dedup,
+            'attempts': 0,
+            'created_at': self._now(),
+            'metadata': metadata or {},
+        }
+        if self.source_store is not None:
+            job['source_hash'] = await self.source_store.put(solution_code)
+        else:
+            job['solution_code'] = solution_code
+        trace_id = tracer.current_trace_id()
+        if trace_id is not None:
+            job['trace_id'] = trace_id # the worker continues the trace of the request
+        self.pending += 1
+        try:
+            await self.collection.insert_one(job)
+        except Exception:
+            self.pending -= 1
+            raise
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id):
+        """return (dict or None): the job without its source code"""
+
+        return await self.collection.find_one({'_id': job_id}, {'solution_code': 0})
+
+    async def recover_expired(self, all_running=False):
+        """Puts jobs that were dequeued but never acknowledged back in the queue
+
+        all_running (bool): requeue every running job of this owner regardless of its lease, used at startup
+        """
+
+        query = {'status': SubmissionQueue.RUNNING}
+        if not all_running:
+            query['lease_until'] = {'$lt': self._now()}
+        elif self.owner is not None:
+            query['owner'] = self.owner
+        result = await self.collection.update_many(query, {'$set': {'status': SubmissionQueue.QUEUED}})
+        if result.modified_count:
+            logger.warning(f"Submission queue recovered {result.modified_count} unacknowledged jobs")
+            self._wakeup.set()
+
+    async def _recovery_loop(self):
+        while True:
+            await asyncio.sleep(self.recovery_interval)
+            try:
+                await self.recover_expired()
+                if self.owner is not None:
+                    await self._count_pending()
+            except Exception as e:
+                logger.warning(f"Submission queue recovery failed: {e!r}")
+
+    async def _dequeue(self):
+        now = self._now()
+        return await self.collection.find_one_and_update(
+            {'status': SubmissionQueue.QUEUED},
+            {
+                '$set': {'status': SubmissionQueue.RUNNING, 'started_at': now, 'owner': self.owner,
+                         'lease_until': now + timedelta(seconds=self.lease_seconds)},
+                '$inc': {'attempts': 1},
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _lease_filter(job):
+        """return (dict): matches the job only while it is still running under the lease it was dequeued with"""
+
+        return {'_id': job['_id'], 'status': SubmissionQueue.RUNNING, 'owner': job.get('owner'),
+                'attempts': job['attempts']}
+
+    async def _renew_lease(self, job):
+        interval = self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await self.collection.update_one(self._lease_filter(job),
+                    {'$set': {'lease_until': self._now() + timedelta(seconds=self.lease_seconds)}})
+            except Exception as e:
+                logger.warning(f"Could not renew the lease of submission job {job['_id']}: {e!r}")
+                continue
+            if not result.matched_count:
+                logger.warning(f"Submission job {job['_id']} lost its lease while being submitted")
+                return
+
+    async def _requeue(self, job, error):
+        result = await self.collection.update_one(self._lease_filter(job),
+            {'$set': {'status': SubmissionQueue.QUEUED, 'error': error}, '$unset': {'lease_until': ''}})
+        if not result.matched_count:
+            logger.warning(f"Submission job {job['_id']} was not requeued, it is not leased to this worker anymore")
+
+    async def _finish(self, job, update):
+        update['finished_at'] = self._now()
+        result = await self.collection.update_one(self._lease_filter(job),
+                                                  {'$set': update, '$unset': {'lease_until': ''}})
+        if not result.matched_count:
+            # another worker took the job over, it acknowledges and notifies
+            logger.warning(f"Submission job {job['_id']} finished as {update['status']} without its lease, ignored")
+            return
+        self.pending = max(0, self.pending - 1)
+        created_at = job['created_at'] if job['created_at'].tzinfo is not None else \
+            job['created_at'].replace(tzinfo=timezone.utc) # Mongo hands back naive UTC datetimes
+        job_latency.observe((update['finished_at'] - created_at).total_seconds(), status=update['status'])
+        for listener in self.listeners:
+            try:
+                await listener(job | update)
+            except Exception:
+                logger.exception(f"Submission queue listener failed for job {job['_id']}")
+
+    async def _worker(self, number):
+        while True:
+            try:
+                job = await self._dequeue()
+            except Exception as e:
+                logger.warning(f"Submission queue worker {number} could not dequeue: {e!r}")
+                await asyncio.sleep(1)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # other processes may enqueue too, so look again now and then
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.recovery_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            with tracer.span('submission job', trace_id=job.get('trace_id'), job_id=job['_id']):
+                await self._process(job)
+
+    async def _load_code(self, job):
+        if 'solution_code' in job: # embedded, or queued before sources were stored apart
+            return job['solution_code']
+        code = await self.source_store.get(job['source_hash']) if self.source_store is not None else None
+        if code is None:
+            raise SubmissionQueueException(f"Source {job['source_hash']} of job {job['_id']} is missing")
+        return code
+
+    async def _process(self, job):
+        if job['attempts'] > self.max_attempts:
+            # its earlier attempts never acknowledged it, e.g. they took their worker down with them
+            await self._finish(job, {'status': SubmissionQueue.FAILED,
+                                     'error': job.get('error') or f"gave up after {self.max_attempts} attempts"})
+            logger.warning(f"Submission job {job['_id']} dequeued {self.max_attempts} times without finishing, failed")
+            return
+        # submitting can wait for an account far longer than lease_seconds
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        try:
+            code = await self._load_code(job)
+            submission_url = await self.submit(job['problem_url'], code, dedup=job.get('dedup', True),
+                                               digest=job.get('source_hash'))
+        except asyncio.CancelledError:
+            raise # lease expires and the job gets recovered
+        except Exception as e:
+            logger.exception(f"Submission job {job['_id']} failed")
+            if job['attempts'] >= self.max_attempts or isinstance(e, PERMANENT_ERRORS):
+                await self._finish(job, {'status': SubmissionQueue.FAILED, 'error': repr(e)})
+            else:
+                await self._requeue(job, repr(e))
+            return
+        finally:
+            heartbeat.cancel()
+
+        if submission_url is None:
+            await self._finish(job, {'status': SubmissionQueue.FAILED, 'error': "oj.uz did not accept the submission"})
+        else:
+            await self._finish(job, {'status': SubmissionQueue.DONE, 'submission_url': str(submission_url),
+                                     'submission_id': str(submission_url).rstrip('/').split('/')[-1]})
+        logger.debug("Submission job %s finished: %s", job['_id'], submission_url)
+
+    def stats(self):
+        return {'pending': self.pending, 'max_pending': self.max_pending, 'workers': self.workers}
@@ -1,5 +1,6 @@
 import motor.motor_asyncio as aiomotor
 import asyncio
+from server.db import SlowQueryLogger
 
 class ServerException(Exception):
     pass
@@ -11,7 +12,8 @@ async def init_mongo(mongo_config, loop):
     mongo_uri = "mongodb://{}:{}".format(mongo_config['host'], mongo_config['port'])
     conn = aiomotor.AsyncIOMotorClient(
         mongo_uri,
-        maxPoolSize=mongo_config['max_pool_size'],
+        maxPoolSize=int(mongo_config['max_pool_size']),
+        event_listeners=[SlowQueryLogger(int(mongo_config.get('slow_query_ms', 100)))],
         io_loop=loop
     )
     db_name = mongo_config['database']
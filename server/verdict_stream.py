@@ -0,0 +1,213 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from aiohttp import web, WSMsgType
+from ojuzmanager.OjuzManager import OjuzManager
+from ojuzmanager.VerdictTracker import is_final_summary
+from ojuzmanager.Metrics import registry
+from server import debug
+
+logger = logging.getLogger("server.verdict_stream")
+logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+class VerdictHub:
+    """
+    Fans out verdict changes to browsers.
+    Subscribers listen on topics ('submission:<id>'); the hub registers a single
+    VerdictTracker callback per submission no matter how many browsers watch it,
+    and only pushes the fields of the summary that changed.
+    """
+
+    def __init__(self, ojuz: OjuzManager, queue_size=256) -> None:
+        self.ojuz = ojuz
+        self.queue_size = queue_size
+        self.subscribers: dict[str, set[asyncio.Queue]] = {}
+        self.summaries: dict[str, dict] = {} # last summary pushed per submission
+        self.dropped_events: int = 0
+        registry.gauge('vc_verdict_subscribers', "Browser queues subscribed to verdict topics",
+                       function=lambda: sum(len(queues) for queues in self.subscribers.values()))
+        registry.counter('vc_verdict_dropped_events_total', "Verdict events dropped for stalled browsers",
+                         function=lambda: self.dropped_events)
+
+    def new_queue(self) -> asyncio.Queue:
+        return asyncio.Queue(self.queue_size)
+
+    def subscribe(self, topic, queue):
+        self.subscribers.setdefault(topic, set()).add(queue)
+
+    def unsubscribe(self, topic, queue):
+        queues = self.subscribers.get(topic)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[topic]
+            if topic.startswith('submission:'):
+                submission_id = topic.split(':', 1)[1]
+                self.ojuz.verdict_tracker.remove_callback(submission_id, self._on_summary)
+                self.summaries.pop(submission_id, None)
+
+    def subscribe_submission(self, submission_id, queue):
+        submission_id = str(submission_id)
+        topic = f'submission:{submission_id}'
+        first = topic not in self.subscribers
+        self.subscribe(topic, queue)
+
+        summary = self.summaries.get(submission_id)
+        if summary is not None:
+            self._put(queue, self._event(submission_id, summary, summary))
+        if not is_final_summary(summary) and (first or submission_id not in self.ojuz.verdict_tracker.tracked):
+            self.ojuz.verdict_tracker.add_callback(submission_id, self._on_summary)
+
+    def publish(self, topic, event):
+        for queue in self.subscribers.get(topic, ()):
+            self._put(queue, event)
+
+    def _put(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a stalled browser must not hold memory or slow down the others
+            self.dropped_events += 1
+
+    @staticmethod
+    def _event(submission_id, summary, delta):
+        return {
+            'type': 'verdict',
+            'submission_id': submission_id,
+            'score': summary.get('score'),
+            'full_score': summary.get('full_score'),
+            'text': summary.get('text'),
+            'final': is_final_summary(summary),
+            'delta': delta,
+        }
+
+    async def _on_summary(self, submission_id, summary):
+        if summary is None:
+            return # the tracker gave up on it, the next browser subscribing asks for it again
+        previous = self.summaries.get(submission_id) or {}
+        delta = {key: value for key, value in summary.items() if previous.get(key) != value}
+        self.summaries[submission_id] = summary
+        if delta:
+            self.publish(f'submission:{submission_id}', self._event(submission_id, summary, delta))
+
+    def stats(self):
+        return {
+            'topics': len(self.subscribers),
+            'subscribers': sum(len(queues) for queues in self.subscribers.values()),
+            'dropped_events': self.dropped_events,
+        }
+
+
+class VerdictStreamHandler:
+    """WebSocket and Server-Sent Events endpoints on top of VerdictHub"""
+
+    def __init__(self, hub: VerdictHub) -> None:
+        self.hub = hub
+
+    def _subscribe_all(self, queue, topics, submission_ids, contest_ids):
+        for submission_id in submission_ids:
+            self.hub.subscribe_submission(submission_id, queue)
+            topics.add(f'submission:{submission_id}')
+        for contest_id in contest_ids:
+            self.hub.subscribe(f'contest:{contest_id}', queue)
+            topics.add(f'contest:{contest_id}')
+
+    def _unsubscribe_all(self, queue, topics):
+        for topic in topics:
+            self.hub.unsubscribe(topic, queue)
+        topics.clear()
+
+    @staticmethod
+    def _command_ids(command, action):
+        """return (tuple or None): (submission ids, contest ids) of a websocket command, None if it has no `action`"""
+
+        if not isinstance(command, dict):
+            raise ValueError("messages must be JSON objects")
+        if action not in command:
+            return None
+        ids = command[action]
+        if not isinstance(ids, dict):
+            raise ValueError(f'"{action}" must be an object with "submissions" and "contests" lists')
+        lists = (ids.get('submissions', []), ids.get('contests', []))
+        for values in lists:
+            if not isinstance(values, list) or not all(isinstance(value, (str, int)) for value in values):
+                raise ValueError(f'"{action}" submissions and contests must be lists of ids')
+        return tuple([str(value) for value in values] for values in lists)
+
+    async def websocket(self, request):
+        """Clients send {"subscribe": {"submissions": [...], "contests": [...]}} or the same with
+        "unsubscribe", and receive one JSON message per verdict change"""
+
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = self.hub.new_queue()
+        topics: set[str] = set()
+
+        async def pump():
+            try:
+                while True:
+                    await ws.send_json(await queue.get())
+            except Exception:
+                await ws.close() # ends the receive loop below
+                raise
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    command = json.loads(message.data)
+                except ValueError:
+                    await ws.send_json({'type': 'error', 'error': "messages must be JSON"})
+                    continue
+                try:
+                    subscribe = self._command_ids(command, 'subscribe')
+                    unsubscribe = self._command_ids(command, 'unsubscribe')
+                except ValueError as e:
+                    await ws.send_json({'type': 'error', 'error': str(e)})
+                    continue
+                if subscribe is not None:
+                    self._subscribe_all(queue, topics, *subscribe)
+                if unsubscribe is not None:
+                    unsubscribed = {f'submission:{s}' for s in unsubscribe[0]} | {f'contest:{c}' for c in unsubscribe[1]}
+                    for topic in unsubscribed & topics:
+                        self.hub.unsubscribe(topic, queue)
+                    topics -= unsubscribed
+        finally:
+            pump_task.cancel()
+            self._unsubscribe_all(queue, topics)
+            [error] = await asyncio.gather(pump_task, return_exceptions=True)
+            if isinstance(error, ConnectionResetError):
+                logger.debug("Verdict websocket closed while sending: %r", error)
+            elif isinstance(error, Exception):
+                logger.warning(f"Verdict websocket failed to send: {error!r}")
+        return ws
+
+    async def server_sent_events(self, request):
+        """GET /events/verdicts?submission=1&submission=2&contest=abc, one SSE event per verdict change"""
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+        queue = self.hub.new_queue()
+        topics: set[str] = set()
+        self._subscribe_all(queue, topics, request.query.getall('submission', []), request.query.getall('contest', []))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n") # stops proxies from closing idle streams
+                    continue
+                await response.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+        except ConnectionResetError:
+            pass
+        finally:
+            self._unsubscribe_all(queue, topics)
+        return response
@@ -0,0 +1,10 @@
+import sys
+import types
+
+# ojuzmanager imports the credentials of ojuzmanager/accounts.py, which is not part of the repository
+try:
+    import ojuzmanager.accounts # noqa: F401
+except ImportError:
+    accounts = types.ModuleType('ojuzmanager.accounts')
+    accounts.ojuz_accounts = []
+    sys.modules['ojuzmanager.accounts'] = accounts
@@ -0,0 +1,153 @@
+"""
+In-memory stand-in for the few AsyncIOMotorCollection methods the tested components use.
+Supports equality, $lt/$lte/$gt/$gte/$in/$ne/$exists and top-level $or in queries,
+$set/$setOnInsert/$inc/$unset in updates.
+"""
+import copy
+from types import SimpleNamespace
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+_COMPARISONS = {
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$in': lambda value, operand: value in operand,
+    '$ne': lambda value, operand: value != operand,
+}
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(key)
+        if isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            for op, operand in condition.items():
+                if op == '$exists':
+                    if (key in document) != operand:
+                        return False
+                elif not _COMPARISONS[op](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _apply(document, update, inserting):
+    for key, value in update.get('$set', {}).items():
+        document[key] = copy.deepcopy(value)
+    if inserting:
+        for key, value in update.get('$setOnInsert', {}).items():
+            document[key] = copy.deepcopy(value)
+    for key, value in update.get('$inc', {}).items():
+        document[key] = document.get(key, 0) + value
+    for key in update.get('$unset', {}):
+        document.pop(key, None)
+
+
+def _project(document, projection):
+    if document is None:
+        return None
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    if any(projection.get(key) for key in projection if key != '_id'):
+        kept = {key: value for key, value in document.items() if projection.get(key)}
+        if projection.get('_id', 1):
+            kept['_id'] = document['_id']
+        return kept
+    return {key: value for key, value in document.items() if projection.get(key, 1)}
+
+
+class FakeCollection:
+
+    def __init__(self, name='fake') -> None:
+        self.name = name
+        self.documents: dict = {}
+        self.down = False # every call raises while True
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("mongo is down")
+
+    def _find(self, query, sort=None):
+        found = [document for document in self.documents.values() if matches(document, query)]
+        for key, direction in reversed(sort or []):
+            found.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        return found
+
+    def _upsert(self, query, update):
+        document = {key: value for key, value in query.items() if not key.startswith('$') and
+                    not (isinstance(value, dict) and any(op.startswith('$') for op in value))}
+        if document.get('_id') in self.documents:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        _apply(document, update, inserting=True)
+        self.documents[document['_id']] = document
+        return document
+
+    async def insert_one(self, document):
+        self._check()
+        if document['_id'] in self.documents:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        self.documents[document['_id']] = copy.deepcopy(document)
+        return SimpleNamespace(inserted_id=document['_id'])
+
+    async def find_one(self, query, projection=None):
+        self._check()
+        found = self._find(query)
+        return _project(found[0], projection) if found else None
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE):
+        self._check()
+        found = self._find(query, sort)
+        if not found:
+            if not upsert:
+                return None
+            document = self._upsert(query, update)
+            return _project(document, projection) if return_document == ReturnDocument.AFTER else None
+        document = found[0]
+        before = copy.deepcopy(document)
+        _apply(document, update, inserting=False)
+        return _project(document if return_document == ReturnDocument.AFTER else before, projection)
+
+    async def update_one(self, query, update, upsert=False):
+        self._check()
+        found = self._find(query)
+        if found:
+            _apply(found[0], update, inserting=False)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=self._upsert(query, update)['_id'])
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update):
+        self._check()
+        found = self._find(query)
+        for document in found:
+            _apply(document, update, inserting=False)
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found))
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self._check()
+        found = self._find(query)
+        if found or upsert:
+            document = copy.deepcopy(replacement)
+            document['_id'] = found[0]['_id'] if found else query['_id']
+            self.documents[document['_id']] = document
+        return SimpleNamespace(matched_count=len(found[:1]))
+
+    async def delete_one(self, query):
+        self._check()
+        found = self._find(query)
+        if found:
+            del self.documents[found[0]['_id']]
+        return SimpleNamespace(deleted_count=len(found[:1]))
+
+    async def count_documents(self, query):
+        self._check()
+        return len(self._find(query))
@@ -0,0 +1,57 @@
+import asyncio
+from ojuzmanager.AccountScheduler import AccountScheduler
+from ojuzmanager.OjuzManager import OjuzManager
+
+
+class HangingSession:
+    def __init__(self, username):
+        self.username = username
+
+    async def submit_solution(self, *args, **kwargs):
+        await asyncio.sleep(3600)
+
+
+class HangingLimiter:
+    async def acquire(self, username):
+        await asyncio.sleep(3600)
+
+
+async def cancel_soon(coroutine):
+    task = asyncio.create_task(coroutine)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def scheduler():
+    scheduler = AccountScheduler(submits_per_minute=600, burst=10, max_in_flight=1)
+    scheduler.add_session(HangingSession('a'))
+    return scheduler
+
+
+def test_cancelled_submission_releases_its_account():
+    manager = OjuzManager.__new__(OjuzManager) # only _submit's state
+    manager.solution_number = 0
+    manager.scheduler = scheduler()
+
+    async def main():
+        for _ in range(3):
+            await cancel_soon(manager._submit("https://oj.uz/problem/view/X", "code"))
+
+    asyncio.run(main())
+    account = manager.scheduler.accounts['a']
+    assert account.in_flight == 0
+    assert account.consecutive_failures == 0
+
+
+def test_acquire_cancelled_in_shared_limiter_gives_the_slot_back():
+    account_scheduler = scheduler()
+    account_scheduler.shared_limiter = HangingLimiter()
+
+    async def main():
+        for _ in range(3):
+            await cancel_soon(account_scheduler.acquire())
+
+    asyncio.run(main())
+    account = account_scheduler.accounts['a']
+    assert (account.in_flight, account.submits) == (0, 0)
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import timedelta
+from fake_mongo import FakeCollection
+from ojuzmanager.Coordination import MongoLease
+
+
+def test_a_lease_has_one_owner_until_released():
+    async def scenario():
+        collection = FakeCollection('leases')
+        first, second = MongoLease(collection, 'host:1'), MongoLease(collection, 'host:2')
+        taken = await first.acquire('contest:a'), await second.acquire('contest:a')
+        renewed = await first.acquire('contest:a')
+        owner = await second.owner_of('contest:a')
+        await second.release('contest:a') # not its lease, nothing happens
+        still_owned = await first.owner_of('contest:a')
+        await first.release('contest:a')
+        return taken, renewed, owner, still_owned, await second.acquire('contest:a')
+
+    taken, renewed, owner, still_owned, after_release = asyncio.run(scenario())
+    assert taken == (True, False) and renewed
+    assert owner == still_owned == 'host:1'
+    assert after_release
+
+
+def test_an_expired_lease_is_taken_over():
+    async def scenario():
+        collection = FakeCollection('leases')
+        dead, alive = MongoLease(collection, 'host:1', ttl=30), MongoLease(collection, 'host:2', ttl=30)
+        await dead.acquire('login:ana')
+        collection.documents['login:ana']['expires_at'] -= timedelta(seconds=31) # host:1 stopped renewing
+        owner = await alive.owner_of('login:ana')
+        return owner, await alive.acquire('login:ana'), await dead.acquire('login:ana'), await alive.owner_of('login:ana')
+
+    owner, taken_over, dead_again, new_owner = asyncio.run(scenario())
+    assert owner is None
+    assert taken_over and not dead_again
+    assert new_owner == 'host:2'
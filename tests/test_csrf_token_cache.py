@@ -0,0 +1,83 @@
+import asyncio
+from ojuzmanager.CsrfTokenCache import CsrfTokenCache
+
+
+class FakeTokens:
+    """fetch_token returning token-1, token-2... after `delay` seconds"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.downloads = 0
+
+    async def __call__(self, url):
+        self.downloads += 1
+        token = f'token-{self.downloads}'
+        await asyncio.sleep(self.delay)
+        return token
+
+
+def test_concurrent_misses_share_one_download():
+    async def scenario():
+        fetch = FakeTokens(delay=0.01)
+        cache = CsrfTokenCache(fetch)
+        tokens = await asyncio.gather(*[cache.get("/login") for _ in range(5)])
+        return fetch, cache, tokens
+
+    fetch, cache, tokens = asyncio.run(scenario())
+    assert tokens == ['token-1'] * 5
+    assert fetch.downloads == 1 and cache.misses == 5
+
+
+def test_cached_token_is_reused_until_invalidated():
+    async def scenario():
+        fetch = FakeTokens()
+        cache = CsrfTokenCache(fetch)
+        first, second = await cache.get("/login"), await cache.get("/login")
+        cache.invalidate()
+        return fetch, cache, (first, second, await cache.get("/login"))
+
+    fetch, cache, tokens = asyncio.run(scenario())
+    assert tokens == ('token-1', 'token-1', 'token-2')
+    assert cache.hits == 1 and cache.invalidations == 1
+
+
+def test_expiring_token_is_refreshed_in_the_background():
+    async def scenario():
+        fetch = FakeTokens()
+        cache = CsrfTokenCache(fetch, ttl=10, refresh_margin=10)
+        first = await cache.get("/login")
+        second = await cache.get("/login") # within ttl but inside the refresh margin
+        await asyncio.sleep(0.01)
+        return cache, (first, second, cache.token)
+
+    cache, tokens = asyncio.run(scenario())
+    assert tokens == ('token-1', 'token-1', 'token-2')
+    assert cache.refreshes == 1
+
+
+def test_download_started_before_invalidate_is_not_cached():
+    async def scenario():
+        fetch = FakeTokens(delay=0.02)
+        cache = CsrfTokenCache(fetch)
+        stale = asyncio.create_task(cache.get("/login"))
+        await asyncio.sleep(0.005)
+        cache.invalidate() # e.g. the session logged in meanwhile
+        fresh = await cache.get("/login")
+        return cache, await stale, fresh
+
+    cache, stale, fresh = asyncio.run(scenario())
+    assert stale == 'token-1'
+    assert fresh == 'token-2' and cache.token == 'token-2'
+
+
+def test_background_refresh_does_not_overwrite_a_set_token():
+    async def scenario():
+        fetch = FakeTokens(delay=0.01)
+        cache = CsrfTokenCache(fetch, ttl=10, refresh_margin=10)
+        cache.set('probed')
+        await cache.get("/login") # starts a background refresh
+        cache.set('logged-in')
+        await asyncio.sleep(0.02)
+        return cache
+
+    assert asyncio.run(scenario()).token == 'logged-in'
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from server.db import BulkWriter, SlowQueryLogger
+
+
+class FakeCollection:
+    name = 'contest_submissions'
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo is down")
+        self.batches.append((list(operations), ordered))
+
+
+def test_batches_are_ordered():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BulkWriter(collection, interval=0.01)
+        writer.update_one({'_id': '1'}, {'$set': {'text': "Compiling"}}, upsert=True)
+        writer.update_one({'_id': '1'}, {'$set': {'final': True, 'score': 100}})
+        await writer.close()
+        return collection
+
+    collection = asyncio.run(scenario())
+    [(operations, ordered)] = collection.batches
+    assert ordered
+    assert [op._doc['$set'] for op in operations] == [{'text': "Compiling"}, {'final': True, 'score': 100}]
+
+
+def test_failed_batch_is_retried_on_its_own_with_older_operations_first():
+    async def scenario():
+        collection = FakeCollection(failures=2)
+        writer = BulkWriter(collection, interval=0.01)
+        writer.update_one({'_id': '1'}, {'$set': {'text': "Evaluating"}})
+        await asyncio.sleep(0.02)
+        writer.update_one({'_id': '1'}, {'$set': {'final': True}})
+        # no further update_one, the retry timer alone has to deliver both
+        await asyncio.sleep(0.2)
+        return collection, writer
+
+    collection, writer = asyncio.run(scenario())
+    assert writer.failures == 0 and not writer.operations
+    [(operations, _)] = collection.batches
+    assert [op._doc['$set'] for op in operations] == [{'text': "Evaluating"}, {'final': True}]
+
+
+def test_pending_operations_are_capped():
+    async def scenario():
+        writer = BulkWriter(FakeCollection(failures=100), interval=10, max_pending=3)
+        for i in range(5):
+            writer.update_one({'_id': str(i)}, {'$set': {'score': i}})
+        await writer.flush()
+        writer._closed = True
+        writer._flush_task.cancel()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.dropped == 2
+    assert [op._filter['_id'] for op in writer.operations] == ['2', '3', '4']
+
+
+def failed_event(code):
+    return SimpleNamespace(command_name='findAndModify', duration_micros=1500,
+                           failure={'ok': 0, 'code': code, 'errmsg': "E11000 duplicate key error"})
+
+
+def test_duplicate_keys_are_not_warned_about(caplog):
+    with caplog.at_level(logging.DEBUG, logger='server.db'):
+        SlowQueryLogger().failed(failed_event(11000))
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+
+
+def test_other_failures_are_warned_about(caplog):
+    with caplog.at_level(logging.DEBUG, logger='server.db'):
+        SlowQueryLogger().failed(failed_event(50))
+    assert [record for record in caplog.records if record.levelno == logging.WARNING]
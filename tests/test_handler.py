@@ -0,0 +1,81 @@
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from server.handler import SiteHandler
+
+
+def test_contest_fields_defaults():
+    assert SiteHandler._contest_fields({'problems': ["https://oj.uz/problem/view/IOI18_combo"]}) == \
+        ('', ["https://oj.uz/problem/view/IOI18_combo"], None, 300.0, [])
+
+
+def test_contest_fields_parse_start_and_duration():
+    name, _, start, duration, participants = SiteHandler._contest_fields(
+        {'name': "Mock", 'start': "2026-01-01T10:00:00+00:00", 'duration_minutes': "90", 'participants': ["ana"]})
+    assert start == datetime.fromisoformat("2026-01-01T10:00:00+00:00")
+    assert (name, duration, participants) == ("Mock", 90.0, ["ana"])
+
+
+@pytest.mark.parametrize('form', [
+    [], "contest", None,
+    {'name': 5},
+    {'problems': "https://oj.uz/problem/view/IOI18_combo"},
+    {'problems': [{'url': 1}]},
+    {'participants': "ana"},
+    {'participants': [""]},
+    {'start': 5},
+    {'start': "yesterday"},
+    {'duration_minutes': None},
+    {'duration_minutes': [90]},
+    {'duration_minutes': {}},
+    {'duration_minutes': True},
+    {'duration_minutes': "long"},
+    {'duration_minutes': 0},
+    {'duration_minutes': -5},
+    {'duration_minutes': "nan"},
+    {'duration_minutes': 1e12},
+])
+def test_contest_fields_reject_invalid_bodies(form):
+    with pytest.raises(ValueError):
+        SiteHandler._contest_fields(form)
+
+
+class FakeOjuz:
+    def __init__(self):
+        self.closed = False
+
+    async def submit_many(self, solutions):
+        try:
+            for index, (problem_url, _) in enumerate(solutions):
+                yield {'index': index, 'problem_url': problem_url, 'submission_url': None, 'error': None}
+        finally:
+            self.closed = True
+
+
+def post_batch(body, ojuz=None):
+    async def scenario():
+        handler = SiteHandler(None, {'ojuz': ojuz or FakeOjuz()}, None, None, None)
+        app = web.Application()
+        app.router.add_post('/batch', handler.batch_submit_post)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post('/batch', data=body)
+            return response.status, await response.text()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('body', ['[]', '"submissions"', '{"submissions": {}}', '{"submissions": [1]}', 'not json'])
+def test_batch_rejects_invalid_bodies(body):
+    assert post_batch(body)[0] == 400
+
+
+def test_batch_streams_results_and_closes_the_generator():
+    ojuz = FakeOjuz()
+    status, text = post_batch(json.dumps({'submissions': [
+        {'problem_url': "https://oj.uz/problem/view/IOI18_combo", 'solution_code': "int main() {}"}]}), ojuz)
+    assert status == 200
+    assert [json.loads(line)['index'] for line in text.splitlines()] == [0]
+    assert ojuz.closed
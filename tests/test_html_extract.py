@@ -0,0 +1,148 @@
+import pytest
+from ojuzmanager import HtmlExtract
+from ojuzmanager.HtmlExtract import (available_backends, extract_element_by_id, extract_input_value,
+                                     extract_input_value_soup, parse_problem_page, parse_submission_details)
+
+TOKEN = "1660000000##0123456789abcdef"
+
+
+def form(*inputs):
+    return f'<html><body><form method="post">{"".join(inputs)}<button>Submit</button></form></body></html>'
+
+
+@pytest.mark.parametrize('tag', [
+    f'<input type="hidden" name="_token" value="{TOKEN}">',
+    f'<input value="{TOKEN}" type="hidden" name="_token">', # value before name
+    f"<input type='hidden' name='_token' value='{TOKEN}'>",
+    f'<input type=hidden name=_token value={TOKEN}>',
+    f'<input type="hidden" name="_token" value="{TOKEN}" />',
+    f'<INPUT TYPE="hidden" NAME="_token" VALUE="{TOKEN}">',
+    f'<input\n  type="hidden"\n  name = "_token"\n  value="{TOKEN}">',
+])
+def test_input_value_fast_path_matches_soup(tag, monkeypatch):
+    html = form('<input type="text" name="email" value="someone@example.com">', tag)
+    monkeypatch.setattr(HtmlExtract, 'extract_input_value_soup', lambda *args: pytest.fail("fell back to soup"))
+    assert extract_input_value(html, '_token') == TOKEN
+    assert extract_input_value_soup(html, '_token') == TOKEN
+
+
+def test_input_value_unescapes_entities():
+    html = form('<input type="hidden" name="_token" value="a&amp;b&quot;c&#39;d">')
+    assert extract_input_value(html, '_token') == extract_input_value_soup(html, '_token') == "a&b\"c'd"
+
+
+def test_input_value_ignores_names_sharing_a_prefix():
+    html = form('<input name="_token_old" value="old">', f'<input name="_token" value="{TOKEN}">')
+    assert extract_input_value(html, '_token') == TOKEN
+
+
+def test_input_value_falls_back_to_soup(monkeypatch):
+    # the regex stops at data-name, which is not the input's name
+    html = form('<input data-name="_token" value="decoy">', f'<input name="_token" value="{TOKEN}">')
+    calls = []
+
+    def soup(html, name):
+        calls.append(name)
+        return extract_input_value_soup(html, name)
+
+    monkeypatch.setattr(HtmlExtract, 'extract_input_value_soup', soup)
+    assert extract_input_value(html, '_token') == TOKEN
+    assert calls == ['_token']
+
+
+def subtask_panel(number, verdict, score, full, rows):
+    rows = ''.join(f'<tr><td>{test}</td><td><span class="label">{test_verdict}</span></td><td>{time}</td>'
+                   f'<td>{memory}</td><td>{test_verdict}</td></tr>' for test, test_verdict, time, memory in rows)
+    return (f'<div class="panel panel-default subtask"><div class="panel-heading">'
+            f'<h3 class="panel-title">Subtask #{number} <span class="label">{verdict}</span>'
+            f'<span class="subtask-score">{score} / {full}</span></h3></div>'
+            f'<table class="table"><thead><tr><th>#</th><th>Verdict</th><th>Execution time</th><th>Memory</th>'
+            f'<th>Grader output</th></tr></thead><tbody>{rows}</tbody></table></div>')
+
+
+def submission_page(details):
+    return (f'<html><body><table class="table"><tr><th>Submission #1</th></tr></table>'
+            f'<div id="submission_details">{details}</div></body></html>')
+
+
+FINAL_PAGE = submission_page(
+    subtask_panel(1, "Accepted", 30, 30, [(1, "Correct", "12 ms", "1024 KB"), (2, "Correct", "1.5 s", "2 MB")]) +
+    subtask_panel(2, "Wrong answer", 0, 70, [(1, "Correct", "900 ms", "512 KB"), (2, "Wrong answer", "3 ms", "256")]))
+
+PENDING_PAGE = submission_page(
+    subtask_panel(1, "Accepted", 30, 30, [(1, "Correct", "12 ms", "1024 KB")]) +
+    subtask_panel(2, "Running", 0, 70, [(1, "Correct", "5 ms", "512 KB"), (2, "Running", "", "")]))
+
+
+def test_final_details():
+    details = parse_submission_details(FINAL_PAGE)
+    assert details['final']
+    assert details['verdict'] == "Wrong answer"
+    assert (details['score'], details['full_score']) == (30, 100)
+    assert [subtask['subtask'] for subtask in details['subtasks']] == [1, 2]
+    assert details['subtasks'][1]['verdict'] == "Wrong answer"
+    assert len(details['subtasks'][0]['tests']) == 2
+
+
+def test_pending_details_are_not_final():
+    details = parse_submission_details(PENDING_PAGE)
+    assert not details['final']
+    assert details['verdict'] == "Pending"
+    running = details['subtasks'][1]['tests'][1]
+    assert running['verdict'] == "Running"
+    assert running['time_ms'] is None and running['memory_kb'] is None
+
+
+def test_details_units():
+    tests = [test for subtask in parse_submission_details(FINAL_PAGE)['subtasks'] for test in subtask['tests']]
+    assert [test['time_ms'] for test in tests] == [12, 1500, 900, 3]
+    assert [test['memory_kb'] for test in tests] == [1024, 2048, 512, 256] # bare numbers are KB
+    details = parse_submission_details(FINAL_PAGE)
+    assert (details['max_time_ms'], details['max_memory_kb']) == (1500, 2048)
+
+
+def test_details_without_subtask_headings():
+    rows = ''.join(f'<tr><td>{test}</td><td>Correct</td><td>{test} ms</td><td>100 KB</td></tr>' for test in (1, 2, 3))
+    page = submission_page(f'<table><tr><th>#</th><th>Verdict</th><th>Time</th><th>Memory</th></tr>{rows}</table>')
+    details = parse_submission_details(page)
+    assert len(details['subtasks']) == 1
+    assert [test['test'] for test in details['subtasks'][0]['tests']] == [1, 2, 3]
+    assert details['verdict'] == "Accepted"
+    assert details['score'] is None
+    assert details['final']
+
+
+def test_empty_details_are_not_final():
+    details = parse_submission_details(submission_page(''))
+    assert details['subtasks'] == [] and not details['final']
+
+
+def test_page_without_details():
+    assert parse_submission_details('<html><body><p>Compiling</p></body></html>') is None
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_backends_agree(backend):
+    assert parse_submission_details(extract_element_by_id(FINAL_PAGE, 'submission_details', backend)) == \
+        parse_submission_details(FINAL_PAGE)
+
+
+def test_problem_page_with_limit_and_subtask_tables():
+    page = ('<html><body><h1> Combo </h1><table><tr><td>Time limit</td><td>2 s</td></tr>'
+            '<tr><td>Memory limit</td><td>512 MB</td></tr></table>'
+            '<table><tr><th>Subtask</th><th>Points</th></tr><tr><td>1</td><td>10</td></tr>'
+            '<tr><td>2</td><td>90 points</td></tr></table></body></html>')
+    assert parse_problem_page(page) == {'title': "Combo", 'time_limit_ms': 2000, 'memory_limit_kb': 524288,
+                                        'subtasks': [{'subtask': 1, 'points': 10}, {'subtask': 2, 'points': 90}]}
+
+
+def test_problem_page_with_limits_in_text():
+    page = ('<html><body><h2>Interference</h2><script>var limit = "Time limit: 9 s";</script>'
+            '<p>Time limit: 1500 ms</p><p>Memory limit: 256 MB</p></body></html>')
+    metadata = parse_problem_page(page)
+    assert (metadata['title'], metadata['time_limit_ms'], metadata['memory_limit_kb']) == ("Interference", 1500, 262144)
+    assert metadata['subtasks'] == []
+
+
+def test_problem_page_without_heading():
+    assert parse_problem_page('<html><body><p>Problem list</p></body></html>') is None
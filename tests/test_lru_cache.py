@@ -0,0 +1,33 @@
+from ojuzmanager.LruCache import LruCache
+
+
+def test_evicts_least_recently_used():
+    cache = LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert list(cache) == ['a', 'c']
+
+
+def test_put_refreshes_existing_key():
+    cache = LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('a', 10)
+    cache.put('c', 3)
+    assert dict(cache) == {'a': 10, 'c': 3}
+
+
+def test_missing_key():
+    assert LruCache(1).get('a') is None
+    assert LruCache(1).get('a', 0) == 0
+
+
+def test_membership_does_not_count_as_use():
+    cache = LruCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert 'a' in cache and cache['a'] == 1
+    cache.put('c', 3)
+    assert list(cache) == ['b', 'c']
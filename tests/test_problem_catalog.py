@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from ojuzmanager.ProblemCatalog import ProblemCatalog, ProblemCatalogException, problem_id_from_url
+
+METADATA = {'title': "Combo", 'time_limit_ms': 2000, 'memory_limit_kb': 524288, 'subtasks': []}
+
+
+def page(status, metadata=None, location=None):
+    return {'status': status, 'metadata': metadata, 'location': location, 'etag': None, 'last_modified': None}
+
+
+def lookup(answer, problem='IOI18_combo'):
+    async def fetch_page(problem_id, etag, last_modified):
+        return answer
+
+    return asyncio.run(ProblemCatalog(fetch_page).get(problem))
+
+
+def test_parsed_page_exists_with_metadata():
+    entry = lookup(page(200, METADATA))
+    assert entry['exists'] and entry['title'] == "Combo"
+
+
+def test_unparseable_page_still_exists():
+    entry = lookup(page(200))
+    assert entry['exists']
+    assert entry['title'] is None and entry['subtasks'] == []
+
+
+def test_not_found_does_not_exist():
+    assert not lookup(page(404))['exists']
+
+
+def test_redirect_away_does_not_exist():
+    assert not lookup(page(302, location="https://oj.uz/problems/search"))['exists']
+
+
+def test_redirect_to_the_same_problem_exists():
+    assert lookup(page(301, location="https://oj.uz/problem/view/IOI18_combo"))['exists']
+
+
+def test_server_error_is_raised():
+    with pytest.raises(ProblemCatalogException):
+        lookup(page(503))
+
+
+def test_unknown_metadata_is_revalidated_like_missing_problems():
+    async def fetch_page(problem_id, etag, last_modified):
+        return page(200)
+
+    catalog = ProblemCatalog(fetch_page, ttl=3600, missing_ttl=-1)
+    entry = asyncio.run(catalog.get('IOI18_combo'))
+    assert catalog._stale(entry)
+
+
+@pytest.mark.parametrize('url', [
+    "https://oj.uz/problem/view/IOI18_combo",
+    "http://oj.uz/problem/view/IOI18_combo",
+    "https://www.oj.uz/problem/view/IOI18_combo/",
+    "oj.uz/problem/view/IOI18_combo",
+    " HTTPS://OJ.UZ/problem/submit/IOI18_combo?tab=1",
+])
+def test_problem_urls_of_the_site(url):
+    assert problem_id_from_url(url, "https://oj.uz") == 'IOI18_combo'
+
+
+@pytest.mark.parametrize('url', [
+    "https://oj.uz.example.com/problem/view/IOI18_combo",
+    "https://example.com/problem/view/IOI18_combo",
+    "https://oj.uz:8080/problem/view/IOI18_combo",
+    "https://oj.uz/problem/view/",
+    "https://oj.uz/submission/101",
+])
+def test_urls_of_other_sites_or_pages(url):
+    assert problem_id_from_url(url, "https://oj.uz") is None
@@ -0,0 +1,116 @@
+import asyncio
+import aiohttp
+import pytest
+from ojuzmanager.ReadPool import ReadPool, ReadPoolException
+
+
+class FakeSession:
+    def __init__(self, username, errors=(), delay=0.0):
+        self.username = username
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def get_submission_summary(self, submission_id):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            return {'session': self.username, 'submission_id': submission_id}
+        finally:
+            self.in_flight -= 1
+
+
+def response_error(status):
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+def make_pool(*sessions, **options):
+    pool = ReadPool(**options)
+    for session in sessions:
+        pool.add_session(session)
+    return pool
+
+
+def test_reads_go_to_the_least_loaded_session():
+    async def scenario():
+        sessions = [FakeSession('ana', delay=0.02), FakeSession('anonymous-1', delay=0.02)]
+        pool = make_pool(*sessions, max_in_flight=2)
+        await asyncio.gather(*[pool.call('get_submission_summary', i) for i in range(4)])
+        return sessions
+
+    ana, anonymous = asyncio.run(scenario())
+    assert ana.calls == anonymous.calls == 2
+    assert ana.peak == anonymous.peak == 2
+
+
+def test_reads_wait_for_a_free_slot():
+    async def scenario():
+        session = FakeSession('ana', delay=0.01)
+        pool = make_pool(session, max_in_flight=1)
+        results = await asyncio.gather(*[pool.call('get_submission_summary', i) for i in range(3)])
+        return session, pool, results
+
+    session, pool, results = asyncio.run(scenario())
+    assert session.peak == 1 and [result['submission_id'] for result in results] == [0, 1, 2]
+    assert pool.states['ana'].in_flight == 0
+
+
+@pytest.mark.parametrize('error', [aiohttp.ClientConnectionError("reset"), asyncio.TimeoutError(), response_error(502)])
+def test_failing_session_is_cooled_down_and_the_read_moves_on(error):
+    async def scenario():
+        broken, healthy = FakeSession('ana', errors=[error]), FakeSession('bob')
+        pool = make_pool(broken, healthy)
+        pool.states['bob'].last_used = 1.0 # ana is picked first
+        first = await pool.call('get_submission_summary', 1)
+        second = await pool.call('get_submission_summary', 2)
+        return pool, first, second
+
+    pool, first, second = asyncio.run(scenario())
+    assert first['session'] == second['session'] == 'bob' # ana is cooling down
+    assert pool.stats()['ana']['cooling_down'] and pool.states['ana'].failures == 1
+
+
+def test_not_found_is_not_retried_elsewhere():
+    async def scenario():
+        first, second = FakeSession('ana', errors=[response_error(404)]), FakeSession('bob')
+        pool = make_pool(first, second)
+        pool.states['bob'].last_used = 1.0
+        with pytest.raises(aiohttp.ClientResponseError):
+            await pool.call('get_submission_summary', 1)
+        return pool, second
+
+    pool, second = asyncio.run(scenario())
+    assert second.calls == 0 and pool.states['ana'].consecutive_failures == 0
+
+
+def test_last_error_is_raised_when_every_session_failed():
+    async def scenario():
+        pool = make_pool(FakeSession('ana', errors=[asyncio.TimeoutError()]),
+                         FakeSession('bob', errors=[aiohttp.ClientConnectionError("reset")]))
+        with pytest.raises((asyncio.TimeoutError, aiohttp.ClientConnectionError)):
+            await pool.call('get_submission_summary', 1)
+        with pytest.raises(ReadPoolException):
+            await ReadPool().call('get_submission_summary', 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_read_gives_its_slot_back():
+    async def scenario():
+        session = FakeSession('ana', delay=1)
+        pool = make_pool(session, max_in_flight=1)
+        read = asyncio.create_task(pool.call('get_submission_summary', 1))
+        await asyncio.sleep(0.01)
+        read.cancel()
+        await asyncio.gather(read, return_exceptions=True)
+        session.delay = 0
+        return pool, await asyncio.wait_for(pool.call('get_submission_summary', 2), 1)
+
+    pool, result = asyncio.run(scenario())
+    assert result['submission_id'] == 2 and pool.states['ana'].failures == 0
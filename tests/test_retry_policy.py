@@ -0,0 +1,279 @@
+import asyncio
+import time
+import pytest
+from ojuzmanager.RetryPolicy import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class Flaky(Exception):
+    pass
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def expire(breaker):
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker('test:threshold', failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.trips == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker('test:reset', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_a_single_trial_through():
+    breaker = CircuitBreaker('test:single_trial', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_trial_outcomes():
+    breaker = CircuitBreaker('test:outcomes', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    breaker.end_trial()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_trial_without_outcome_reopens_and_allows_next_trial():
+    breaker = CircuitBreaker('test:no_outcome', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.end_trial()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+
+
+def test_retries_until_success():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Flaky()
+        return 'ok'
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0, jitter=False)
+    assert asyncio.run(policy.call('test', func, retry_on=(Flaky,))) == 'ok'
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        raise Flaky()
+
+    policy = RetryPolicy(max_attempts=2, base_delay=0, jitter=False)
+    with pytest.raises(Flaky):
+        asyncio.run(policy.call('test', func, retry_on=(Flaky,)))
+    assert len(calls) == 2
+
+
+def test_other_exceptions_are_not_retried():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        raise KeyError()
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    with pytest.raises(KeyError):
+        asyncio.run(policy.call('test', func, retry_on=(Flaky,)))
+    assert len(calls) == 1
+
+
+def test_no_retry_past_deadline():
+    calls = []
+
+    async def func():
+        calls.append(1)
+        raise Flaky()
+
+    policy = RetryPolicy(max_attempts=10, base_delay=5, jitter=False, deadline=1)
+    with pytest.raises(Flaky):
+        asyncio.run(policy.call('test', func, retry_on=(Flaky,)))
+    assert len(calls) == 1
+
+
+def test_delay_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=3, multiplier=2, jitter=False)
+    assert [policy.delay(n) for n in (1, 2, 3, 4)] == [1, 2, 3, 3]
+
+
+def test_open_breaker_rejects_without_calling():
+    breaker = CircuitBreaker('test:rejects', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+
+    async def func():
+        raise AssertionError("must not be called")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(RetryPolicy().call('test', func, breakers=[breaker]))
+
+
+def test_policy_records_on_breakers():
+    breaker = CircuitBreaker('test:records', failure_threshold=2, reset_timeout=60)
+
+    async def func():
+        raise Flaky()
+
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    with pytest.raises(Flaky):
+        asyncio.run(policy.call('test', func, retry_on=(Flaky,), breakers=[breaker]))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_trial_success_closes_breaker():
+    breaker = CircuitBreaker('test:trial_success', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+
+    async def func():
+        return 'ok'
+
+    assert asyncio.run(RetryPolicy().call('test', func, breakers=[breaker])) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_rejects_concurrent_calls_during_trial():
+    breaker = CircuitBreaker('test:concurrent', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return 'trial'
+
+        policy = RetryPolicy()
+        trial = asyncio.create_task(policy.call('test', slow, breakers=[breaker]))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await policy.call('test', slow, breakers=[breaker])
+        release.set()
+        return await trial
+
+    assert asyncio.run(main()) == 'trial'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_trial_does_not_leave_breaker_half_open():
+    breaker = CircuitBreaker('test:cancelled', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+
+    async def main():
+        async def hang():
+            await asyncio.sleep(3600)
+
+        trial = asyncio.create_task(RetryPolicy().call('test', hang, breakers=[breaker]))
+        await asyncio.sleep(0)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        async def ok():
+            return 'ok'
+
+        return await RetryPolicy().call('test', ok, breakers=[breaker])
+
+    assert asyncio.run(main()) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_trial_with_unretried_error_reopens():
+    breaker = CircuitBreaker('test:unretried', failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    expire(breaker)
+
+    async def func():
+        raise KeyError()
+
+    with pytest.raises(KeyError):
+        asyncio.run(RetryPolicy().call('test', func, retry_on=(Flaky,), breakers=[breaker]))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() # the next call is the new trial
+
+
+def test_rejection_by_a_later_breaker_ends_the_trial_of_an_earlier_one():
+    half_open = CircuitBreaker('test:first', failure_threshold=1, reset_timeout=60)
+    trip(half_open)
+    expire(half_open)
+    open_ = CircuitBreaker('test:second', failure_threshold=1, reset_timeout=60)
+    trip(open_)
+
+    async def func():
+        raise AssertionError("must not be called")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(RetryPolicy().call('test', func, breakers=[half_open, open_]))
+    assert half_open.state == CircuitBreaker.OPEN
+    assert half_open.allow()
+
+
+def test_account_recovers_after_reset_timeout():
+    from yarl import URL
+    from ojuzmanager.OjuzSession import OjuzSession
+
+    class FakeResponse:
+        status = 302
+        url = URL("https://oj.uz/problem/submit/X")
+        headers = {'Location': "/submission/1"}
+
+        async def read(self):
+            return b''
+
+    class FakeClient:
+        closed = False
+
+        async def request(self, method, url, **kwargs):
+            return FakeResponse()
+
+    session = OjuzSession('test-recovery', 'password')
+    session.session = FakeClient()
+
+    async def submit_once(problem_url, raw_code, attempt_login):
+        req = await session._request('submit', 'POST', problem_url)
+        return str(req.url.join(URL(req.headers['Location'])))
+
+    session._submit_once = submit_once
+    trip(session.breaker)
+    expire(session.breaker)
+
+    url = asyncio.run(session.submit_solution("https://oj.uz/problem/view/X", "code"))
+    assert url == "https://oj.uz/submission/1"
+    assert session.breaker.state == CircuitBreaker.CLOSED
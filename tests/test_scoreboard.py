@@ -0,0 +1,65 @@
+import random
+import pytest
+from server.scoreboard import OrderStatisticTree, Scoreboard
+
+
+def test_tree_matches_a_sorted_list():
+    rng = random.Random(7)
+    tree, keys = OrderStatisticTree(), []
+    for _ in range(500):
+        key = rng.randrange(1000)
+        if key in keys:
+            tree.remove(key)
+            keys.remove(key)
+        else:
+            tree.insert(key)
+            keys.append(key)
+        keys.sort()
+        assert len(tree) == len(keys)
+    assert tree.first(len(keys) + 5) == keys
+    assert [tree.kth(k) for k in range(len(keys))] == keys
+    assert all(tree.rank(key) == index for index, key in enumerate(keys))
+
+
+def test_tree_missing_keys():
+    tree = OrderStatisticTree()
+    tree.insert(3)
+    with pytest.raises(KeyError):
+        tree.remove(4)
+    with pytest.raises(IndexError):
+        tree.kth(1)
+    assert tree.first(10) == [3]
+
+
+def test_best_score_per_problem_counts():
+    scoreboard = Scoreboard(2)
+    assert scoreboard.update('ana', 0, 40, 60)
+    assert not scoreboard.update('ana', 0, 30, 120) # not an improvement
+    assert not scoreboard.update('ana', 0, None, 180) # no score yet
+    assert scoreboard.update('ana', 0, 70, 240)
+    assert scoreboard.update('ana', 1, 100, 300)
+    row = scoreboard.row('ana')
+    assert row['scores'] == [70, 100] and row['total'] == 170 and row['penalty'] == 300
+
+
+def test_ranking_breaks_ties_by_last_improvement():
+    scoreboard = Scoreboard(2)
+    for participant in ('ana', 'bob', 'cid', 'dan'):
+        scoreboard.add_participant(participant)
+    scoreboard.update('bob', 0, 100, 500)
+    scoreboard.update('ana', 0, 100, 200)
+    scoreboard.update('cid', 1, 50, 100)
+    assert [row['participant'] for row in scoreboard.top(10)] == ['ana', 'bob', 'cid', 'dan']
+    assert [scoreboard.rank(p) for p in ('ana', 'bob', 'cid', 'dan')] == [1, 2, 3, 4]
+    scoreboard.update('cid', 0, 50, 600)
+    assert scoreboard.row('cid')['rank'] == 3 # 100 points, but improved last
+    assert scoreboard.top(2) == [scoreboard.row('ana'), scoreboard.row('bob')]
+    assert scoreboard.rank('eve') is None and len(scoreboard) == 4
+
+
+def test_equal_rows_share_a_rank():
+    scoreboard = Scoreboard(1)
+    scoreboard.update('ana', 0, 100, 60)
+    scoreboard.update('bob', 0, 100, 60)
+    scoreboard.add_participant('cid')
+    assert [scoreboard.rank(p) for p in ('ana', 'bob', 'cid')] == [1, 1, 3]
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import stat
+import aiohttp
+from fake_mongo import FakeCollection
+from ojuzmanager.SessionStore import FileSessionStore, MongoSessionStore, dump_cookie_jar
+from yarl import URL
+
+
+def logged_in_jar():
+    jar = aiohttp.CookieJar()
+    jar.update_cookies({'PHPSESSID': 'secret-session'}, URL("https://oj.uz/"))
+    return jar
+
+
+def cookies_of(jar):
+    return {name: morsel.value for name, morsel in jar.filter_cookies(URL("https://oj.uz/")).items()}
+
+
+def test_file_store_round_trip_is_private(tmp_path):
+    async def scenario():
+        store = FileSessionStore(str(tmp_path / 'sessions'))
+        await store.save('ana', logged_in_jar())
+        return await store.load('ana'), await store.load('bob')
+
+    jar, missing = asyncio.run(scenario())
+    assert cookies_of(jar) == {'PHPSESSID': 'secret-session'}
+    assert missing is None
+    assert stat.S_IMODE(os.stat(tmp_path / 'sessions' / 'ana.json').st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(tmp_path / 'sessions').st_mode) == 0o700
+
+
+def test_file_store_names_are_safe(tmp_path):
+    async def scenario():
+        await FileSessionStore(str(tmp_path)).save('../ana', logged_in_jar())
+
+    asyncio.run(scenario())
+    assert os.listdir(tmp_path) == ['.._ana.json']
+
+
+def test_leftover_temporary_file_is_made_private(tmp_path):
+    async def scenario():
+        (tmp_path / 'ana.json.tmp').write_text("[]")
+        os.chmod(tmp_path / 'ana.json.tmp', 0o644)
+        await FileSessionStore(str(tmp_path)).save('ana', logged_in_jar())
+
+    asyncio.run(scenario())
+    assert stat.S_IMODE(os.stat(tmp_path / 'ana.json').st_mode) == 0o600
+
+
+def test_mongo_store_round_trip():
+    async def scenario():
+        collection = FakeCollection('sessions')
+        store = MongoSessionStore(collection)
+        await store.save('ana', logged_in_jar())
+        await store.save('ana', logged_in_jar()) # replaced, not duplicated
+        return collection, await store.load('ana'), await store.load('bob')
+
+    collection, jar, missing = asyncio.run(scenario())
+    assert cookies_of(jar) == {'PHPSESSID': 'secret-session'} and missing is None
+    assert list(collection.documents) == ['ana']
+
+
+def test_dumped_cookies_are_plain_data():
+    async def scenario():
+        return dump_cookie_jar(logged_in_jar())
+
+    [cookie] = asyncio.run(scenario())
+    assert cookie['name'] == 'PHPSESSID' and cookie['value'] == 'secret-session'
+    assert all(isinstance(value, (str, bool, int)) for value in cookie.values())
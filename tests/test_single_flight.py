@@ -0,0 +1,82 @@
+import asyncio
+from ojuzmanager.SingleFlight import SingleFlight
+
+
+class FakeUpstream:
+    def __init__(self, delay=0.01, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, key):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'key': key, 'call': self.calls}
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight, upstream = SingleFlight('test-join', ttl=0), FakeUpstream()
+        results = await asyncio.gather(*[flight.do('s1', upstream, 's1') for _ in range(5)])
+        return flight, upstream, results
+
+    flight, upstream, results = asyncio.run(scenario())
+    assert upstream.calls == 1 and all(result is results[0] for result in results)
+    assert flight.stats() | {'dedup_ratio': None} == {'calls': 5, 'upstream_calls': 1, 'joined': 4, 'cache_hits': 0,
+                                                      'in_flight': 0, 'cached': 0, 'dedup_ratio': None}
+
+
+def test_results_are_cached_for_ttl_and_final_ttl():
+    async def scenario():
+        flight = SingleFlight('test-ttl', ttl=0.02, final_ttl=10, is_final=lambda result: result['key'] == 'done')
+        upstream = FakeUpstream(delay=0)
+        await flight.do('s1', upstream, 's1')
+        await flight.do('s1', upstream, 's1') # cached
+        await asyncio.sleep(0.03)
+        await flight.do('s1', upstream, 's1') # expired
+        await flight.do('done', upstream, 'done')
+        await asyncio.sleep(0.03)
+        await flight.do('done', upstream, 'done') # final results stay longer
+        flight.forget('done')
+        await flight.do('done', upstream, 'done')
+        return flight, upstream
+
+    flight, upstream = asyncio.run(scenario())
+    assert upstream.calls == 4 and flight.cache_hits == 2
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        flight, upstream = SingleFlight('test-error', ttl=10), FakeUpstream(error=ConnectionError("reset"))
+        results = await asyncio.gather(*[flight.do('s1', upstream, 's1') for _ in range(3)], return_exceptions=True)
+        upstream.error = None
+        return upstream, results, await flight.do('s1', upstream, 's1')
+
+    upstream, results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert upstream.calls == 2 and retried['call'] == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flight, upstream = SingleFlight('test-cancel', ttl=0), FakeUpstream(delay=0.02)
+        first = asyncio.create_task(flight.do('s1', upstream, 's1'))
+        second = asyncio.create_task(flight.do('s1', upstream, 's1'))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled() and result['call'] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    async def scenario():
+        flight, upstream = SingleFlight('test-lru', ttl=10, max_cached=2), FakeUpstream(delay=0)
+        for key in ('a', 'b', 'a', 'c'):
+            await flight.do(key, upstream, key)
+        return flight
+
+    assert list(asyncio.run(scenario()).cache) == ['a', 'c']
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import timedelta
+from fake_mongo import FakeCollection
+from ojuzmanager.SourceStore import SourceStore, SubmissionDedup, content_hash, normalize_code, submission_key
+
+CODE = "#include <bits/stdc++.h>\nint main() {\n    return 0;\n}\n"
+URL = "https://oj.uz/submission/101"
+
+
+def test_normalization_ignores_line_endings_and_trailing_whitespace():
+    assert normalize_code(CODE.replace('\n', '  \r\n') + "\n\n") == CODE
+    assert submission_key('IOI18_combo', '9', CODE) == submission_key('IOI18_combo', '9', CODE.replace('\n', '\r\n'))
+    assert submission_key('IOI18_combo', '9', CODE) != submission_key('IOI18_combo', '9', CODE + "// x\n")
+    assert submission_key('IOI18_combo', '9', CODE) != submission_key('IOI18_doll', '9', CODE)
+
+
+def test_sources_are_stored_once_and_read_back_exactly():
+    async def scenario():
+        collection = FakeCollection('sources')
+        store = SourceStore(collection)
+        code = CODE.replace('\n', '\r\n') * 50
+        first, second = await store.put(code), await store.put(code)
+        return collection, store, first, second, await SourceStore(collection).get(first)
+
+    collection, store, first, second, code = asyncio.run(scenario())
+    assert first == second == content_hash(code)
+    assert code == CODE.replace('\n', '\r\n') * 50
+    assert store.writes == 1 and store.skipped_writes == 1
+    assert store.stats()['compression_ratio'] < 0.5
+    assert len(collection.documents) == 1
+
+
+def test_known_hashes_are_evicted_least_recently_used():
+    async def scenario():
+        store = SourceStore(FakeCollection('sources'), max_known=2)
+        a, b = await store.put("a"), await store.put("b")
+        await store.put("a") # keeps a known
+        await store.put("c")
+        return store, a, b
+
+    store, a, b = asyncio.run(scenario())
+    assert list(store.known) == [a, content_hash("c")]
+
+
+def test_without_a_collection_sources_are_only_hashed():
+    async def scenario():
+        store = SourceStore()
+        return await store.put(CODE), await store.get(content_hash(CODE))
+
+    assert asyncio.run(scenario()) == (content_hash(CODE), None)
+
+
+def test_dedup_finds_recent_submissions_only():
+    async def scenario():
+        collection = FakeCollection('submission_dedup')
+        dedup = SubmissionDedup(collection, window=600)
+        await dedup.record('key', URL, 'IOI18_combo', content_hash(CODE))
+        recent = await SubmissionDedup(collection, window=600).find('key') # from Mongo
+        cached = await dedup.find('key') # from the LRU
+        collection.documents['key']['submitted_at'] -= timedelta(seconds=601)
+        dedup.lru['key'] = (dedup.lru['key'][0] - 601, URL)
+        expired = await dedup.find('key'), await SubmissionDedup(collection, window=600).find('key')
+        return dedup, recent, cached, expired
+
+    dedup, recent, cached, expired = asyncio.run(scenario())
+    assert recent == cached == URL
+    assert expired == (None, None)
+    assert dedup.duplicates == 1
+
+
+def test_dedup_window_zero_disables_it():
+    async def scenario():
+        dedup = SubmissionDedup(FakeCollection('submission_dedup'), window=0)
+        await dedup.record('key', URL, 'IOI18_combo', None)
+        return await dedup.find('key')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_dedup_record_failures_are_not_raised():
+    async def scenario():
+        collection = FakeCollection('submission_dedup')
+        collection.down = True
+        dedup = SubmissionDedup(collection)
+        await dedup.record('key', URL, 'IOI18_combo', None)
+        return await dedup.find('key') # still remembered in process
+
+    assert asyncio.run(scenario()) == URL
@@ -0,0 +1,53 @@
+import asyncio
+from ojuzmanager.SubmissionDetailsCache import SubmissionDetailsCache
+
+FINAL = {'verdict': 'Accepted', 'score': 100, 'final': True}
+
+
+class FakeCollection:
+    def __init__(self, down=False):
+        self.down = down
+        self.documents = {}
+
+    async def find_one(self, query, projection=None):
+        if self.down:
+            raise ConnectionError("mongo is down")
+        return self.documents.get(query['_id'])
+
+    async def replace_one(self, query, document, upsert=False):
+        if self.down:
+            raise ConnectionError("mongo is down")
+        self.documents[query['_id']] = document
+
+
+def test_final_details_are_persisted_and_read_back():
+    async def scenario():
+        collection = FakeCollection()
+        await SubmissionDetailsCache(collection).put(7, FINAL)
+        cache = SubmissionDetailsCache(collection) # e.g. after a restart
+        return cache, await cache.get('7'), await cache.get(7)
+
+    cache, first, second = asyncio.run(scenario())
+    assert first == second == FINAL
+    assert cache.stats() | {'lru_size': 1} == {'lru_size': 1, 'lru_hits': 1, 'mongo_hits': 1, 'misses': 0}
+
+
+def test_pending_details_are_not_cached():
+    async def scenario():
+        cache = SubmissionDetailsCache(FakeCollection())
+        await cache.put(7, FINAL | {'final': False})
+        return await cache.get(7)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_mongo_errors_are_misses():
+    async def scenario():
+        cache = SubmissionDetailsCache(FakeCollection(down=True))
+        missing = await cache.get(7)
+        await cache.put(7, FINAL)
+        return cache, missing, await cache.get(7)
+
+    cache, missing, cached = asyncio.run(scenario())
+    assert missing is None and cache.misses == 1
+    assert cached == FINAL # the LRU still serves it
@@ -0,0 +1,181 @@
+import asyncio
+from datetime import timedelta
+from fake_mongo import FakeCollection
+from ojuzmanager.OjuzManager import OjuzProblemNotFound
+from ojuzmanager.SourceStore import SourceStore, content_hash
+from server.submission_queue import SubmissionQueue, SubmissionQueueFull
+
+PROBLEM = "https://oj.uz/problem/view/IOI18_combo"
+
+
+class FakeSubmit:
+    def __init__(self, errors=(), delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.digests = []
+
+    async def __call__(self, problem_url, code, dedup=True, digest=None):
+        self.calls += 1
+        self.digests.append(digest)
+        number = 100 + self.calls
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"https://oj.uz/submission/{number}"
+
+
+def make_queue(submit, **options):
+    queue = SubmissionQueue(FakeCollection('submission_jobs'), submit, **options)
+    finished = []
+
+    async def listener(job):
+        finished.append(job)
+
+    queue.add_listener(listener)
+    return queue, finished
+
+
+def expire_lease(queue, job_id):
+    job = queue.collection.documents[job_id]
+    job['lease_until'] -= timedelta(seconds=queue.lease_seconds + 1)
+
+
+def test_job_is_submitted_once_and_acknowledged():
+    async def scenario():
+        submit = FakeSubmit()
+        queue, finished = make_queue(submit)
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        await queue._process(await queue._dequeue())
+        return submit, queue, finished, await queue.get(job_id)
+
+    submit, queue, finished, job = asyncio.run(scenario())
+    assert submit.calls == 1 and queue.pending == 0
+    assert job['status'] == 'done' and job['submission_id'] == '101' and 'lease_until' not in job
+    assert [job['status'] for job in finished] == ['done']
+
+
+def test_full_queue_rejects_jobs():
+    async def scenario():
+        queue, _ = make_queue(FakeSubmit(), max_pending=1)
+        await queue.enqueue(PROBLEM, "a")
+        try:
+            await queue.enqueue(PROBLEM, "b")
+        except SubmissionQueueFull:
+            return True
+
+    assert asyncio.run(scenario())
+
+
+def test_transient_errors_are_retried_up_to_max_attempts():
+    async def scenario():
+        submit = FakeSubmit(errors=[ConnectionError("reset")] * 5)
+        queue, finished = make_queue(submit, max_attempts=3)
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        while (job := await queue._dequeue()) is not None:
+            await queue._process(job)
+        return submit, finished, await queue.get(job_id)
+
+    submit, finished, job = asyncio.run(scenario())
+    assert submit.calls == 3
+    assert job['status'] == 'failed' and job['attempts'] == 3
+    assert len(finished) == 1
+
+
+def test_permanent_errors_fail_at_once():
+    async def scenario():
+        submit = FakeSubmit(errors=[OjuzProblemNotFound("There is no problem")])
+        queue, _ = make_queue(submit)
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        await queue._process(await queue._dequeue())
+        return submit, await queue.get(job_id)
+
+    submit, job = asyncio.run(scenario())
+    assert submit.calls == 1 and job['status'] == 'failed' and job['attempts'] == 1
+
+
+def test_jobs_that_never_finish_are_capped_by_recovery():
+    async def scenario():
+        submit = FakeSubmit()
+        queue, finished = make_queue(submit, max_attempts=3)
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        for _ in range(3):
+            await queue._dequeue() # the worker dies with the job, nothing acknowledges it
+            expire_lease(queue, job_id)
+            await queue.recover_expired()
+        await queue._process(await queue._dequeue())
+        return submit, finished, await queue.get(job_id)
+
+    submit, finished, job = asyncio.run(scenario())
+    assert submit.calls == 0
+    assert job['status'] == 'failed' and len(finished) == 1
+
+
+def test_heartbeat_keeps_a_slow_job_leased():
+    async def scenario():
+        submit = FakeSubmit(delay=0.15)
+        queue, finished = make_queue(submit, lease_seconds=0.06)
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        processing = asyncio.create_task(queue._process(await queue._dequeue()))
+        for _ in range(6):
+            await asyncio.sleep(0.03)
+            await queue.recover_expired()
+        await processing
+        return submit, finished, await queue.get(job_id)
+
+    submit, finished, job = asyncio.run(scenario())
+    assert job['status'] == 'done' and job['attempts'] == 1
+    assert submit.calls == 1 and len(finished) == 1
+
+
+def test_worker_that_lost_its_lease_does_not_acknowledge():
+    async def scenario():
+        queue, finished = make_queue(FakeSubmit())
+        job_id = await queue.enqueue(PROBLEM, "int main() {}")
+        stale = await queue._dequeue()
+        expire_lease(queue, job_id)
+        await queue.recover_expired()
+        current = await queue._dequeue() # another worker took it over
+        await queue._process(stale)
+        lost = (await queue.get(job_id))['status'], queue.pending, len(finished)
+        await queue._process(current)
+        return lost, await queue.get(job_id), finished
+
+    (status, pending, notified), job, finished = asyncio.run(scenario())
+    assert (status, pending, notified) == ('running', 1, 0)
+    assert job['status'] == 'done' and job['attempts'] == 2
+    assert len(finished) == 1
+
+
+def test_workers_drain_the_queue():
+    async def scenario():
+        submit = FakeSubmit(delay=0.01)
+        queue, finished = make_queue(submit, workers=3, recovery_interval=0.05)
+        await queue.start()
+        for i in range(6):
+            await queue.enqueue(PROBLEM, f"// {i}")
+        for _ in range(100):
+            if len(finished) == 6:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return submit, queue, finished
+
+    submit, queue, finished = asyncio.run(scenario())
+    assert submit.calls == 6 and queue.pending == 0
+    assert sorted(job['submission_id'] for job in finished) == [str(101 + i) for i in range(6)]
+
+
+def test_stored_sources_are_loaded_and_their_hash_passed_on():
+    async def scenario():
+        submit = FakeSubmit()
+        store = SourceStore(FakeCollection('sources'))
+        queue = SubmissionQueue(FakeCollection('submission_jobs'), submit, source_store=store)
+        await queue.enqueue(PROBLEM, "int main() {}")
+        job = await queue._dequeue()
+        await queue._process(job)
+        return submit, store, job
+
+    submit, store, job = asyncio.run(scenario())
+    assert 'solution_code' not in job
+    assert submit.digests == [content_hash("int main() {}")] and store.writes == 1
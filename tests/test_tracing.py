@@ -0,0 +1,30 @@
+import asyncio
+from ojuzmanager.Tracing import Tracer, untraced, _current_span
+
+
+def test_child_tasks_inherit_the_span():
+    async def scenario():
+        tracer = Tracer(enabled=True)
+        with tracer.span('request') as span:
+            child = await asyncio.create_task(current())
+        return span, child
+
+    span, child = asyncio.run(scenario())
+    assert child is span
+
+
+def test_untraced_tasks_start_without_a_span():
+    async def scenario():
+        tracer = Tracer(enabled=True)
+        with tracer.span('request') as span:
+            shared = await asyncio.create_task(untraced(current()))
+            after = _current_span.get()
+        return span, shared, after
+
+    span, shared, after = asyncio.run(scenario())
+    assert shared is None
+    assert after is span # the creating request keeps its own span
+
+
+async def current():
+    return _current_span.get()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from ojuzmanager.VerdictTracker import VerdictTracker
+from server.verdict_stream import VerdictHub, VerdictStreamHandler
+
+COMPILING = {'text': "Compiling", 'score': None, 'full_score': 100}
+ACCEPTED = {'text': "100 / 100", 'score': 100, 'full_score': 100}
+
+
+class FakeSummaries:
+    def __init__(self, *summaries):
+        self.summaries = list(summaries)
+        self.calls = 0
+
+    async def __call__(self, submission_id):
+        self.calls += 1
+        return self.summaries[min(self.calls, len(self.summaries)) - 1]
+
+
+def hub_with(fetch):
+    tracker = VerdictTracker(fetch, min_interval=0.01, backoff=1)
+    return VerdictHub(SimpleNamespace(verdict_tracker=tracker)), tracker
+
+
+def test_browsers_of_one_submission_get_every_change():
+    async def scenario():
+        hub, tracker = hub_with(FakeSummaries(COMPILING, ACCEPTED))
+        first, second = hub.new_queue(), hub.new_queue()
+        hub.subscribe_submission('s1', first)
+        hub.subscribe_submission('s1', second)
+        await asyncio.sleep(0.1)
+        await tracker.close()
+        return [[queue.get_nowait() for _ in range(queue.qsize())] for queue in (first, second)]
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert [event['text'] for event in first] == ["Compiling", "100 / 100"]
+    assert [event['final'] for event in first] == [False, True]
+    assert first[1]['delta'] == {'text': "100 / 100", 'score': 100}
+
+
+def test_last_unsubscribe_stops_polling():
+    async def scenario():
+        fetch = FakeSummaries(COMPILING)
+        hub, tracker = hub_with(fetch)
+        queue = hub.new_queue()
+        hub.subscribe_submission('s1', queue)
+        await asyncio.sleep(0.03)
+        hub.unsubscribe('submission:s1', queue)
+        calls = fetch.calls
+        await asyncio.sleep(0.05)
+        await tracker.close()
+        return fetch, tracker, calls
+
+    fetch, tracker, calls = asyncio.run(scenario())
+    assert fetch.calls == calls
+    assert not tracker.tracked
+
+
+def test_websocket_answers_malformed_commands_with_errors():
+    async def scenario():
+        hub, tracker = hub_with(FakeSummaries(COMPILING))
+        app = web.Application()
+        app.router.add_get('/ws', VerdictStreamHandler(hub).websocket)
+        async with TestClient(TestServer(app)) as client:
+            ws = await client.ws_connect('/ws')
+            await ws.send_str("not json")
+            not_json = await ws.receive_json()
+            await ws.send_str(json.dumps({'subscribe': {'submissions': [['s1']]}}))
+            bad_ids = await ws.receive_json()
+            await ws.send_str(json.dumps({'subscribe': {'submissions': ['s1']}}))
+            verdict = await ws.receive_json()
+            await ws.close()
+        await tracker.close()
+        return not_json, bad_ids, verdict
+
+    not_json, bad_ids, verdict = asyncio.run(scenario())
+    assert not_json['type'] == bad_ids['type'] == 'error'
+    assert verdict['type'] == 'verdict' and verdict['text'] == "Compiling"
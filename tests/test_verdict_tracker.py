@@ -0,0 +1,129 @@
+import asyncio
+from ojuzmanager.VerdictTracker import VerdictTracker, is_final_summary
+
+COMPILING = {'text': "Compiling", 'score': None}
+IN_QUEUE = {'text': "In queue", 'score': None}
+ACCEPTED = {'text': "100 / 100", 'score': 100}
+
+
+class FakeSummaries:
+    """fetch_summary replaying a list of summaries per submission, the last one forever"""
+
+    def __init__(self, **summaries):
+        self.summaries = summaries
+        self.calls: dict[str, int] = {}
+
+    async def __call__(self, submission_id):
+        calls = self.calls[submission_id] = self.calls.get(submission_id, 0) + 1
+        answers = self.summaries[submission_id]
+        return answers[min(calls, len(answers)) - 1]
+
+
+def test_pending_markers():
+    assert not is_final_summary(IN_QUEUE) and not is_final_summary(COMPILING)
+    assert not is_final_summary(None)
+    assert is_final_summary(ACCEPTED)
+
+
+def test_unchanged_summaries_back_off():
+    tracker = VerdictTracker(FakeSummaries(), min_interval=1, max_interval=5, backoff=2)
+
+    class Entry:
+        unchanged_polls = 0
+
+    entry = Entry()
+    intervals = []
+    for entry.unchanged_polls in range(5):
+        intervals.append(tracker._interval(entry))
+    assert intervals == [1, 2, 4, 5, 5]
+
+
+def test_watchers_of_one_submission_share_the_polls():
+    async def scenario():
+        fetch = FakeSummaries(s1=[COMPILING, COMPILING, ACCEPTED])
+        tracker = VerdictTracker(fetch, min_interval=0.01, backoff=1)
+
+        async def collect():
+            return [summary async for summary in tracker.watch('s1')]
+
+        results = await asyncio.gather(collect(), collect(), tracker.wait_final('s1'))
+        await tracker.close()
+        return fetch, tracker, results
+
+    fetch, tracker, (first, second, final) = asyncio.run(scenario())
+    assert first == second == [COMPILING, ACCEPTED]
+    assert final == ACCEPTED
+    assert fetch.calls == {'s1': 3} and tracker.upstream_requests == 3
+    assert not tracker.tracked
+
+
+def test_final_verdict_stops_polling_and_reaches_callbacks():
+    async def scenario():
+        fetch = FakeSummaries(s1=[IN_QUEUE, ACCEPTED])
+        tracker = VerdictTracker(fetch, min_interval=0.01)
+        seen = []
+        tracker.add_callback('s1', lambda submission_id, summary: seen.append((submission_id, summary)))
+        await asyncio.sleep(0.1)
+        await tracker.close()
+        return fetch, tracker, seen
+
+    fetch, tracker, seen = asyncio.run(scenario())
+    assert seen == [('s1', IN_QUEUE), ('s1', ACCEPTED)]
+    assert fetch.calls == {'s1': 2} and not tracker.tracked
+
+
+def test_timeout_notifies_callbacks_and_waiters():
+    async def scenario():
+        tracker = VerdictTracker(FakeSummaries(s1=[COMPILING]), min_interval=0.01, max_tracking_time=0.05)
+        seen = []
+
+        async def callback(submission_id, summary):
+            seen.append(summary)
+
+        tracker.add_callback('s1', callback)
+        try:
+            await tracker.wait_final('s1')
+        except asyncio.TimeoutError:
+            timed_out = True
+        await asyncio.sleep(0.05)
+        await tracker.close()
+        return tracker, seen, timed_out
+
+    tracker, seen, timed_out = asyncio.run(scenario())
+    assert timed_out
+    assert seen == [COMPILING, None]
+    assert not tracker.tracked
+
+
+def test_removing_the_last_callback_stops_polling():
+    async def scenario():
+        fetch = FakeSummaries(s1=[COMPILING])
+        tracker = VerdictTracker(fetch, min_interval=0.01, backoff=1)
+        callback = lambda submission_id, summary: None
+        tracker.add_callback('s1', callback)
+        await asyncio.sleep(0.03)
+        tracker.remove_callback('s1', callback)
+        polls = fetch.calls['s1']
+        await asyncio.sleep(0.05)
+        await tracker.close()
+        return fetch, tracker, polls
+
+    fetch, tracker, polls = asyncio.run(scenario())
+    assert fetch.calls['s1'] == polls
+    assert not tracker.tracked
+
+
+def test_a_remaining_watcher_keeps_polling():
+    async def scenario():
+        fetch = FakeSummaries(s1=[COMPILING, COMPILING, ACCEPTED])
+        tracker = VerdictTracker(fetch, min_interval=0.01, backoff=1)
+        callback = lambda submission_id, summary: None
+        tracker.add_callback('s1', callback)
+        final = asyncio.create_task(tracker.wait_final('s1'))
+        await asyncio.sleep(0)
+        tracker.remove_callback('s1', callback)
+        result = await asyncio.wait_for(final, 1)
+        await tracker.close()
+        return result
+
+    assert asyncio.run(scenario()) == ACCEPTED